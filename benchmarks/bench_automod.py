@@ -0,0 +1,128 @@
+"""Скорость проверки предложений правилами автомодерации.
+
+Тысячи запрещённых слов и доменов плюс несколько десятков регулярных выражений.
+Сравниваются:
+  - наивная проверка: цикл по правилам, по одному поиску на правило;
+  - одно большое регулярное выражение со всеми словами через «|»;
+  - RuleEngine (автомат Ахо–Корасик на Python или pyahocorasick, если установлен).
+
+Запуск: python benchmarks/bench_automod.py [--words N] [--regexes N] [--messages N]
+"""
+import argparse
+import random
+import re
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+import automod  # noqa: E402
+from automod import KIND_DOMAIN, KIND_REGEX, KIND_WORD, REJECT, FLAG, PyAutomaton, RuleEngine  # noqa: E402
+
+ALPHABET = string.ascii_lowercase + "абвгдежзиклмнопрстуфхцчшэюя"
+
+
+def random_word(rng: random.Random, low: int = 4, high: int = 10) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(low, high)))
+
+
+def make_rules(rng: random.Random, words: int, regexes: int) -> list:
+    rules = []
+    for i in range(words):
+        kind = KIND_DOMAIN if i % 4 == 0 else KIND_WORD
+        pattern = f"{random_word(rng)}.{rng.choice(['com', 'ru', 'io'])}" if kind == KIND_DOMAIN else random_word(rng)
+        rules.append((len(rules) + 1, kind, pattern, REJECT if i % 2 else FLAG))
+    for _ in range(regexes):
+        rules.append((len(rules) + 1, KIND_REGEX, rf"{random_word(rng, 3, 5)}\d{{2,4}}", FLAG))
+    return rules
+
+
+def make_messages(rng: random.Random, count: int, rules: list) -> list:
+    """Обычные тексты; в каждом десятом — одно запрещённое слово"""
+    literals = [pattern for _, kind, pattern, _ in rules if kind != KIND_REGEX]
+    messages = []
+    for i in range(count):
+        words = [random_word(rng, 2, 9) for _ in range(rng.randint(20, 80))]
+        if i % 10 == 0:
+            words.insert(rng.randrange(len(words)), rng.choice(literals))
+        messages.append(" ".join(words))
+    return messages
+
+
+def naive_checker(rules: list):
+    compiled = []
+    for _, kind, pattern, action in rules:
+        if kind == KIND_REGEX:
+            compiled.append((re.compile(pattern, re.IGNORECASE), action))
+        else:
+            compiled.append((re.compile(rf"(?<![\w.-]){re.escape(pattern)}(?![\w-])", re.IGNORECASE), action))
+
+    def check(text: str) -> bool:
+        return any(regex.search(text) for regex, _ in compiled)
+    return check
+
+
+def alternation_checker(rules: list):
+    literals = "|".join(re.escape(pattern) for _, kind, pattern, _ in rules if kind != KIND_REGEX)
+    regexes = "|".join(f"(?:{pattern})" for _, kind, pattern, _ in rules if kind == KIND_REGEX)
+    regex = re.compile(rf"(?<![\w.-])(?:{literals})(?![\w-])|{regexes}", re.IGNORECASE)
+    return lambda text: regex.search(text) is not None
+
+
+def engine_checker(rules: list, automaton_class=None):
+    if automaton_class is not None:
+        automod._new_automaton = automaton_class
+    engine = RuleEngine()
+    for rule in rules:
+        engine.add(*rule)
+    started = time.perf_counter()
+    engine.check("")
+    compile_time = time.perf_counter() - started
+    return (lambda text: engine.check(text).action != automod.PASS), compile_time
+
+
+def measure(check, messages: list) -> tuple:
+    started = time.perf_counter()
+    hits = sum(1 for text in messages if check(text))
+    elapsed = time.perf_counter() - started
+    return elapsed / len(messages) * 1e6, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words', type=int, default=5000)
+    parser.add_argument('--regexes', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = make_rules(rng, args.words, args.regexes)
+    messages = make_messages(rng, args.messages, rules)
+    print(f"Правил: {len(rules)} ({args.regexes} регулярных), сообщений: {len(messages)}")
+    print(f"{'способ':<28}{'мкс/сообщение':>16}{'срабатываний':>14}{'компиляция, мс':>16}")
+
+    # Наивный способ медленный — меряем на части сообщений
+    sample = messages[:max(1, len(messages) // 20)]
+    per_message, hits = measure(naive_checker(rules), sample)
+    print(f"{'цикл по правилам':<28}{per_message:>16.1f}{hits * len(messages) // len(sample):>14}{'-':>16}")
+
+    started = time.perf_counter()
+    check = alternation_checker(rules)
+    compile_time = time.perf_counter() - started
+    per_message, hits = measure(check, messages)
+    print(f"{'одно регулярное выражение':<28}{per_message:>16.1f}{hits:>14}{compile_time * 1000:>16.1f}")
+
+    variants = [('RuleEngine (Python)', PyAutomaton)]
+    if automod.ahocorasick is not None:
+        variants.append(('RuleEngine (pyahocorasick)', automod.ahocorasick.Automaton))
+    for name, automaton_class in variants:
+        check, compile_time = engine_checker(rules, automaton_class)
+        per_message, hits = measure(check, messages)
+        print(f"{name:<28}{per_message:>16.1f}{hits:>14}{compile_time * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
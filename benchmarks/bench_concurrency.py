@@ -0,0 +1,146 @@
+"""Пропускная способность обработки обновлений при медленном Bot API.
+
+1000 пользователей присылают по несколько сообщений; каждый обработчик делает
+один запрос к поддельному API с задержкой. Сравниваются:
+  - последовательная обработка (handle_as_tasks=False);
+  - задачи без упорядочивания (по умолчанию в aiogram) — порядок в чате нарушается;
+  - задачи с ChatOrderMiddleware при разном числе воркеров.
+
+Последовательный режим меряется на части обновлений — его скорость от объёма не зависит.
+
+Запуск: python benchmarks/bench_concurrency.py [--users N] [--messages N] [--latency SEC]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from aiogram import Bot, Dispatcher, Router  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.types import Chat, Message, Update, User  # noqa: E402
+
+from middlewares import ChatOrderMiddleware  # noqa: E402
+
+TOKEN = "42:TEST"
+NOW = datetime.now()
+
+
+class SlowSession(BaseSession):
+    """Поддельный Bot API: каждый запрос отвечает с задержкой"""
+
+    def __init__(self, latency: float, seed: int = 1):
+        super().__init__()
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.requests = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+        # Разброс задержки, чтобы неупорядоченная обработка проявилась
+        await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        return Message(
+            message_id=self.requests,
+            date=NOW,
+            chat=Chat(id=method.chat_id, type='private')
+        )
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+def make_updates(users: int, messages: int, seed: int = 1) -> list:
+    """Сообщения пользователей вперемешку, как они приходят из getUpdates"""
+    senders = [user_id for user_id in range(1, users + 1) for _ in range(messages)]
+    random.Random(seed).shuffle(senders)
+    sent = {}
+    updates = []
+    for update_id, user_id in enumerate(senders, start=1):
+        seq = sent[user_id] = sent.get(user_id, -1) + 1
+        updates.append(Update(
+            update_id=update_id,
+            message=Message(
+                message_id=seq,
+                date=NOW,
+                chat=Chat(id=user_id, type='private'),
+                from_user=User(id=user_id, is_bot=False, first_name=f"user{user_id}"),
+                text=str(seq)
+            )
+        ))
+    return updates
+
+
+def make_dispatcher(workers: int = 0):
+    """Диспетчер с обработчиком, который отвечает через API и запоминает порядок"""
+    completed = {}
+    router = Router()
+
+    @router.message()
+    async def handler(message: Message):
+        await message.answer("ok")
+        completed.setdefault(message.chat.id, []).append(message.message_id)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    if workers:
+        dp.update.outer_middleware(ChatOrderMiddleware(workers))
+    return dp, completed
+
+
+def violations(completed: dict) -> int:
+    """Чаты, в которых сообщения обработаны не по порядку"""
+    return sum(1 for seqs in completed.values() if seqs != sorted(seqs))
+
+
+async def run_sequential(updates: list, latency: float) -> tuple:
+    dp, completed = make_dispatcher()
+    bot = Bot(TOKEN, session=SlowSession(latency))
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return time.perf_counter() - started, violations(completed)
+
+
+async def run_tasks(updates: list, latency: float, workers: int) -> tuple:
+    """Как polling с handle_as_tasks=True: задача на каждое обновление в порядке получения"""
+    dp, completed = make_dispatcher(workers)
+    bot = Bot(TOKEN, session=SlowSession(latency))
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(dp.feed_update(bot, update)) for update in updates]
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started, violations(completed)
+
+
+def report(name: str, count: int, elapsed: float, broken: int):
+    print(f"{name:<32} {count:>6} обн. {elapsed:>8.2f} с {count / elapsed:>9.1f} обн/с   "
+          f"нарушений порядка: {broken}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=3, help="сообщений от каждого пользователя")
+    parser.add_argument('--latency', type=float, default=0.05, help="средняя задержка API, с")
+    parser.add_argument('--sequential-sample', type=int, default=100)
+    parser.add_argument('--workers', type=int, nargs='+', default=[16, 64, 256])
+    args = parser.parse_args()
+
+    updates = make_updates(args.users, args.messages)
+    print(f"{args.users} пользователей × {args.messages} сообщений, задержка API ~{args.latency * 1000:.0f} мс\n")
+
+    sample = updates[:args.sequential_sample]
+    report("последовательно", len(sample), *await run_sequential(sample, args.latency))
+    report("задачи без порядка", len(updates), *await run_tasks(updates, args.latency, 0))
+    for workers in args.workers:
+        report(f"ChatOrderMiddleware({workers})", len(updates), *await run_tasks(updates, args.latency, workers))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
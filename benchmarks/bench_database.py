@@ -0,0 +1,379 @@
+"""Время методов DatabaseManager и запросов статистики на больших синтетических базах.
+
+Базы заполняются тем же генератором, что manage.py seed: авторы неравномерны
+(небольшая часть пишет большую долю предложений), решены почти все, ожидают
+только недавние; журнал событий и агрегаты строятся по ним. Для каждого размера
+меряются все публичные методы DatabaseManager:
+  - холодный запуск — новое соединение (пустой кэш SQLite), файл базы
+    вытеснен из кэша ОС (posix_fadvise, где есть), один вызов;
+  - тёплый — --repeat вызовов подряд после разогрева, медиана и p95.
+Пишущие методы получают свежие строки (подготовка в замер не входит) и немного
+меняют базу, поэтому при повторных запусках с --dir она растёт на десятки строк.
+
+Отчёт (--save) — JSON; с --baseline отчёт сравнивается с сохранённым, и код
+выхода 1 означает замедление больше --tolerance раз (и больше --noise-ms).
+
+Запуск: python benchmarks/bench_database.py [--sizes 10k,1m,10m] [--dir PATH]
+        [--save report.json] [--baseline benchmarks/bench_database_baseline.json]
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+import database  # noqa: E402
+import manage  # noqa: E402
+from database import DatabaseManager, db  # noqa: E402
+
+FIRST_USER = 9_000_000_000
+MODERATOR = 8_000_000_000
+# Методы, которые не меряются: ими бенчмарк сам открывает и закрывает базу
+HARNESS = {'connect', 'close'}
+
+SUFFIXES = {'k': 1000, 'm': 1000 ** 2}
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    if value[-1:] in SUFFIXES:
+        return int(float(value[:-1]) * SUFFIXES[value[-1]])
+    return int(value)
+
+
+def day(days_ago: int = 0) -> str:
+    return datetime.fromtimestamp(time.time() - days_ago * 86400, timezone.utc).date().isoformat()
+
+
+async def new_submission(ctx) -> int:
+    ctx.message_id += 1
+    return await db.add_submission(
+        ctx.author, ctx.message_id, 'text', "Бенчмарк: новость " * 10, True
+    )
+
+
+async def new_card(ctx) -> tuple:
+    ctx.message_id += 1
+    await db.save_card(ctx.pending_id, MODERATOR, ctx.message_id, 'text', False, 0)
+    return ctx.pending_id, MODERATOR, ctx.message_id
+
+
+async def new_relay(ctx) -> tuple:
+    ctx.message_id += 1
+    await db.save_relay(MODERATOR, ctx.message_id, ctx.pending_id, ctx.author, ctx.pending_message[1])
+    return MODERATOR, ctx.message_id
+
+
+async def new_rule(ctx) -> int:
+    ctx.message_id += 1
+    return await db.add_automod_rule('word', f"бенчмарк{ctx.message_id}", 'flag')
+
+
+async def new_destination(ctx) -> int:
+    ctx.message_id += 1
+    return await db.add_destination(-ctx.message_id, "Бенчмарк", 'backup', is_default=False)
+
+
+async def publication(ctx) -> list:
+    destination = {'id': ctx.destination_id, 'chat_id': -1}
+    return [(destination, SimpleNamespace(message_id=ctx.message_id))]
+
+
+def cases(ctx) -> dict:
+    """Метод -> (вызов, подготовка или None, повторов или None — по умолчанию --repeat).
+
+    Подготовка выполняется перед каждым вызовом и в замер не входит; её
+    результат передаётся в вызов.
+    """
+    week, month, _ = database.period_keys().values()
+    return {
+        'ping': (lambda _: db.ping(), None, None),
+        'storage_info': (lambda _: db.storage_info(), None, None),
+        'generate_admin_code': (lambda _: db.generate_admin_code(), None, None),
+        'get_setting': (lambda _: db.get_setting('admin_code'), None, None),
+        'set_setting': (lambda _: db.set_setting('bench', str(time.time())), None, None),
+        'get_admin_id': (lambda _: db.get_admin_id(), None, None),
+        'set_admin': (lambda _: db.set_admin(MODERATOR), None, None),
+        'add_moderator': (lambda _: db.add_moderator(MODERATOR + 1), None, None),
+        'remove_moderator': (lambda _: db.remove_moderator(MODERATOR + 2),
+                             lambda _: db.add_moderator(MODERATOR + 2), None),
+        'get_moderators': (lambda _: db.get_moderators(), None, None),
+        'assign_submission': (lambda _: db.assign_submission(ctx.pending_id, MODERATOR, int(time.time())), None, None),
+        'get_assignments': (lambda _: db.get_assignments(), None, None),
+        'get_automod_rules': (lambda _: db.get_automod_rules(), None, None),
+        'add_automod_rule': (lambda _: new_rule(ctx), None, None),
+        'remove_automod_rule': (db.remove_automod_rule, lambda _: new_rule(ctx), None),
+        'get_channel_id': (lambda _: db.get_channel_id(), None, None),
+        'set_channel_id': (lambda _: db.set_channel_id(-100, "Бенчмарк"), None, None),
+        'get_destinations': (lambda _: db.get_destinations(), None, None),
+        'add_destination': (lambda _: new_destination(ctx), None, None),
+        'remove_destination': (db.remove_destination, lambda _: new_destination(ctx), None),
+        'set_destination_default': (lambda _: db.set_destination_default(ctx.destination_id, False), None, None),
+        'set_submission_destinations': (
+            lambda _: db.set_submission_destinations(ctx.pending_id, [ctx.destination_id]), None, None
+        ),
+        'get_publication_targets': (lambda _: db.get_publication_targets(ctx.pending_id), None, None),
+        'record_publications': (
+            lambda results: db.record_publications(ctx.approved_id, ctx.author, MODERATOR, results),
+            publication, None
+        ),
+        'get_publications': (lambda _: db.get_publications(ctx.approved_id), None, None),
+        'get_failed_publications': (lambda _: db.get_failed_publications(5), None, None),
+        'add_user': (lambda _: db.add_user(ctx.author, "bench", "Бенчмарк"), None, None),
+        'is_user_banned': (lambda _: db.is_user_banned(ctx.author), None, None),
+        'add_submission': (lambda _: new_submission(ctx), None, None),
+        'get_submission': (lambda _: db.get_submission(ctx.approved_id), None, None),
+        'update_submission_status': (
+            lambda submission_id: db.update_submission_status(
+                submission_id, 'approved', "публикацией с указанием авторства", MODERATOR
+            ),
+            lambda _: new_submission(ctx), None
+        ),
+        'find_pending_submission': (lambda _: db.find_pending_submission(*ctx.pending_message), None, None),
+        'update_submission_content': (
+            lambda submission_id: db.update_submission_content(
+                submission_id, 'text', "Бенчмарк: правка " * 10, None, None, None, None
+            ),
+            lambda _: new_submission(ctx), None
+        ),
+        'save_card': (lambda _: new_card(ctx), None, None),
+        'get_cards': (lambda _: db.get_cards(ctx.pending_id), None, None),
+        'get_card_revision': (lambda card: db.get_card_revision(*card), lambda _: new_card(ctx), None),
+        'delete_card': (lambda card: db.delete_card(*card), lambda _: new_card(ctx), None),
+        'find_card': (lambda card: db.find_card(*card[1:]), lambda _: new_card(ctx), None),
+        'save_relay': (lambda _: new_relay(ctx), None, None),
+        'get_relay': (lambda relay: db.get_relay(*relay), lambda _: new_relay(ctx), None),
+        'log_event': (
+            lambda _: db.log_event(database.EVENT_NOTIFIED, ctx.approved_id, ctx.author, MODERATOR), None, None
+        ),
+        'get_submission_events': (lambda _: db.get_submission_events(ctx.approved_id), None, None),
+        'get_pending_submissions_count': (lambda _: db.get_pending_submissions_count(), None, None),
+        'get_user_stats': (lambda _: db.get_user_stats(ctx.author), None, None),
+        'get_user_stats:typical': (lambda _: db.get_user_stats(ctx.typical_author), None, None),
+        'get_pending_submissions': (lambda _: db.get_pending_submissions(), None, None),
+        'get_pending_page': (lambda _: db.get_pending_page((0, 0), 5), None, None),
+        'get_user_pending_submissions': (lambda _: db.get_user_pending_submissions(ctx.author), None, None),
+        'get_period_stats:1d': (lambda _: db.get_period_stats(day(), day()), None, None),
+        'get_period_stats:30d': (lambda _: db.get_period_stats(day(29), day()), None, None),
+        'get_period_stats:365d': (lambda _: db.get_period_stats(day(364), day()), None, None),
+        'get_top_counters:week': (lambda _: db.get_top_counters(week, 10), None, None),
+        'get_top_counters:month': (lambda _: db.get_top_counters(month, 10), None, None),
+        'get_top_counters:all': (lambda _: db.get_top_counters('all', 10), None, None),
+        # Полные проходы по базе: один вызов и в тёплом замере
+        'rebuild_from_events': (lambda _: db.rebuild_from_events(write=False), None, 1),
+        'rebuild_from_events:write': (lambda _: db.rebuild_from_events(), None, 1),
+        'backfill_daily_stats': (lambda _: db.backfill_daily_stats(), None, 1),
+        'backfill_user_counters': (lambda _: db.backfill_user_counters(), None, 1),
+    }
+
+
+def public_methods() -> set:
+    return {
+        name for name, value in vars(DatabaseManager).items()
+        if not name.startswith('_') and inspect.iscoroutinefunction(value)
+    }
+
+
+async def context() -> SimpleNamespace:
+    """Строки, на которых меряются методы: самый активный и типичный автор, ожидающее и решённое"""
+    conn = database._conn
+    async with conn.execute('''
+        SELECT user_id FROM submissions GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''') as cursor:
+        author = (await cursor.fetchone())[0]
+    async with conn.execute('SELECT MIN(user_id), MAX(user_id) FROM users') as cursor:
+        low, high = await cursor.fetchone()
+    async with conn.execute(
+        "SELECT id, user_id, message_id FROM submissions WHERE status = 'pending' ORDER BY id LIMIT 1"
+    ) as cursor:
+        pending = await cursor.fetchone()
+    async with conn.execute(
+        "SELECT MAX(id) FROM submissions WHERE status = 'approved'"
+    ) as cursor:
+        approved_id = (await cursor.fetchone())[0]
+    destinations = await db.get_destinations()
+    destination_id = (
+        destinations[0]['id'] if destinations
+        else await db.add_destination(-1, "Бенчмарк", 'backup', is_default=False)
+    )
+    return SimpleNamespace(
+        author=author,
+        typical_author=(low + high) // 2,
+        pending_id=pending['id'],
+        pending_message=(pending['user_id'], pending['message_id']),
+        approved_id=approved_id,
+        destination_id=destination_id,
+        message_id=int(time.time() * 1000),
+    )
+
+
+def drop_os_cache(path: Path):
+    """Вытеснение файлов базы из кэша ОС (только чистые страницы; нет posix_fadvise — ничего)"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for suffix in ('', '-wal', '-shm'):
+        file = Path(f"{path}{suffix}")
+        if not file.exists():
+            continue
+        fd = os.open(file, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+async def build(path: Path, rows: int, seed: int):
+    """Синтетическая база генератором manage.py seed"""
+    await database.connect(str(path))
+    try:
+        await manage.seed(argparse.Namespace(
+            users=max(100, rows // 20), submissions=rows, days=365, first_user=FIRST_USER,
+            seed=seed, skip_aggregates=False, batch=10000
+        ))
+        await database._conn.execute('ANALYZE')
+        await database._conn.commit()
+    finally:
+        await database.close()
+
+
+async def cold_call(path: Path, call, prepare, ctx) -> float:
+    await database.close()
+    drop_os_cache(path)
+    await database.connect(str(path))
+    argument = await prepare(ctx) if prepare else None
+    started = time.perf_counter()
+    await call(argument)
+    return (time.perf_counter() - started) * 1000
+
+
+async def warm_calls(call, prepare, ctx, repeat: int) -> list:
+    timings = []
+    # Разогрев: страницы и подготовленные запросы в кэше
+    await call(await prepare(ctx) if prepare else None)
+    for _ in range(repeat):
+        argument = await prepare(ctx) if prepare else None
+        started = time.perf_counter()
+        await call(argument)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def measure(path: Path, repeat: int) -> dict:
+    await database.close()
+    drop_os_cache(path)
+    started = time.perf_counter()
+    await database.connect(str(path))
+    connect_ms = (time.perf_counter() - started) * 1000
+    try:
+        ctx = await context()
+        plan = cases(ctx)
+        missing = public_methods() - HARNESS - {name.split(':')[0] for name in plan}
+        if missing:
+            print(f"  без замера: {', '.join(sorted(missing))}", file=sys.stderr)
+
+        results = {}
+        for name, (call, prepare, times) in plan.items():
+            cold = await cold_call(path, call, prepare, ctx)
+            timings = await warm_calls(call, prepare, ctx, times or repeat)
+            timings.sort()
+            results[name] = {
+                'cold_ms': round(cold, 3),
+                'warm_ms': round(statistics.median(timings), 3),
+                'warm_p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+                'repeat': len(timings),
+            }
+            print(f"  {name:<34}{cold:>12.2f}{results[name]['warm_ms']:>12.3f}"
+                  f"{results[name]['warm_p95_ms']:>12.3f}", file=sys.stderr)
+        return {'connect_ms': round(connect_ms, 1), 'file': path.stat().st_size, 'methods': results}
+    finally:
+        await database.close()
+
+
+def compare(report: dict, baseline: dict, tolerance: float, noise_ms: float) -> list:
+    """Замедления относительно базового отчёта: (размер, метод, замер, было, стало)"""
+    regressions = []
+    for size, current in report['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size)
+        if previous is None:
+            continue
+        for name, timings in current['methods'].items():
+            before = previous['methods'].get(name)
+            if before is None:
+                continue
+            for key in ('warm_ms', 'cold_ms'):
+                if timings[key] > before[key] * tolerance and timings[key] - before[key] > noise_ms:
+                    regressions.append((size, name, key, before[key], timings[key]))
+    return regressions
+
+
+async def run(args) -> dict:
+    directory = Path(args.dir or tempfile.mkdtemp(prefix='bench_database_'))
+    directory.mkdir(parents=True, exist_ok=True)
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'sizes': {},
+    }
+    try:
+        for rows in args.sizes:
+            path = directory / f"bench_{rows}.db"
+            if not path.exists():
+                started = time.perf_counter()
+                await build(path, rows, args.seed)
+                print(f"База {rows} предложений: {time.perf_counter() - started:.1f} с", file=sys.stderr)
+            print(f"\n{rows} предложений, {path.stat().st_size / 1024 / 1024:.1f} МБ\n"
+                  f"  {'метод':<34}{'холодный':>12}{'тёплый':>12}{'p95':>12}", file=sys.stderr)
+            report['sizes'][str(rows)] = await measure(path, args.repeat)
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=lambda value: [parse_size(size) for size in value.split(',')],
+                        default=[10_000, 1_000_000], help="размеры баз через запятую: 10k,1m,10m")
+    parser.add_argument('--dir', help="каталог для баз; готовые базы переиспользуются (по умолчанию временный)")
+    parser.add_argument('--repeat', type=int, default=20, help="вызовов в тёплом замере")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help="куда записать отчёт JSON")
+    parser.add_argument('--baseline', help="отчёт для сравнения")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="во сколько раз медленнее — регрессия")
+    parser.add_argument('--noise-ms', type=float, default=1.0, help="разница меньше — не регрессия")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, ensure_ascii=False, indent=1) + "\n", encoding='utf-8')
+        print(f"\nОтчёт: {args.save}", file=sys.stderr)
+    if not args.baseline:
+        return
+    baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+    regressions = compare(report, baseline, args.tolerance, args.noise_ms)
+    print(f"\nСравнение с {args.baseline} ({baseline.get('created')}, {baseline.get('platform')}):")
+    for size, name, key, before, after in regressions:
+        print(f"  {size:>10} {name:<34} {key:<8} {before:>10.2f} -> {after:>10.2f} мс  (x{after / before:.1f})")
+    print(f"  регрессий: {len(regressions)}")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Запросы к Bot API в секунду и CPU на запрос для разных настроек HTTP-сессии.
+
+Поддельный Bot API (aiohttp.web) работает в отдельном процессе, поэтому
+процессорное время клиента меряется без сервера. Перебираются комбинации:
+  - сессия: aiogram по умолчанию / transport.create_session;
+  - JSON: json / orjson;
+  - цикл событий: asyncio / uvloop (если установлен).
+
+Запуск: python benchmarks/bench_http.py [--requests N] [--concurrency N]
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from aiohttp import web  # noqa: E402
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+import transport  # noqa: E402
+from keyboards import get_admin_decision_kb  # noqa: E402
+
+TOKEN = "42:TEST"
+
+# Ответ на sendMessage, близкий по размеру к настоящему
+RESPONSE = (
+    '{"ok":true,"result":{"message_id":1,"from":{"id":42,"is_bot":true,"first_name":"Bot",'
+    '"username":"test_bot"},"chat":{"id":1,"first_name":"User","username":"user","type":"private"},'
+    '"date":1760000000,"text":"' + "Текст предложения " * 20 + '",'
+    '"entities":[{"offset":0,"length":5,"type":"bold"}],'
+    '"reply_markup":{"inline_keyboard":[[{"text":"ok","callback_data":"approve_1"}]]}}}'
+)
+
+
+def serve(port: int):
+    """Поддельный Bot API: на любой метод отвечает готовым сообщением"""
+    async def handler(request):
+        await request.read()
+        return web.Response(text=RESPONSE, content_type='application/json')
+
+    app = web.Application()
+    app.router.add_post('/{tail:.*}', handler)
+    web.run_app(app, host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(port: int):
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("поддельный Bot API не запустился")
+
+
+def make_session(kind: str, json_name: str, api: TelegramAPIServer, concurrency: int) -> AiohttpSession:
+    if kind == 'default':
+        _, loads, dumps = transport.json_backend(json_name)
+        return AiohttpSession(api=api, json_loads=loads, json_dumps=dumps)
+    return transport.create_session(
+        pool_size=concurrency,
+        keepalive=60,
+        dns_ttl=300,
+        timeout=30,
+        json_name=json_name,
+        api=api
+    )
+
+
+async def load(port: int, kind: str, json_name: str, requests: int, concurrency: int) -> tuple:
+    """Отправка requests сообщений с заданным числом одновременных запросов"""
+    await wait_for_server(port)
+    api = TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")
+    bot = Bot(TOKEN, session=make_session(kind, json_name, api, concurrency))
+    markup = get_admin_decision_kb(1, True)
+    remaining = iter(range(requests))
+
+    async def worker():
+        for i in remaining:
+            await bot.send_message(chat_id=1, text=f"Сообщение {i}", reply_markup=markup)
+
+    await bot.send_message(chat_id=1, text="прогрев")
+    started_wall, started_cpu = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall, cpu = time.perf_counter() - started_wall, time.process_time() - started_cpu
+    await bot.session.close()
+    return wall, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=24)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(port,), daemon=True)
+    server.start()
+
+    loops = ['asyncio']
+    if transport.loop_factory('auto')[0] == 'uvloop':
+        loops.append('uvloop')
+    else:
+        print("uvloop не установлен — замер только для asyncio")
+    jsons = ['json']
+    if transport.json_backend('auto')[0] == 'orjson':
+        jsons.append('orjson')
+
+    print(f"{args.requests} запросов sendMessage, {args.concurrency} одновременно\n")
+    print(f"{'сессия':<10}{'JSON':<9}{'цикл':<10}{'запр/с':>10}{'CPU мкс/запр':>15}")
+    try:
+        for kind, json_name, loop_name in itertools.product(('default', 'tuned'), jsons, loops):
+            _, factory = transport.loop_factory(loop_name)
+            with asyncio.Runner(loop_factory=factory) as runner:
+                wall, cpu = runner.run(load(port, kind, json_name, args.requests, args.concurrency))
+            print(f"{kind:<10}{json_name:<9}{loop_name:<10}{args.requests / wall:>10.0f}"
+                  f"{cpu / args.requests * 1e6:>15.0f}")
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
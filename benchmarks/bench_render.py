@@ -0,0 +1,98 @@
+"""Микробенчмарк стоимости рендеринга карточки и клавиатур на одно обновление.
+
+Сравнивает прежний способ (билдеры aiogram + f-строки на каждый вызов)
+с кэшированными клавиатурами и предкомпилированными шаблонами.
+
+Запуск: python benchmarks/bench_render.py [--iterations N]
+"""
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from aiogram.types import InlineKeyboardButton, KeyboardButton  # noqa: E402
+from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder  # noqa: E402
+
+from keyboards import get_admin_decision_kb, get_admin_quick_commands_kb, get_empty_inline_kb  # noqa: E402
+from templates import format_author, render_admin_submission_header, render_text_body  # noqa: E402
+
+USER_INFO = {'first_name': 'Иван <Тест>', 'username': 'ivan_test'}
+SUBMISSION = {
+    'id': 1234,
+    'allow_forward': 1,
+    'created_at': 1792413296,
+    'content': 'Новость дня: ' + 'очень важный текст & подробности ' * 10,
+}
+# Прежде время хранилось строкой SQLite
+LEGACY_CREATED_AT = '2026-10-19 12:34:56'
+
+
+def legacy_render():
+    """Рендер так, как он был реализован до кэширования"""
+    user_name = f"{USER_INFO['first_name']}"
+    if USER_INFO.get('username'):
+        user_name += f" (@{USER_INFO['username']})"
+    forward_status = "✅ Разрешена публикация с автором" if SUBMISSION['allow_forward'] else "🔒 Только анонимно"
+    header_text = (
+        f"┌─ 📬 <b>Предложение #{SUBMISSION['id']}</b>\n"
+        f"│\n"
+        f"│ 👤 От: {user_name}\n"
+        f"│ 🔐 {forward_status}\n"
+        f"│ 📅 {LEGACY_CREATED_AT[:19]}\n"
+        f"└─────────────────────\n\n"
+    )
+    text = header_text + "📄 <b>Текст предложения:</b>\n\n" + SUBMISSION['content']
+
+    builder = InlineKeyboardBuilder()
+    builder.row(InlineKeyboardButton(text="✅ Опубликовать с автором",
+                                     callback_data=f"approve_with_author_{SUBMISSION['id']}"))
+    builder.row(InlineKeyboardButton(text="✅ Опубликовать анонимно",
+                                     callback_data=f"approve_anonymous_{SUBMISSION['id']}"))
+    builder.row(InlineKeyboardButton(text="❌ Отклонить", callback_data=f"reject_{SUBMISSION['id']}"))
+    decision_kb = builder.as_markup()
+
+    reply = ReplyKeyboardBuilder()
+    reply.row(KeyboardButton(text="📬 Ожидающие"), KeyboardButton(text="📊 Статистика"))
+    reply.row(KeyboardButton(text="🔗 Сменить канал"), KeyboardButton(text="📋 Главное меню"))
+    quick_kb = reply.as_markup(resize_keyboard=True)
+
+    builder = InlineKeyboardBuilder()
+    empty_kb = builder.as_markup()
+    return text, decision_kb, quick_kb, empty_kb
+
+
+def cached_render(submission_id=SUBMISSION['id']):
+    """Рендер через шаблоны и кэш разметки"""
+    header_text = render_admin_submission_header(
+        submission_id,
+        format_author(USER_INFO),
+        SUBMISSION['allow_forward'],
+        SUBMISSION['created_at']
+    )
+    text = header_text + render_text_body(SUBMISSION['content'])
+    return text, get_admin_decision_kb(submission_id, True), get_admin_quick_commands_kb(), get_empty_inline_kb()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    counter = iter(range(10 ** 9))
+    cases = (
+        ("legacy (билдеры + f-строки)", legacy_render),
+        ("кэш, повторная карточка", cached_render),
+        # Новый id на каждый вызов: промах LRU, разметка собирается из шаблона
+        ("кэш, новая карточка", lambda: cached_render(next(counter))),
+    )
+    print(f"Python {sys.version.split()[0]}, pid {os.getpid()}, {args.iterations} итераций\n")
+    for title, func in cases:
+        seconds = min(timeit.repeat(func, number=args.iterations, repeat=3))
+        print(f"{title:<32} {seconds / args.iterations * 1e6:8.2f} мкс/обновление")
+
+
+if __name__ == '__main__':
+    main()
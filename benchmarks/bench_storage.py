@@ -0,0 +1,190 @@
+"""Размер базы и рабочий набор страниц: прежняя схема предложений против компактной.
+
+Прежняя схема: время строкой, текст решения в каждой строке, текст предложения
+без сжатия. Компактная: секунды эпохи, коды решений, сжатие длинного текста.
+Синтетическая база в прежней схеме переводится в компактную той же миграцией,
+что выполняется при запуске бота, после чего обе сравниваются:
+  - размер файла и таблицы/индексов по dbstat (сколько страниц должно поместиться
+    в кэш, чтобы типичные запросы не читали диск);
+  - время типичных запросов на новом соединении (пустой кэш SQLite).
+
+Запуск: python benchmarks/bench_storage.py [--rows N] [--dir PATH]
+"""
+import argparse
+import asyncio
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+import database  # noqa: E402
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE submissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        message_id INTEGER,
+        content_type TEXT,
+        content TEXT,
+        allow_forward INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'pending',
+        admin_decision TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        decided_at TIMESTAMP,
+        file_id TEXT,
+        file_unique_id TEXT,
+        media_meta TEXT,
+        automod_flags TEXT
+    )
+'''
+
+WORDS = (
+    "новость канал город сегодня вчера власти жители сообщили произошло событие район улица "
+    "школа больница дорога ремонт погода праздник концерт выставка спорт матч команда победа "
+    "цены магазин транспорт автобус метро мост парк фестиваль конкурс конференция проект "
+    "решение администрация губернатор мэр депутаты заявление полиция пожар авария задержание "
+    "фото видео подробности источник очевидцы информация официально предварительно данные"
+).split()
+
+DECISIONS = (
+    ('approved', "публикацией с указанием авторства"),
+    ('approved', "анонимной публикацией"),
+    ('rejected', "Отклонено администратором"),
+    ('rejected', "автомодерация: #3 word «казино»"),
+)
+
+
+def make_text(rng: random.Random) -> str:
+    # Длина — от пары строк до длинного поста, чаще короткие
+    words = max(3, int(rng.lognormvariate(3.5, 0.9)))
+    return " ".join(rng.choice(WORDS) for _ in range(min(words, 600))).capitalize() + "."
+
+
+def make_rows(rng: random.Random, count: int, texts: list):
+    start = datetime(2024, 10, 1, tzinfo=timezone.utc)
+    span = 2 * 365 * 86400
+    for i in range(1, count + 1):
+        created = start + timedelta(seconds=span * i // count)
+        media = rng.random() < 0.3
+        roll = rng.random()
+        if roll < 0.05:
+            status, decision, decided = 'pending', None, None
+        else:
+            status, decision = DECISIONS[0 if roll < 0.4 else 1 if roll < 0.65 else 2 if roll < 0.9 else 3]
+            decided = (created + timedelta(seconds=rng.randint(60, 86400))).strftime('%Y-%m-%d %H:%M:%S')
+        yield (
+            i, rng.randint(1, 50000), rng.randint(1, 10 ** 6),
+            rng.choice(('photo', 'video', 'document')) if media else 'text',
+            None if media and rng.random() < 0.4 else rng.choice(texts),
+            rng.randint(0, 1), status, decision,
+            created.strftime('%Y-%m-%d %H:%M:%S'), decided,
+            f"AgAC{rng.getrandbits(160):040x}" if media else None,
+            f"AQAD{rng.getrandbits(64):016x}" if media else None,
+            None, None,
+        )
+
+
+def build_legacy(path: Path, rows: int, seed: int):
+    rng = random.Random(seed)
+    texts = [make_text(rng) for _ in range(20000)]
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    generator = make_rows(rng, rows, texts)
+    while batch := [row for _, row in zip(range(50000), generator)]:
+        conn.executemany(f"INSERT INTO submissions VALUES ({', '.join('?' * 14)})", batch)
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+
+async def migrate(path: Path):
+    await database.connect(str(path))
+    await database.close()
+
+
+def table_sizes(path: Path) -> dict:
+    conn = sqlite3.connect(path)
+    sizes = dict(conn.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name').fetchall())
+    conn.close()
+    return sizes
+
+
+def timed(path: Path, sql: str, params=(), decode: bool = False) -> float:
+    """Запрос на новом соединении: кэш страниц SQLite пуст"""
+    conn = sqlite3.connect(path)
+    started = time.perf_counter()
+    rows = conn.execute(sql, params).fetchall()
+    if decode:
+        for row in rows:
+            database.decode_content(row[0])
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return elapsed * 1000
+
+
+def measure(path: Path, compact: bool) -> dict:
+    sizes = table_sizes(path)
+    indexes = sum(size for name, size in sizes.items() if name.startswith(('idx_submissions', 'sqlite_autoindex')))
+    day = "date(created_at, 'unixepoch')" if compact else "date(created_at)"
+    since = 1790000000 if compact else '2026-09-21 00:00:00'
+    conn = sqlite3.connect(path)
+    content_bytes = conn.execute('SELECT SUM(length(CAST(content AS BLOB))) FROM submissions').fetchone()[0]
+    conn.close()
+    return {
+        'file': path.stat().st_size,
+        'table': sizes['submissions'],
+        'indexes': indexes,
+        'content': content_bytes,
+        'by_day': timed(path, f"SELECT {day}, COUNT(*) FROM submissions GROUP BY 1"),
+        'recent': timed(path, "SELECT COUNT(*) FROM submissions WHERE status = 'approved' AND created_at >= ?",
+                        (since,)),
+        'pending': timed(path, "SELECT content FROM submissions WHERE status = 'pending' "
+                               "ORDER BY created_at LIMIT 1000", decode=compact),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--dir', help="каталог для баз (по умолчанию временный)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    directory = Path(args.dir or tempfile.mkdtemp(prefix='bench_storage_'))
+    directory.mkdir(parents=True, exist_ok=True)
+    legacy, compact = directory / 'legacy.db', directory / 'compact.db'
+    try:
+        started = time.perf_counter()
+        build_legacy(legacy, args.rows, args.seed)
+        print(f"Прежняя схема, {args.rows} строк: {time.perf_counter() - started:.1f} с")
+        shutil.copyfile(legacy, compact)
+        started = time.perf_counter()
+        asyncio.run(migrate(compact))
+        print(f"Миграция в компактную схему (с VACUUM): {time.perf_counter() - started:.1f} с\n")
+
+        results = [('прежняя', measure(legacy, False)), ('компактная', measure(compact, True))]
+        mb = 1024 * 1024
+        rows = [
+            ("файл, МБ", 'file', mb), ("таблица submissions, МБ", 'table', mb),
+            ("индексы предложений, МБ", 'indexes', mb), ("тексты предложений, МБ", 'content', mb),
+            ("по дням, полный проход, мс", 'by_day', 1), ("одобренные за 30 дней, мс", 'recent', 1),
+            ("1000 ожидающих с текстом, мс", 'pending', 1),
+        ]
+        print(f"{'':<32}" + "".join(f"{name:>14}" for name, _ in results))
+        for title, key, scale in rows:
+            print(f"{title:<32}" + "".join(f"{result[key] / scale:>14.1f}" for _, result in results))
+        print(f"\nБайт на строку таблицы: {results[0][1]['table'] / args.rows:.0f} -> "
+              f"{results[1][1]['table'] / args.rows:.0f}")
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
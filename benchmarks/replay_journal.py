@@ -0,0 +1,154 @@
+"""Воспроизведение журнала обновлений на поддельном Bot API.
+
+Записанные обновления подаются в диспетчер бота со всеми обработчиками и
+middleware. Интервалы между обновлениями берутся из журнала и сжимаются в
+--speed раз (--speed 0 — все обновления сразу). Запросы к API отвечают с
+задержкой --latency. База — копия --database или новая временная; исходная
+база не меняется.
+
+Запуск: python benchmarks/replay_journal.py journal/ [--speed 1|10|0] [--latency SEC] [--database PATH]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from aiogram.types import Chat, Message, MessageId, Update  # noqa: E402
+
+from bench_concurrency import NOW, TOKEN, SlowSession  # noqa: E402
+
+# Настройки бота читаются при импорте main: токен для проверки формата,
+# без журнала (иначе воспроизведение запишется в него же) и без лишних логов
+os.environ.setdefault('BOT_TOKEN', TOKEN)
+os.environ['JOURNAL_DIR'] = ''
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import main as bot_main  # noqa: E402
+from database import db  # noqa: E402
+from journal import read_records, segment_paths  # noqa: E402
+
+
+class FakeApiSession(SlowSession):
+    """Поддельный Bot API, который отвечает значением нужного методу типа"""
+
+    def __init__(self, latency: float, seed: int = 1):
+        super().__init__(latency, seed)
+        self.calls = Counter()
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+        self.calls[method.__api_method__] += 1
+        await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        returning = method.__returning__
+        if returning is bool:
+            return True
+        if returning is MessageId:
+            return MessageId(message_id=self.requests)
+        chat_id = getattr(method, 'chat_id', 0)
+        message = Message(
+            message_id=self.requests,
+            date=NOW,
+            chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type='private')
+        )
+        return [message] if getattr(returning, '__origin__', None) is list else message
+
+
+def journal_paths(sources: list) -> list:
+    paths = []
+    for source in map(Path, sources):
+        paths.extend(segment_paths(source) if source.is_dir() else [source])
+    return paths
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def replay(records: list, speed: float) -> tuple:
+    """Подача обновлений с исходным темпом; задержка — от плановой подачи до конца обработки"""
+    bot = bot_main.bot
+    latencies = []
+    errors = 0
+
+    async def feed(update: Update, planned: float):
+        nonlocal errors
+        try:
+            await bot_main.dp.feed_update(bot, update)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - planned)
+
+    tasks = []
+    first_ts = records[0]['ts']
+    started = time.perf_counter()
+    for record in records:
+        planned = started + (record['ts'] - first_ts) / speed if speed > 0 else started
+        delay = planned - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update = Update.model_validate(record['update'], context={'bot': bot})
+        tasks.append(asyncio.create_task(feed(update, planned)))
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started, latencies, errors
+
+
+async def run(args) -> None:
+    records = [record for record in read_records(journal_paths(args.journal)) if 'update' in record]
+    if not records:
+        print("В журнале нет обновлений")
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = str(Path(directory) / "replay.db")
+        if args.database:
+            shutil.copyfile(args.database, db_path)
+        session = FakeApiSession(args.latency)
+        # Повторы и трассировка запросов остаются в цепочке, как в работе
+        session.middleware = bot_main.bot.session.middleware
+        bot_main.bot.session = session
+        bot_main.setup_dispatcher()
+        await bot_main.prepare(db_path)
+        try:
+            # Обработчики печатают в консоль (код администратора) — в отчёт это не попадает
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed, latencies, errors = await replay(records, args.speed)
+        finally:
+            await db.close()
+
+    recorded = records[-1]['ts'] - records[0]['ts']
+    mode = f"x{args.speed:g}" if args.speed > 0 else "максимальная скорость"
+    print(f"Обновлений: {len(records)} за {recorded:.1f} с записи, воспроизведение: {mode}")
+    print(f"Время: {elapsed:.2f} с, {len(records) / elapsed:.0f} обн/с, ошибок обработки: {errors}")
+    print(f"Задержка обработки, мс: p50 {percentile(latencies, 0.5) * 1000:.1f}, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f}, p99 {percentile(latencies, 0.99) * 1000:.1f}, "
+          f"max {max(latencies) * 1000:.1f}")
+    print(f"Запросов к API: {session.requests}")
+    for method, count in session.calls.most_common(10):
+        print(f"  {method:<24}{count:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('journal', nargs='+', help="каталог журнала или файлы сегментов")
+    parser.add_argument('--speed', type=float, default=1.0, help="ускорение (0 — без пауз)")
+    parser.add_argument('--latency', type=float, default=0.05, help="задержка ответа API, с")
+    parser.add_argument('--database', help="база, копия которой используется при воспроизведении")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    finally:
+        bot_main.log_listener.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Журнал событий модерации: история предложения, сверка и пересчёт агрегатов.
+
+Агрегаты (дневная статистика, счётчики и серии авторов) пересчитываются
+из таблицы events. Рейтинг /top кэшируется ботом в памяти, поэтому rebuild
+запускайте при остановленном боте или перезапустите его после пересчёта.
+
+Запуск: python bot/audit.py [--db bot_database.db] check | rebuild | history ID
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import database
+from database import EVENT_NAMES
+
+# Таблица агрегатов -> (ключевые столбцы, столбцы значений)
+TABLES = {
+    'daily_status_stats': (('day', 'status'), ('count',)),
+    'daily_user_stats': (('day', 'user_id'), ('submitted', 'approved', 'rejected')),
+    'daily_decision_latency': (('day', 'bucket'), ('count',)),
+    'user_counters': (('period', 'user_id'), ('submitted', 'approved', 'rejected')),
+    'user_streaks': (('period', 'user_id'), ('current', 'best', 'last_day')),
+}
+
+
+def _as_rows(table: str, values: dict) -> dict:
+    """Результат пересчёта в виде {ключ: кортеж значений}, как в таблице"""
+    _, columns = TABLES[table]
+    rows = {}
+    for key, value in values.items():
+        key = key if isinstance(key, tuple) else (key,)
+        rows[key] = tuple(value[column] for column in columns) if isinstance(value, dict) else (value,)
+    return rows
+
+
+async def _current_rows(table: str) -> dict:
+    keys, columns = TABLES[table]
+    async with database._conn.execute(f"SELECT {', '.join(keys + columns)} FROM {table}") as cursor:
+        return {tuple(row[:len(keys)]): tuple(row[len(keys):]) async for row in cursor}
+
+
+async def check() -> int:
+    """Сверка таблиц агрегатов с пересчётом по журналу; возвращает число расхождений"""
+    result = await database.rebuild_from_events(write=False)
+    print(f"Событий учтено: {result['events']}")
+    mismatches = 0
+    for table in TABLES:
+        expected = _as_rows(table, result[table])
+        actual = await _current_rows(table)
+        diff = sorted(
+            (key for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key)),
+            key=str
+        )
+        mismatches += len(diff)
+        print(f"{table}: строк {len(actual)}, расхождений {len(diff)}")
+        for key in diff[:20]:
+            print(f"  {key}: в таблице {actual.get(key)}, по журналу {expected.get(key)}")
+        if len(diff) > 20:
+            print(f"  ... и ещё {len(diff) - 20}")
+    return mismatches
+
+
+async def rebuild():
+    result = await database.rebuild_from_events()
+    print(f"Событий учтено: {result['events']}")
+    for table in TABLES:
+        print(f"{table}: строк {len(result[table])}")
+
+
+async def history(submission_id: int):
+    events = await database.get_submission_events(submission_id)
+    if not events:
+        print(f"Событий по предложению #{submission_id} нет")
+        return
+    for event in events:
+        ts = datetime.fromtimestamp(event['ts'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        actor = f" кем: {event['actor_id']}" if event['actor_id'] is not None else ""
+        data = f" {json.loads(event['data'])}" if event['data'] else ""
+        print(f"{ts} UTC  {EVENT_NAMES.get(event['kind'], event['kind']):<10} автор: {event['user_id']}{actor}{data}")
+
+
+async def run(args) -> int:
+    await database.connect(args.db)
+    try:
+        if args.command == 'check':
+            return 1 if await check() else 0
+        if args.command == 'rebuild':
+            await rebuild()
+        else:
+            await history(args.submission_id)
+        return 0
+    finally:
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Журнал событий модерации")
+    parser.add_argument('--db', default=database.DB_NAME, help="файл базы")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('check', help="сверить агрегаты с журналом (код выхода 1 при расхождениях)")
+    commands.add_parser('rebuild', help="пересчитать агрегаты по журналу")
+    history_parser = commands.add_parser('history', help="события предложения")
+    history_parser.add_argument('submission_id', type=int)
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
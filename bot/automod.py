@@ -0,0 +1,278 @@
+import logging
+import re
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    # Необязательное ускорение: автомат на C (pip install pyahocorasick)
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Виды правил
+KIND_WORD = 'word'          # запрещённое слово или фраза
+KIND_DOMAIN = 'domain'      # домен ссылки (вместе с поддоменами)
+KIND_REGEX = 'regex'        # регулярное выражение
+KIND_MAX_LENGTH = 'max_length'  # максимальная длина текста, символов
+KIND_MAX_FILE_SIZE = 'max_file_size'  # максимальный размер файла, байт
+KIND_MEDIA_TYPE = 'media_type'  # запрещённый тип сообщения (photo, document, ...)
+
+KINDS = (KIND_WORD, KIND_DOMAIN, KIND_REGEX, KIND_MAX_LENGTH, KIND_MAX_FILE_SIZE, KIND_MEDIA_TYPE)
+
+# Вердикты в порядке строгости
+PASS = 'pass'
+FLAG = 'flag'
+REJECT = 'reject'
+
+ACTIONS = (FLAG, REJECT)
+_SEVERITY = {PASS: 0, FLAG: 1, REJECT: 2}
+
+# Символы, из которых состоят слова и домены (для проверки границ совпадения)
+_WORD_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz0123456789_абвгдеёжзийклмнопрстуфхцчшщъыьэюяіїєґ')
+_HOST_CHARS = _WORD_CHARS | frozenset('-')
+
+logger = logging.getLogger(__name__)
+
+
+class PyAutomaton:
+    """Автомат Ахо–Корасик на Python с интерфейсом pyahocorasick.Automaton
+    (add_word, make_automaton, iter)"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[tuple] = [()]
+
+    def add_word(self, word: str, value) -> bool:
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] += ((len(word), value),)
+        return True
+
+    def make_automaton(self):
+        """Ссылки неудач обходом в ширину; выходы наследуются по ссылкам"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, tuple]]:
+        """(индекс последнего символа совпадения, значение)"""
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0) if state else root.get(char, 0)
+            if out[state]:
+                for _, value in out[state]:
+                    yield index, value
+
+
+def _new_automaton():
+    return ahocorasick.Automaton() if ahocorasick else PyAutomaton()
+
+
+class Rule:
+    __slots__ = ('id', 'kind', 'pattern', 'action')
+
+    def __init__(self, rule_id: int, kind: str, pattern: str, action: str):
+        self.id = rule_id
+        self.kind = kind
+        self.pattern = pattern
+        self.action = action
+
+    def describe(self) -> str:
+        return f"#{self.id} {self.kind} «{self.pattern}»"
+
+
+class Verdict:
+    __slots__ = ('action', 'rules')
+
+    def __init__(self, action: str = PASS, rules: Optional[List[Rule]] = None):
+        self.action = action
+        self.rules = rules or []
+
+    def describe(self) -> str:
+        return ", ".join(rule.describe() for rule in self.rules)
+
+
+def validate_rule(kind: str, pattern: str, action: str) -> Optional[str]:
+    """Текст ошибки или None, если правило корректно"""
+    if kind not in KINDS:
+        return f"неизвестный вид правила: {kind}"
+    if action not in ACTIONS:
+        return f"неизвестное действие: {action}"
+    if not pattern:
+        return "пустой шаблон"
+    if kind in (KIND_MAX_LENGTH, KIND_MAX_FILE_SIZE) and not pattern.isdigit():
+        return "ограничение должно быть числом"
+    if kind == KIND_REGEX:
+        try:
+            re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            return f"ошибка в регулярном выражении: {e}"
+    return None
+
+
+class RuleEngine:
+    """Правила автомодерации, скомпилированные в один автомат и одно регулярное выражение.
+
+    Слова и домены ищутся автоматом Ахо–Корасик за один проход по тексту.
+    Регулярные выражения без групп и флагов внутри объединены в одно — это
+    фильтр: если оно не нашло ничего (обычный случай), правила не проверяются
+    по одному. Иначе, как и для выражений, которые объединять нельзя (обратные
+    ссылки, именованные группы, флаги вида (?i)), каждое правило ищется
+    отдельно — так находятся все сработавшие правила, даже если их совпадения
+    перекрываются. Компиляция выполняется заново только после изменения набора правил.
+    """
+
+    def __init__(self):
+        self.rules: Dict[int, Rule] = {}
+        self._dirty = True
+        self._automaton = None
+        # Объединённый фильтр и правила, которые в него входят; остальные проверяются всегда
+        self._regex: Optional[re.Pattern] = None
+        self._regex_rules: List[Tuple[Rule, re.Pattern]] = []
+        self._regex_always: List[Tuple[Rule, re.Pattern]] = []
+        self._limits: List[Rule] = []
+        self._media_types: Dict[str, List[Rule]] = {}
+
+    def load(self, rows: Iterable):
+        self.rules = {row['id']: Rule(row['id'], row['kind'], row['pattern'], row['action']) for row in rows}
+        self._dirty = True
+
+    def add(self, rule_id: int, kind: str, pattern: str, action: str):
+        self.rules[rule_id] = Rule(rule_id, kind, pattern, action)
+        self._dirty = True
+
+    def remove(self, rule_id: int) -> bool:
+        self._dirty = True
+        return self.rules.pop(rule_id, None) is not None
+
+    def _compile(self):
+        automaton = _new_automaton()
+        literals: Dict[str, list] = {}
+        regex_parts = []
+        self._regex_rules = []
+        self._regex_always = []
+        self._limits = []
+        self._media_types = {}
+
+        for rule in sorted(self.rules.values(), key=lambda rule: (-_SEVERITY[rule.action], rule.id)):
+            if rule.kind in (KIND_WORD, KIND_DOMAIN):
+                literals.setdefault(rule.pattern.lower(), []).append(rule)
+            elif rule.kind == KIND_REGEX:
+                try:
+                    compiled = re.compile(rule.pattern, re.IGNORECASE)
+                except re.error as e:
+                    # Правило из базы, записанное до проверки: пропускаем, а не ломаем проверку всех
+                    logger.error("Правило автомодерации %s не компилируется: %s", rule.describe(), e)
+                    continue
+                if compiled.groups == 0 and self._combinable(rule.pattern):
+                    regex_parts.append(f"(?:{rule.pattern})")
+                    self._regex_rules.append((rule, compiled))
+                else:
+                    self._regex_always.append((rule, compiled))
+            elif rule.kind == KIND_MEDIA_TYPE:
+                self._media_types.setdefault(rule.pattern, []).append(rule)
+            else:
+                self._limits.append(rule)
+
+        for literal, rules in literals.items():
+            automaton.add_word(literal, (len(literal), tuple(rules)))
+        if literals:
+            automaton.make_automaton()
+        self._automaton = automaton if literals else None
+        self._regex = re.compile("|".join(regex_parts), re.IGNORECASE) if regex_parts else None
+        self._dirty = False
+
+    @staticmethod
+    def _combinable(pattern: str) -> bool:
+        """Выражение можно вставить в объединённое (нет флагов, действующих на всё выражение)"""
+        try:
+            re.compile(f"x|(?:{pattern})", re.IGNORECASE)
+        except re.error:
+            return False
+        return True
+
+    @staticmethod
+    def _bounded(text: str, start: int, end: int, kind: str) -> bool:
+        """Совпадение целым словом (для домена — целым именем хоста или его суффиксом)"""
+        before = text[start - 1] if start > 0 else ' '
+        after = text[end + 1] if end + 1 < len(text) else ' '
+        if kind == KIND_WORD:
+            return before not in _WORD_CHARS and after not in _WORD_CHARS
+        if before in _HOST_CHARS or after in _HOST_CHARS:
+            return False
+        # «spam.com.evil.org» — это другой домен
+        return not (after == '.' and end + 2 < len(text) and text[end + 2] in _HOST_CHARS)
+
+    def check(
+        self,
+        text: str,
+        content_type: str = 'text',
+        file_size: Optional[int] = None,
+        urls: Iterable[str] = ()
+    ) -> Verdict:
+        """Проверка предложения: вердикт и сработавшие правила"""
+        if self._dirty:
+            self._compile()
+        matched: Dict[int, Rule] = {}
+
+        haystack = text or ""
+        urls = list(urls)
+        if urls:
+            # Ссылки из разметки (text_link) в тексте не видны
+            haystack = haystack + "\n" + "\n".join(urls)
+
+        if self._automaton is not None and haystack:
+            lowered = haystack.lower()
+            for end, (length, rules) in self._automaton.iter(lowered):
+                start = end - length + 1
+                for rule in rules:
+                    if rule.id not in matched and self._bounded(lowered, start, end, rule.kind):
+                        matched[rule.id] = rule
+
+        if haystack:
+            candidates = self._regex_always
+            if self._regex is not None and self._regex.search(haystack):
+                candidates = self._regex_rules + candidates
+            for rule, compiled in candidates:
+                if compiled.search(haystack):
+                    matched.setdefault(rule.id, rule)
+
+        for rule in self._media_types.get(content_type, ()):
+            matched.setdefault(rule.id, rule)
+        for rule in self._limits:
+            limit = int(rule.pattern)
+            if rule.kind == KIND_MAX_LENGTH and len(text or "") > limit:
+                matched.setdefault(rule.id, rule)
+            elif rule.kind == KIND_MAX_FILE_SIZE and file_size is not None and file_size > limit:
+                matched.setdefault(rule.id, rule)
+
+        if not matched:
+            return Verdict()
+        rules = sorted(matched.values(), key=lambda rule: (-_SEVERITY[rule.action], rule.id))
+        return Verdict(rules[0].action, rules)
+
+
+def submission_urls(meta: dict) -> List[str]:
+    """Адреса ссылок из разметки сообщения"""
+    return [entity['url'] for entity in meta.get('entities', ()) if entity.get('url')]
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from lifecycle import lifecycle
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BackupError(Exception):
+    """Резервная копия не создана"""
+
+
+class _Restarted(Exception):
+    """База менялась слишком часто — постраничное копирование не успевает"""
+
+
+class _Stopped(Exception):
+    """Бот останавливается — копирование прервано"""
+
+
+class BackupManager:
+    """Онлайн-копии базы через backup API SQLite.
+
+    Копирование идёт небольшими порциями страниц в отдельном потоке; между
+    порциями база свободна для записи. Если бот пишет в базу во время
+    копирования, SQLite начинает копию заново — после max_restarts таких
+    перезапусков оставшееся копируется за один шаг. Готовая копия проверяется
+    PRAGMA integrity_check и только потом получает постоянное имя.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        keep: int,
+        pages_per_step: int,
+        step_pause: float,
+        max_restarts: int = 3
+    ):
+        self.directory = Path(directory)
+        # Только что созданная копия хранится всегда
+        self.keep = max(1, keep)
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self.max_restarts = max_restarts
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def backups(self) -> List[Path]:
+        """Готовые копии, от новых к старым"""
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob('*.db'), key=lambda path: path.name, reverse=True)
+
+    def _copy(self, source_path: str, target_path: Path, pages: int) -> dict:
+        """Копирование в потоке; возвращает число страниц и перезапусков копии"""
+        restarts = 0
+        remaining_before = None
+
+        def progress(status, remaining, total):
+            nonlocal restarts, remaining_before
+            if lifecycle.stopping:
+                raise _Stopped()
+            if remaining_before is not None and remaining > remaining_before:
+                restarts += 1
+                if pages > 0 and restarts > self.max_restarts:
+                    raise _Restarted()
+            remaining_before = remaining
+            # Копирование идёт в потоке: пауза между шагами даёт боту записать в базу.
+            # sleep= у backup() — это только ожидание после SQLITE_BUSY, а не пауза между шагами
+            if remaining and self.step_pause > 0:
+                time.sleep(self.step_pause)
+
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target, pages=pages, progress=progress)
+            result = target.execute('PRAGMA integrity_check').fetchone()[0]
+            page_count = target.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        if result != 'ok':
+            raise BackupError(f"integrity_check: {result}")
+        return {'pages': page_count, 'restarts': restarts}
+
+    def _run(self, source_path: str) -> dict:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{Path(source_path).stem}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.db"
+        target = self.directory / name
+        partial = target.with_suffix('.db.part')
+        started = time.perf_counter()
+        try:
+            try:
+                stats = self._copy(source_path, partial, self.pages_per_step)
+            except _Restarted:
+                logger.warning("База часто меняется во время копирования — копируем за один шаг")
+                partial.unlink(missing_ok=True)
+                stats = self._copy(source_path, partial, -1)
+                stats['restarts'] = self.max_restarts + 1
+            partial.replace(target)
+        except _Stopped:
+            partial.unlink(missing_ok=True)
+            raise BackupError("копирование прервано остановкой бота")
+        except (sqlite3.Error, OSError) as e:
+            partial.unlink(missing_ok=True)
+            raise BackupError(str(e)) from e
+        except BackupError:
+            partial.unlink(missing_ok=True)
+            raise
+
+        result = {
+            'path': str(target),
+            'size': target.stat().st_size,
+            'duration': time.perf_counter() - started,
+            **stats,
+        }
+        self._rotate()
+        return result
+
+    def _rotate(self):
+        """Удаление копий сверх keep"""
+        for path in self.backups()[self.keep:]:
+            path.unlink(missing_ok=True)
+            logger.info("Удалена старая резервная копия %s", path.name)
+
+    async def create(self, source_path: str) -> dict:
+        """Создание копии; одновременно выполняется не больше одной"""
+        if self.running:
+            raise BackupError("резервное копирование уже выполняется")
+        async with self._lock:
+            try:
+                result = await asyncio.to_thread(self._run, source_path)
+            except BackupError:
+                metrics.inc('backup_failed')
+                raise
+        metrics.inc('backup_ok')
+        logger.info(
+            "Резервная копия %s: %d байт за %.2f с (перезапусков: %d)",
+            result['path'], result['size'], result['duration'], result['restarts']
+        )
+        return result
+
+    def due_in(self, interval: float) -> float:
+        """Секунд до следующей плановой копии (по времени последней готовой копии)"""
+        backups = self.backups()
+        if not backups:
+            return 0.0
+        return max(0.0, backups[0].stat().st_mtime + interval - time.time())
+
+    async def schedule(self, source_path: str, interval: float):
+        """Плановые копии каждые interval секунд"""
+        while await lifecycle.sleep(self.due_in(interval)):
+            try:
+                await self.create(source_path)
+            except BackupError as e:
+                logger.error("Ошибка резервного копирования: %s", e)
+                # Повторная попытка не раньше чем через час
+                if not await lifecycle.sleep(min(interval, 3600)):
+                    return
@@ -0,0 +1,136 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from database import db
+from lifecycle import lifecycle
+from metrics import metrics
+
+
+class ReviewSession:
+    """Карусель одного модератора: её сообщение, показанное предложение и заготовки следующих"""
+
+    def __init__(self, chat_id: int, message_id: Optional[int], layout: str):
+        self.chat_id = chat_id
+        # None — сообщения ещё нет, первое предложение отправляется новым
+        self.message_id = message_id
+        # text или caption — какое предложение можно показать в сообщении редактированием
+        self.layout = layout
+        self.current: Optional[dict] = None
+        # Позиция в очереди: (created_at, id) последнего загруженного предложения
+        self.cursor: Tuple[int, int] = (0, 0)
+        self.buffer: Deque[dict] = deque()
+        self.skipped: Set[int] = set()
+        self.decided: Set[int] = set()
+        self.refill: Optional[asyncio.Task] = None
+
+    @property
+    def current_id(self) -> Optional[int]:
+        return self.current['submission']['id'] if self.current else None
+
+
+class ReviewCarousel:
+    """Просмотр очереди ожидающих по одному предложению с заготовкой следующих.
+
+    Пока модератор смотрит предложение, в фоне загружаются следующие depth:
+    строки, профили авторов и готовые карточки (prepare). Переход дальше —
+    после решения или кнопкой — не ждёт Bot API ничем, кроме редактирования
+    сообщения. Перед показом заготовка сверяется с базой (revalidate): решённые
+    другими модераторами пропускаются, изменённые автором перерисовываются.
+    """
+
+    def __init__(
+        self,
+        depth: int,
+        prepare: Callable[[List], Awaitable[List[dict]]],
+        revalidate: Callable[[dict], Awaitable[Optional[dict]]]
+    ):
+        self.depth = max(1, depth)
+        self.prepare = prepare
+        self.revalidate = revalidate
+        self.sessions: Dict[int, ReviewSession] = {}
+        metrics.gauge('review_sessions', lambda: len(self.sessions))
+        metrics.gauge('review_prefetched', lambda: sum(len(s.buffer) for s in self.sessions.values()))
+
+    def open(self, moderator_id: int, chat_id: int, message_id: Optional[int], layout: str) -> ReviewSession:
+        """Новая карусель модератора (прежняя закрывается)"""
+        self.close(moderator_id)
+        session = self.sessions[moderator_id] = ReviewSession(chat_id, message_id, layout)
+        return session
+
+    def get(self, moderator_id: int, chat_id: int, message_id: int) -> Optional[ReviewSession]:
+        """Карусель модератора, если она в этом сообщении"""
+        session = self.sessions.get(moderator_id)
+        if session is not None and (session.chat_id, session.message_id) == (chat_id, message_id):
+            return session
+        return None
+
+    def showing(self, chat_id: int, message_id: int) -> bool:
+        """Сообщение — карусель (у её карточки свои кнопки)"""
+        return any(
+            (session.chat_id, session.message_id) == (chat_id, message_id)
+            for session in self.sessions.values()
+        )
+
+    def close(self, moderator_id: int) -> Optional[ReviewSession]:
+        session = self.sessions.pop(moderator_id, None)
+        if session is not None and session.refill is not None:
+            session.refill.cancel()
+        return session
+
+    def rewind(self, session: ReviewSession):
+        """Очередь заново, вместе с пропущенными"""
+        if session.refill is not None:
+            session.refill.cancel()
+        session.refill = None
+        session.buffer.clear()
+        session.skipped.clear()
+        session.cursor = (0, 0)
+
+    async def _load(self, session: ReviewSession, limit: int) -> bool:
+        """Следующая страница очереди в заготовки; False — очередь дальше пуста"""
+        rows = await db.get_pending_page(session.cursor, limit)
+        if not rows:
+            return False
+        session.cursor = (rows[-1]['created_at'], rows[-1]['id'])
+        excluded = session.skipped | session.decided
+        rows = [row for row in rows if row['id'] not in excluded and row['id'] != session.current_id]
+        if rows:
+            session.buffer.extend(await self.prepare(rows))
+            metrics.inc('review_prefetched_total', len(rows))
+        return True
+
+    async def _fill(self, session: ReviewSession):
+        while len(session.buffer) < self.depth:
+            if not await self._load(session, self.depth - len(session.buffer)):
+                break
+
+    def prefetch(self, session: ReviewSession):
+        """Фоновая загрузка заготовок до depth (не больше одной загрузки на карусель)"""
+        if len(session.buffer) < self.depth and (session.refill is None or session.refill.done()):
+            session.refill = lifecycle.spawn(self._fill(session), name="review-prefetch")
+
+    async def advance(self, session: ReviewSession) -> Optional[dict]:
+        """Следующее предложение; None — в очереди больше ничего нет.
+
+        Дойдя до конца, очередь проходится с начала ещё раз: так возвращаются
+        предложения, пролистанные кнопкой «Дальше» (пропущенные — нет).
+        """
+        wrapped = False
+        while True:
+            if not session.buffer:
+                if session.refill is not None and not session.refill.done():
+                    # Заготовки уже загружаются — ждём их, а не читаем ту же страницу второй раз
+                    await asyncio.shield(session.refill)
+                else:
+                    await self._fill(session)
+                if not session.buffer:
+                    if wrapped or session.cursor == (0, 0):
+                        return None
+                    session.cursor = (0, 0)
+                    wrapped = True
+                    continue
+                metrics.inc('review_prefetch_misses')
+            item = await self.revalidate(session.buffer.popleft())
+            if item is not None and item['submission']['id'] not in session.decided:
+                return item
@@ -10,3 +10,96 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 # Проверка наличия токена
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден! Создайте .env файл с BOT_TOKEN")
+
+# Антифлуд: лимиты на пользователя
+THROTTLE_SUBMISSIONS_PER_HOUR = int(os.getenv('THROTTLE_SUBMISSIONS_PER_HOUR', '5'))
+THROTTLE_COMMANDS_PER_SECOND = float(os.getenv('THROTTLE_COMMANDS_PER_SECOND', '2'))
+THROTTLE_COMMANDS_BURST = int(os.getenv('THROTTLE_COMMANDS_BURST', '10'))
+
+# Рейтинг авторов
+LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', '10'))
+LEADERBOARD_PUBLIC = os.getenv('LEADERBOARD_PUBLIC', '0') == '1'
+
+# Запуск и остановка
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '10'))
+READY_FILE = os.getenv('READY_FILE')
+
+# Команда модераторов
+MODERATION_STRATEGY = os.getenv('MODERATION_STRATEGY', 'least_outstanding')
+ASSIGNMENT_TIMEOUT = float(os.getenv('ASSIGNMENT_TIMEOUT', '30'))  # минут
+PRESENCE_TIMEOUT = float(os.getenv('PRESENCE_TIMEOUT', '10'))  # минут
+
+# Параллельная обработка обновлений (порядок внутри чата сохраняется)
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '16'))
+
+# Запросы к Bot API: повторы и предохранитель
+API_RETRY_ATTEMPTS = int(os.getenv('API_RETRY_ATTEMPTS', '3'))
+API_RETRY_BASE_DELAY = float(os.getenv('API_RETRY_BASE_DELAY', '0.5'))  # секунд
+API_RETRY_MAX_DELAY = float(os.getenv('API_RETRY_MAX_DELAY', '10'))  # секунд
+API_MAX_RETRY_AFTER = float(os.getenv('API_MAX_RETRY_AFTER', '60'))  # секунд
+API_BREAKER_THRESHOLD = int(os.getenv('API_BREAKER_THRESHOLD', '5'))
+API_BREAKER_RESET = float(os.getenv('API_BREAKER_RESET', '30'))  # секунд
+API_BREAKER_PROBE_TIMEOUT = float(os.getenv('API_BREAKER_PROBE_TIMEOUT', '10'))  # секунд
+
+# Темп отправки сообщений (лимиты Telegram): запросы ждут своей очереди
+API_RATE_GLOBAL = float(os.getenv('API_RATE_GLOBAL', '30'))  # сообщений в секунду всего
+API_RATE_CHAT = float(os.getenv('API_RATE_CHAT', '1'))  # в секунду в личный чат
+API_RATE_GROUP = float(os.getenv('API_RATE_GROUP', '20'))  # в минуту в группу или канал
+API_RATE_BURST = int(os.getenv('API_RATE_BURST', '3'))  # сообщений подряд без паузы
+
+# HTTP-сессия Bot API. Одновременно запросы делают обработчики (не больше
+# UPDATE_WORKERS), polling и фоновые задачи — пул подбирается под это число
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', str(UPDATE_WORKERS + 8)))
+HTTP_KEEPALIVE = float(os.getenv('HTTP_KEEPALIVE', '60'))  # секунд
+HTTP_DNS_TTL = int(os.getenv('HTTP_DNS_TTL', '300'))  # секунд
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))  # секунд (к long polling добавляется его время)
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')  # auto, orjson, json
+EVENT_LOOP = os.getenv('EVENT_LOOP', 'auto')  # auto, uvloop, asyncio
+
+# Логирование
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json, text
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.1'))  # доля массовых записей
+AIOGRAM_LOG_LEVEL = os.getenv('AIOGRAM_LOG_LEVEL', 'INFO')
+
+# Трассировка: доля обновлений, для которых пишется трасса (0 — выключено)
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+
+# Резервные копии базы
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_INTERVAL = float(os.getenv('BACKUP_INTERVAL', '24'))  # часов, 0 — без расписания
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))
+BACKUP_PAGES_PER_STEP = int(os.getenv('BACKUP_PAGES_PER_STEP', '256'))
+BACKUP_STEP_PAUSE = float(os.getenv('BACKUP_STEP_PAUSE', '0.01'))  # секунд между порциями
+
+# Журнал входящих обновлений (пустой JOURNAL_DIR — выключен)
+JOURNAL_DIR = os.getenv('JOURNAL_DIR', 'journal')
+JOURNAL_SEGMENT_SIZE = int(os.getenv('JOURNAL_SEGMENT_SIZE', '16'))  # МБ до ротации
+JOURNAL_KEEP = int(os.getenv('JOURNAL_KEEP', '20'))  # сжатых сегментов
+
+# Время жизни незавершённых сценариев (FSM), минут; 0 — без ограничения
+FSM_SUBMISSION_TTL = float(os.getenv('FSM_SUBMISSION_TTL', '30'))  # черновик предложения
+FSM_STATE_TTL = float(os.getenv('FSM_STATE_TTL', '60'))  # остальные состояния
+FSM_EXPIRY_NOTICE = os.getenv('FSM_EXPIRY_NOTICE', '1') == '1'
+FSM_SWEEP_INTERVAL = float(os.getenv('FSM_SWEEP_INTERVAL', '30'))  # секунд
+
+# Публикация в несколько направлений: повтор неудавшихся
+PUBLISH_RETRY_INTERVAL = float(os.getenv('PUBLISH_RETRY_INTERVAL', '5'))  # минут, 0 — только /republish
+PUBLISH_MAX_ATTEMPTS = int(os.getenv('PUBLISH_MAX_ATTEMPTS', '5'))
+
+# Правки автора: карточка модератора обновляется не чаще раза в столько секунд
+CARD_EDIT_DEBOUNCE = float(os.getenv('CARD_EDIT_DEBOUNCE', '3'))
+
+# Карусель модерации: сколько следующих предложений готовить заранее
+REVIEW_PREFETCH = int(os.getenv('REVIEW_PREFETCH', '5'))
+
+# Переписка модератора с автором: сколько маршрутов ответов держать в памяти
+RELAY_CACHE_SIZE = int(os.getenv('RELAY_CACHE_SIZE', '10000'))
+
+# Диагностика: локальный HTTP (/live, /health) и сторож цикла событий
+HEALTH_HOST = os.getenv('HEALTH_HOST', '127.0.0.1')
+HEALTH_PORT = int(os.getenv('HEALTH_PORT', '8080'))  # 0 — без HTTP
+LOOP_LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', '1'))  # секунд блокировки до записи стека
+HEALTH_POLL_STALE = float(os.getenv('HEALTH_POLL_STALE', '120'))  # секунд без успешного getUpdates
+HEALTH_DB_TIMEOUT = float(os.getenv('HEALTH_DB_TIMEOUT', '5'))  # секунд на проверку базы
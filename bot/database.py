@@ -1,19 +1,125 @@
 import aiosqlite
+import asyncio
+import functools
+import hashlib
+import json
+import math
+import os
 import random
 import string
-from typing import Optional
+import time
+import zlib
+from collections.abc import Mapping
+from datetime import date, datetime, timezone
+from typing import Dict, Optional
+
+from tracing import trace_methods
 
 DB_NAME = 'bot_database.db'
 
+# Версия схемы (PRAGMA user_version): 1 — компактные предложения, 2 — журнал событий,
+# 3 — направления публикации
+SCHEMA_VERSION = 4
+
+# Виды событий журнала модерации (таблица events)
+EVENT_SUBMITTED = 1
+EVENT_CLAIMED = 2
+EVENT_APPROVED = 3
+EVENT_REJECTED = 4
+EVENT_PUBLISHED = 5
+EVENT_NOTIFIED = 6
+EVENT_EDITED = 7
+
+# Виды направлений публикации
+DESTINATION_KINDS = ('channel', 'discussion', 'backup')
+
+EVENT_NAMES = {
+    EVENT_SUBMITTED: 'submitted',
+    EVENT_CLAIMED: 'claimed',
+    EVENT_APPROVED: 'approved',
+    EVENT_REJECTED: 'rejected',
+    EVENT_PUBLISHED: 'published',
+    EVENT_NOTIFIED: 'notified',
+    EVENT_EDITED: 'edited',
+}
+_DECISION_EVENTS = {'approved': EVENT_APPROVED, 'rejected': EVENT_REJECTED}
+
+# Текст предложения длиннее порога (байт UTF-8) хранится сжатым zlib
+COMPRESS_THRESHOLD = 128
+
+# Текущее время в секундах эпохи (вычисляется в SQLite)
+_NOW = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+# Таблица предложений. content — TEXT или BLOB со сжатым текстом (encode_content),
+# время — секунды эпохи UTC, decision — код из decision_codes; content_hash — отпечаток
+# текста с разметкой (file_unique_id — отпечаток медиа), revision — число правок автора
+_SUBMISSIONS_TABLE = f'''
+    CREATE TABLE IF NOT EXISTS {{name}} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        message_id INTEGER,
+        content_type TEXT,
+        content BLOB,
+        allow_forward INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'pending',
+        decision INTEGER,
+        created_at INTEGER DEFAULT ({_NOW}),
+        decided_at INTEGER,
+        file_id TEXT,
+        file_unique_id TEXT,
+        media_meta TEXT,
+        automod_flags TEXT,
+        content_hash INTEGER,
+        revision INTEGER DEFAULT 0,
+        edited_at INTEGER,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        FOREIGN KEY (decision) REFERENCES decision_codes (code)
+    )
+'''
+
 # Глобальное соединение с базой данных
 _conn = None
+_path = DB_NAME
+
+# Коды решений по тексту (таблица decision_codes только растёт)
+_decision_codes: Dict[str, int] = {}
+
+# Обработчики разных чатов выполняются параллельно, а соединение одно:
+# без блокировки commit одной задачи зафиксировал бы половину транзакции другой
+_write_lock = asyncio.Lock()
+# Когда текущая запись получила блокировку (time.monotonic) — для диагностики
+_write_started: Optional[float] = None
+
+
+def _transaction(func):
+    """Выполнение пишущей функции целиком, без чередования с другими записями"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        global _write_started
+        async with _write_lock:
+            _write_started = time.monotonic()
+            try:
+                return await func(*args, **kwargs)
+            except BaseException:
+                # Незафиксированная половина не должна уйти в commit следующей записи
+                await _conn.rollback()
+                # Коды решений, добавленные откатанной транзакцией, в базе не остались
+                _decision_codes.clear()
+                raise
+            finally:
+                _write_started = None
+    return wrapper
 
 
 async def connect(db_name: str = DB_NAME):
     """Подключение к базе данных"""
-    global _conn
+    global _conn, _path
+    _path = db_name
+    _decision_codes.clear()
     _conn = await aiosqlite.connect(db_name)
     _conn.row_factory = aiosqlite.Row
+    # WAL: чтение не ждёт записи, а обслуживание (manage.py) может работать рядом с ботом
+    await _conn.execute('PRAGMA journal_mode = WAL')
     await create_tables()
 
 
@@ -24,6 +130,33 @@ async def close():
         await _conn.close()
 
 
+async def ping() -> float:
+    """Время запроса к базе через поток aiosqlite, секунд (очередь потока входит в него)"""
+    global _conn
+    started = time.perf_counter()
+    async with _conn.execute('SELECT 1') as cursor:
+        await cursor.fetchone()
+    return time.perf_counter() - started
+
+
+async def storage_info() -> dict:
+    """Режим журнала, размеры файлов базы и сколько держится текущая запись"""
+    global _conn
+    async with _conn.execute('PRAGMA journal_mode') as cursor:
+        journal_mode = (await cursor.fetchone())[0]
+    sizes = {}
+    for name, suffix in (('db', ''), ('wal', '-wal'), ('journal', '-journal')):
+        try:
+            sizes[name] = os.path.getsize(_path + suffix)
+        except OSError:
+            sizes[name] = 0
+    return {
+        'journal_mode': journal_mode,
+        'sizes': sizes,
+        'write_held': time.monotonic() - _write_started if _write_started is not None else None,
+    }
+
+
 async def create_tables():
     """Создание таблиц"""
     global _conn
@@ -47,24 +180,496 @@ async def create_tables():
             )
         ''')
 
-        # Таблица предложений
+        # Справочник текстов решений: в предложении хранится только код
         await cursor.execute('''
-            CREATE TABLE IF NOT EXISTS submissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE IF NOT EXISTS decision_codes (
+                code INTEGER PRIMARY KEY,
+                text TEXT NOT NULL UNIQUE
+            )
+        ''')
+
+        # Журнал событий модерации: только дозапись, пишется в тех же
+        # транзакциях, что и изменения состояния; агрегаты из него восстановимы
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                ts INTEGER NOT NULL,
+                kind INTEGER NOT NULL,
+                submission_id INTEGER NOT NULL,
                 user_id INTEGER,
-                message_id INTEGER,
-                content_type TEXT,
-                content TEXT,
-                allow_forward INTEGER DEFAULT 0,
+                actor_id INTEGER,
+                data TEXT
+            )
+        ''')
+        await cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_events_submission
+            ON events (submission_id)
+        ''')
+        for operation in ('UPDATE', 'DELETE'):
+            await cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS events_no_{operation.lower()}
+                BEFORE {operation} ON events
+                BEGIN
+                    SELECT RAISE(ABORT, 'events: журнал только для дозаписи');
+                END
+            ''')
+
+        # Направления публикации: основной канал, группа обсуждения, резервный канал.
+        # По умолчанию публикуется во все is_default; удалённые остаются для истории
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS destinations (
+                id INTEGER PRIMARY KEY,
+                chat_id INTEGER NOT NULL UNIQUE,
+                title TEXT,
+                kind TEXT NOT NULL DEFAULT 'channel',
+                is_default INTEGER DEFAULT 1,
+                is_active INTEGER DEFAULT 1
+            )
+        ''')
+
+        # Публикации предложения по направлениям: pending (выбрано), sent, failed
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS publications (
+                submission_id INTEGER,
+                destination_id INTEGER,
                 status TEXT DEFAULT 'pending',
-                admin_decision TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
+                forward INTEGER DEFAULT 0,
+                message_id INTEGER,
+                attempts INTEGER DEFAULT 0,
+                error TEXT,
+                updated_at INTEGER,
+                PRIMARY KEY (submission_id, destination_id)
+            ) WITHOUT ROWID
+        ''')
+        await cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_publications_failed
+            ON publications (submission_id) WHERE status = 'failed'
+        ''')
+
+        # Таблица предложений
+        await cursor.execute(_SUBMISSIONS_TABLE.format(name='submissions'))
+        # Столбцы, добавленные до компактной схемы (нужны для её миграции)
+        await _ensure_column(cursor, 'submissions', 'decided_at', 'TIMESTAMP')
+        # Ссылки на файл в Telegram: медиа публикуется напрямую, без чата автора
+        await _ensure_column(cursor, 'submissions', 'file_id', 'TEXT')
+        await _ensure_column(cursor, 'submissions', 'file_unique_id', 'TEXT')
+        await _ensure_column(cursor, 'submissions', 'media_meta', 'TEXT')
+        # Правила автомодерации, по которым предложение помечено для модератора
+        await _ensure_column(cursor, 'submissions', 'automod_flags', 'TEXT')
+        # Правки автора после отправки
+        await _ensure_column(cursor, 'submissions', 'content_hash', 'INTEGER')
+        await _ensure_column(cursor, 'submissions', 'revision', 'INTEGER DEFAULT 0')
+        await _ensure_column(cursor, 'submissions', 'edited_at', 'INTEGER')
+        migrated = await _migrate(cursor)
+        await cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_submissions_status
+            ON submissions (status, created_at)
+        ''')
+        await cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_submissions_user
+            ON submissions (user_id, status)
+        ''')
+        # Поиск ожидающего предложения по отредактированному сообщению автора
+        await cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_submissions_message
+            ON submissions (user_id, message_id) WHERE status = 'pending'
+        ''')
+
+        # Карточки ожидающих предложений у модераторов: обновляются при правке автора
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cards (
+                submission_id INTEGER,
+                chat_id INTEGER,
+                message_id INTEGER,
+                layout TEXT,
+                detailed INTEGER DEFAULT 0,
+                revision INTEGER DEFAULT 0,
+                file_unique_id TEXT,
+                PRIMARY KEY (submission_id, chat_id, message_id)
+            ) WITHOUT ROWID
+        ''')
+        # Ответ модератора на карточку: предложение по сообщению
+        await cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_cards_message
+            ON cards (chat_id, message_id)
+        ''')
+
+        # Переписка модератора с автором: сообщение, пересланное ботом в chat_id,
+        # и куда переслать ответ на него (peer_chat_id, ответом на peer_message_id)
+        await cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS relays (
+                chat_id INTEGER,
+                message_id INTEGER,
+                submission_id INTEGER,
+                peer_chat_id INTEGER,
+                peer_message_id INTEGER,
+                created_at INTEGER DEFAULT ({_NOW}),
+                PRIMARY KEY (chat_id, message_id)
+            ) WITHOUT ROWID
+        ''')
+        await cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_relays_submission
+            ON relays (submission_id)
+        ''')
+
+        # Дневные агрегаты по статусам: submitted / approved / rejected
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_status_stats (
+                day TEXT,
+                status TEXT,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (day, status)
+            ) WITHOUT ROWID
+        ''')
+
+        # Дневные агрегаты по пользователям
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_user_stats (
+                day TEXT,
+                user_id INTEGER,
+                submitted INTEGER DEFAULT 0,
+                approved INTEGER DEFAULT 0,
+                rejected INTEGER DEFAULT 0,
+                PRIMARY KEY (day, user_id)
+            ) WITHOUT ROWID
+        ''')
+
+        # Гистограмма времени до решения: корзина b — от 2^b до 2^(b+1) секунд
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_decision_latency (
+                day TEXT,
+                bucket INTEGER,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (day, bucket)
+            ) WITHOUT ROWID
+        ''')
+
+        # Счётчики авторов по периодам ('all', 'w2026-42', 'm2026-10')
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_counters (
+                period TEXT,
+                user_id INTEGER,
+                submitted INTEGER DEFAULT 0,
+                approved INTEGER DEFAULT 0,
+                rejected INTEGER DEFAULT 0,
+                PRIMARY KEY (period, user_id)
+            ) WITHOUT ROWID
+        ''')
+        await cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_user_counters_top
+            ON user_counters (period, approved DESC)
+        ''')
+
+        # Команда модераторов (владелец — settings.admin_id, роль 'owner')
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS moderators (
+                user_id INTEGER PRIMARY KEY,
+                role TEXT DEFAULT 'moderator',
+                is_active INTEGER DEFAULT 1,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Назначение ожидающих предложений модераторам
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS assignments (
+                submission_id INTEGER PRIMARY KEY,
+                moderator_id INTEGER,
+                assigned_at INTEGER
+            )
+        ''')
+        await cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_assignments_moderator
+            ON assignments (moderator_id)
+        ''')
+
+        # Серии дней подряд с одобренными предложениями, по тем же периодам, что и счётчики
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_streaks (
+                period TEXT,
+                user_id INTEGER,
+                current INTEGER DEFAULT 0,
+                best INTEGER DEFAULT 0,
+                last_day TEXT,
+                PRIMARY KEY (period, user_id)
+            ) WITHOUT ROWID
+        ''')
+
+        # Правила автомодерации
+        await cursor.execute('''
+            CREATE TABLE IF NOT EXISTS automod_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                pattern TEXT NOT NULL,
+                action TEXT NOT NULL,
+                created_by INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
 
         await _conn.commit()
 
+    if migrated:
+        # Место старой таблицы возвращается системе только после VACUUM
+        await _conn.execute('VACUUM')
+
+
+async def _migrate(cursor) -> bool:
+    """Переход на текущую схему по PRAGMA user_version; True — данные перестроены"""
+    await cursor.execute('PRAGMA user_version')
+    version = (await cursor.fetchone())[0]
+    if version >= SCHEMA_VERSION:
+        return False
+    rebuilt = False
+    if version < 1:
+        await cursor.execute('PRAGMA table_info(submissions)')
+        rebuilt = 'admin_decision' in {row['name'] for row in await cursor.fetchall()}
+        if rebuilt:
+            await _migrate_submissions_compact(cursor)
+    if version < 2:
+        await _seed_events(cursor)
+    if version < 3:
+        # Подключённый канал становится первым направлением
+        await cursor.execute('''
+            INSERT OR IGNORE INTO destinations (chat_id, kind)
+            SELECT CAST(value AS INTEGER), 'channel' FROM settings WHERE key = 'channel_id'
+        ''')
+    if version < 4:
+        # Серии стали отдельными для каждого периода: старая таблица пересоздаётся,
+        # заполнит её backfill_user_counters при запуске бота
+        await cursor.execute('DROP TABLE IF EXISTS user_streaks')
+    await cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    return rebuilt
+
+
+async def _migrate_submissions_compact(cursor, batch_size: int = 10000):
+    """Перестройка предложений: время в секундах эпохи, коды решений, сжатый текст"""
+    await cursor.execute(_SUBMISSIONS_TABLE.format(name='submissions_compact'))
+    await cursor.execute('''
+        INSERT OR IGNORE INTO decision_codes (text)
+        SELECT DISTINCT admin_decision FROM submissions WHERE admin_decision IS NOT NULL
+    ''')
+    await cursor.execute('SELECT code, text FROM decision_codes')
+    codes = {row['text']: row['code'] for row in await cursor.fetchall()}
+
+    async with _conn.execute('''
+        SELECT id, user_id, message_id, content_type, content, allow_forward, status, admin_decision,
+               CAST(strftime('%s', created_at) AS INTEGER),
+               CAST(strftime('%s', decided_at) AS INTEGER),
+               file_id, file_unique_id, media_meta, automod_flags
+        FROM submissions
+        ORDER BY id
+    ''') as reader:
+        while rows := await reader.fetchmany(batch_size):
+            await cursor.executemany('''
+                INSERT INTO submissions_compact (
+                    id, user_id, message_id, content_type, content, allow_forward, status, decision,
+                    created_at, decided_at, file_id, file_unique_id, media_meta, automod_flags
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (
+                    row[0], row[1], row[2], row[3], encode_content(row[4]), row[5], row[6],
+                    codes.get(row[7]), *row[8:]
+                )
+                for row in rows
+            ])
+
+    # AUTOINCREMENT не выдаёт номера удалённых предложений — сохраняем счётчик
+    await cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'submissions'")
+    sequence = await cursor.fetchone()
+    await cursor.execute('DROP TABLE submissions')
+    await cursor.execute('ALTER TABLE submissions_compact RENAME TO submissions')
+    if sequence:
+        await cursor.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'submissions'",
+            (sequence['seq'],)
+        )
+
+
+async def _seed_events(cursor, after_id: int = 0):
+    """События для предложений, созданных до появления журнала (с номером больше after_id).
+
+    Если время решения не записано, берётся время создания с пометкой approx.
+    """
+    await cursor.execute(f'''
+        INSERT INTO events (ts, kind, submission_id, user_id, actor_id, data)
+        SELECT ts, kind, submission_id, user_id, actor_id, data FROM (
+            SELECT created_at AS ts, {EVENT_SUBMITTED} AS kind, id AS submission_id,
+                   user_id, user_id AS actor_id, NULL AS data
+            FROM submissions
+            WHERE id > :after_id
+            UNION ALL
+            SELECT COALESCE(decided_at, created_at),
+                   CASE status WHEN 'approved' THEN {EVENT_APPROVED} ELSE {EVENT_REJECTED} END,
+                   id, user_id, NULL,
+                   CASE WHEN decided_at IS NULL
+                        THEN json_object('decision', decision, 'approx', 1)
+                        ELSE json_object('decision', decision)
+                   END
+            FROM submissions
+            WHERE status IN ('approved', 'rejected') AND id > :after_id
+        )
+        ORDER BY ts, kind, submission_id
+    ''', {'after_id': after_id})
+
+
+async def _append_event(
+    cursor,
+    kind: int,
+    submission_id: int,
+    user_id: Optional[int],
+    actor_id: Optional[int] = None,
+    data: Optional[dict] = None
+):
+    """Запись события в журнал (в транзакции вызывающего)"""
+    await cursor.execute(f'''
+        INSERT INTO events (ts, kind, submission_id, user_id, actor_id, data)
+        VALUES ({_NOW}, ?, ?, ?, ?, ?)
+    ''', (kind, submission_id, user_id, actor_id, json.dumps(data, ensure_ascii=False) if data else None))
+
+
+def encode_content(content: Optional[str]):
+    """Текст для столбца content: длинный — сжатым BLOB, если это экономит место"""
+    if content is None:
+        return None
+    raw = content.encode('utf-8')
+    if len(raw) < COMPRESS_THRESHOLD:
+        return content
+    packed = zlib.compress(raw)
+    return packed if len(packed) < len(raw) else content
+
+
+def decode_content(value) -> Optional[str]:
+    """Обратное к encode_content"""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+_UNDECODED = object()
+
+
+def content_fingerprint(content: Optional[str], media_meta: Optional[dict] = None) -> int:
+    """Отпечаток текста вместе с разметкой (64 бита со знаком, как INTEGER в SQLite)"""
+    entities = (media_meta or {}).get('entities')
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update((content or "").encode('utf-8'))
+    if entities:
+        digest.update(json.dumps(entities, sort_keys=True).encode('utf-8'))
+    return int.from_bytes(digest.digest(), 'big', signed=True)
+
+
+class Submission(Mapping):
+    """Строка предложения; content распаковывается при первом обращении к нему"""
+    __slots__ = ('_row', '_content')
+
+    def __init__(self, row):
+        self._row = dict(row)
+        self._content = _UNDECODED
+
+    def __getitem__(self, key: str):
+        if key == 'content':
+            if self._content is _UNDECODED:
+                self._content = decode_content(self._row['content'])
+            return self._content
+        return self._row[key]
+
+    def __iter__(self):
+        return iter(self._row)
+
+    def __len__(self) -> int:
+        return len(self._row)
+
+
+async def _decision_code(cursor, text: Optional[str]) -> Optional[int]:
+    """Код текста решения (новый текст добавляется в справочник)"""
+    if text is None:
+        return None
+    code = _decision_codes.get(text)
+    if code is None:
+        await cursor.execute('INSERT OR IGNORE INTO decision_codes (text) VALUES (?)', (text,))
+        await cursor.execute('SELECT code FROM decision_codes WHERE text = ?', (text,))
+        code = _decision_codes[text] = (await cursor.fetchone())['code']
+    return code
+
+
+async def _ensure_column(cursor, table: str, column: str, definition: str):
+    """Добавление столбца в существующую таблицу (простая миграция)"""
+    await cursor.execute(f'PRAGMA table_info({table})')
+    columns = {row['name'] for row in await cursor.fetchall()}
+    if column not in columns:
+        await cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def _latency_bucket(seconds: float) -> int:
+    """Номер корзины гистограммы времени до решения"""
+    return int(math.log2(max(seconds, 1)))
+
+
+def period_keys(day: Optional[date] = None) -> dict:
+    """Ключи периодов счётчиков для дня (UTC)"""
+    day = day or datetime.now(timezone.utc).date()
+    year, week, _ = day.isocalendar()
+    return {
+        'week': f"w{year}-{week:02d}",
+        'month': f"m{day:%Y-%m}",
+        'all': 'all'
+    }
+
+
+async def _bump_user_counters(cursor, user_id: int, status: str) -> dict:
+    """Инкремент счётчиков автора за все периоды; возвращает новые значения"""
+    counters = {}
+    for name, period in period_keys().items():
+        await cursor.execute(f'''
+            INSERT INTO user_counters (period, user_id, {status})
+            VALUES (?, ?, 1)
+            ON CONFLICT (period, user_id) DO UPDATE SET {status} = {status} + 1
+            RETURNING submitted, approved, rejected
+        ''', (period, user_id))
+        counters[period] = dict(await cursor.fetchone())
+    return counters
+
+
+async def _bump_user_streak(cursor, user_id: int) -> dict:
+    """Продление серий дней с одобрениями во всех текущих периодах"""
+    streaks = {}
+    for period in period_keys().values():
+        await cursor.execute('''
+            INSERT INTO user_streaks (period, user_id, current, best, last_day)
+            VALUES (?, ?, 1, 1, date('now'))
+            ON CONFLICT (period, user_id) DO UPDATE SET
+                current = CASE
+                    WHEN last_day = date('now') THEN current
+                    WHEN last_day = date('now', '-1 day') THEN current + 1
+                    ELSE 1
+                END,
+                best = MAX(best, CASE
+                    WHEN last_day = date('now') THEN current
+                    WHEN last_day = date('now', '-1 day') THEN current + 1
+                    ELSE 1
+                END),
+                last_day = date('now')
+            RETURNING current, best, last_day
+        ''', (period, user_id))
+        streaks[period] = dict(await cursor.fetchone())
+    return streaks
+
+
+async def _bump_daily_stats(cursor, user_id: int, status: str):
+    """Инкремент сегодняшних агрегатов по статусу и пользователю"""
+    await cursor.execute('''
+        INSERT INTO daily_status_stats (day, status, count)
+        VALUES (date('now'), ?, 1)
+        ON CONFLICT (day, status) DO UPDATE SET count = count + 1
+    ''', (status,))
+    await cursor.execute(f'''
+        INSERT INTO daily_user_stats (day, user_id, {status})
+        VALUES (date('now'), ?, 1)
+        ON CONFLICT (day, user_id) DO UPDATE SET {status} = {status} + 1
+    ''', (user_id,))
+
 
 async def generate_admin_code() -> str:
     """Генерация кода администратора"""
@@ -73,6 +678,7 @@ async def generate_admin_code() -> str:
     return code
 
 
+@_transaction
 async def set_setting(key: str, value: str):
     """Установка настройки"""
     global _conn
@@ -105,17 +711,301 @@ async def set_admin(user_id: int):
     await set_setting('admin_code', '')  # Удаляем код
 
 
+@_transaction
+async def add_moderator(user_id: int, role: str = 'moderator'):
+    """Добавление (или повторная активация) модератора"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            INSERT INTO moderators (user_id, role, is_active)
+            VALUES (?, ?, 1)
+            ON CONFLICT (user_id) DO UPDATE SET role = excluded.role, is_active = 1
+        ''', (user_id, role))
+        await _conn.commit()
+
+
+@_transaction
+async def remove_moderator(user_id: int):
+    """Деактивация модератора и снятие его назначений"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('UPDATE moderators SET is_active = 0 WHERE user_id = ?', (user_id,))
+        await cursor.execute('DELETE FROM assignments WHERE moderator_id = ?', (user_id,))
+        await _conn.commit()
+
+
+async def get_moderators() -> list:
+    """Активные модераторы"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT m.user_id, m.role, u.username, u.first_name
+            FROM moderators m
+            LEFT JOIN users u ON m.user_id = u.user_id
+            WHERE m.is_active = 1
+        ''')
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
+@_transaction
+async def assign_submission(submission_id: int, moderator_id: int, assigned_at: int):
+    """Назначение предложения модератору (время — unix-секунды)"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            INSERT OR REPLACE INTO assignments (submission_id, moderator_id, assigned_at)
+            VALUES (?, ?, ?)
+        ''', (submission_id, moderator_id, assigned_at))
+        await cursor.execute(f'''
+            INSERT INTO events (ts, kind, submission_id, user_id, actor_id)
+            SELECT ?, {EVENT_CLAIMED}, id, user_id, ? FROM submissions WHERE id = ?
+        ''', (assigned_at, moderator_id, submission_id))
+        await _conn.commit()
+
+
+async def get_assignments() -> list:
+    """Назначения ожидающих предложений"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT a.submission_id, a.moderator_id, a.assigned_at, s.user_id
+            FROM assignments a
+            JOIN submissions s ON s.id = a.submission_id
+            WHERE s.status = 'pending'
+        ''')
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
+async def get_automod_rules() -> list:
+    """Правила автомодерации"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('SELECT id, kind, pattern, action FROM automod_rules ORDER BY id')
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
+@_transaction
+async def add_automod_rule(kind: str, pattern: str, action: str, created_by: int = None) -> int:
+    """Добавление правила автомодерации"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute(
+            'INSERT INTO automod_rules (kind, pattern, action, created_by) VALUES (?, ?, ?, ?)',
+            (kind, pattern, action, created_by)
+        )
+        await _conn.commit()
+        return cursor.lastrowid
+
+
+@_transaction
+async def remove_automod_rule(rule_id: int) -> bool:
+    """Удаление правила автомодерации"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('DELETE FROM automod_rules WHERE id = ?', (rule_id,))
+        await _conn.commit()
+        return cursor.rowcount > 0
+
+
 async def get_channel_id() -> Optional[int]:
     """Получение ID канала"""
     channel_id = await get_setting('channel_id')
     return int(channel_id) if channel_id else None
 
 
-async def set_channel_id(channel_id: int):
-    """Установка ID канала"""
-    await set_setting('channel_id', str(channel_id))
+@_transaction
+async def set_channel_id(channel_id: int, title: str = None):
+    """Установка основного канала: он же направление публикации по умолчанию,
+    прежний основной канал из направлений убирается"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute("SELECT value FROM settings WHERE key = 'channel_id'")
+        previous = await cursor.fetchone()
+        if previous and int(previous['value']) != channel_id:
+            await cursor.execute('UPDATE destinations SET is_active = 0 WHERE chat_id = ?', (int(previous['value']),))
+        await cursor.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES ('channel_id', ?)", (str(channel_id),)
+        )
+        await cursor.execute('''
+            INSERT INTO destinations (chat_id, title, kind)
+            VALUES (?, ?, 'channel')
+            ON CONFLICT (chat_id) DO UPDATE SET
+                title = COALESCE(excluded.title, title), is_active = 1, is_default = 1
+        ''', (channel_id, title))
+        await _conn.commit()
+
+
+async def get_destinations() -> list:
+    """Действующие направления публикации"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT id, chat_id, title, kind, is_default
+            FROM destinations
+            WHERE is_active = 1
+            ORDER BY id
+        ''')
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+@_transaction
+async def add_destination(chat_id: int, title: str, kind: str, is_default: bool = True) -> int:
+    """Добавление направления (или возврат удалённого); возвращает его номер"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            INSERT INTO destinations (chat_id, title, kind, is_default)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (chat_id) DO UPDATE SET
+                title = excluded.title, kind = excluded.kind,
+                is_default = excluded.is_default, is_active = 1
+            RETURNING id
+        ''', (chat_id, title, kind, int(is_default)))
+        destination_id = (await cursor.fetchone())['id']
+        await _conn.commit()
+        return destination_id
+
+
+@_transaction
+async def remove_destination(destination_id: int) -> bool:
+    """Удаление направления (публикации в нём остаются в истории)"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute(
+            'UPDATE destinations SET is_active = 0 WHERE id = ? AND is_active = 1', (destination_id,)
+        )
+        await _conn.commit()
+        return cursor.rowcount > 0
+
+
+@_transaction
+async def set_destination_default(destination_id: int, is_default: bool) -> bool:
+    """Публиковать ли в направление без явного выбора"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute(
+            'UPDATE destinations SET is_default = ? WHERE id = ? AND is_active = 1',
+            (int(is_default), destination_id)
+        )
+        await _conn.commit()
+        return cursor.rowcount > 0
+
+
+@_transaction
+async def set_submission_destinations(submission_id: int, destination_ids: list):
+    """Выбор направлений для предложения вместо направлений по умолчанию"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute(
+            "DELETE FROM publications WHERE submission_id = ? AND status = 'pending'", (submission_id,)
+        )
+        await cursor.executemany(f'''
+            INSERT OR IGNORE INTO publications (submission_id, destination_id, updated_at)
+            VALUES (?, ?, {_NOW})
+        ''', [(submission_id, destination_id) for destination_id in destination_ids])
+        await _conn.commit()
+
+
+async def get_publication_targets(submission_id: int) -> list:
+    """Куда ещё нужно опубликовать предложение.
+
+    Если направления выбраны или публикация уже была — неопубликованные из них
+    (только неудавшиеся, если предложение уже одобрено), иначе — направления по умолчанию.
+    """
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute(
+            'SELECT COUNT(*) FROM publications WHERE submission_id = ?', (submission_id,)
+        )
+        if (await cursor.fetchone())[0]:
+            await cursor.execute('''
+                SELECT d.id, d.chat_id, d.title, d.kind, p.forward, p.attempts
+                FROM publications p
+                JOIN destinations d ON d.id = p.destination_id
+                WHERE p.submission_id = ? AND p.status != 'sent' AND d.is_active = 1
+                ORDER BY d.id
+            ''', (submission_id,))
+        else:
+            await cursor.execute('''
+                SELECT id, chat_id, title, kind, 0 AS forward, 0 AS attempts
+                FROM destinations
+                WHERE is_default = 1 AND is_active = 1
+                ORDER BY id
+            ''')
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+@_transaction
+async def record_publications(
+    submission_id: int,
+    user_id: int,
+    actor_id: Optional[int],
+    results: list,
+    forward: bool = False
+) -> list:
+    """Итоги публикации [(направление, сообщение или исключение)]; возвращает неудавшиеся.
+
+    Удачные публикации попадают в журнал событий в той же транзакции.
+    """
+    global _conn
+    failed = []
+    async with _conn.cursor() as cursor:
+        for destination, result in results:
+            if isinstance(result, BaseException):
+                failed.append((destination, result))
+                message_id, status, error = None, 'failed', f"{type(result).__name__}: {result}"[:300]
+            else:
+                message_id, status, error = result.message_id, 'sent', None
+                await _append_event(cursor, EVENT_PUBLISHED, submission_id, user_id, actor_id, {
+                    'destination': destination['id'], 'chat_id': destination['chat_id'], 'message_id': message_id
+                })
+            await cursor.execute(f'''
+                INSERT INTO publications (
+                    submission_id, destination_id, status, forward, message_id, attempts, error, updated_at
+                )
+                VALUES (?, ?, ?, ?, ?, 1, ?, {_NOW})
+                ON CONFLICT (submission_id, destination_id) DO UPDATE SET
+                    status = excluded.status, forward = excluded.forward, message_id = excluded.message_id,
+                    attempts = attempts + 1, error = excluded.error, updated_at = excluded.updated_at
+            ''', (submission_id, destination['id'], status, int(forward), message_id, error))
+        await _conn.commit()
+    return failed
 
 
+async def get_publications(submission_id: int) -> list:
+    """Публикации предложения по направлениям"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT p.destination_id, d.chat_id, d.title, d.kind,
+                   p.status, p.message_id, p.attempts, p.error, p.updated_at
+            FROM publications p
+            JOIN destinations d ON d.id = p.destination_id
+            WHERE p.submission_id = ?
+            ORDER BY d.id
+        ''', (submission_id,))
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+async def get_failed_publications(max_attempts: int, limit: int = 100) -> list:
+    """Одобренные предложения с неудавшимися публикациями, которые ещё стоит повторить"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT DISTINCT p.submission_id
+            FROM publications p
+            JOIN submissions s ON s.id = p.submission_id
+            JOIN destinations d ON d.id = p.destination_id
+            WHERE p.status = 'failed' AND p.attempts < ? AND s.status = 'approved' AND d.is_active = 1
+            LIMIT ?
+        ''', (max_attempts, limit))
+        return [row[0] for row in await cursor.fetchall()]
+
+
+@_transaction
 async def add_user(user_id: int, username: str = None, first_name: str = None):
     """Добавление пользователя"""
     global _conn
@@ -139,49 +1029,259 @@ async def is_user_banned(user_id: int) -> bool:
         return bool(result['is_banned']) if result else False
 
 
+@_transaction
 async def add_submission(
     user_id: int,
     message_id: int,
     content_type: str,
     content: str,
-    allow_forward: bool
+    allow_forward: bool,
+    file_id: str = None,
+    file_unique_id: str = None,
+    media_meta: dict = None,
+    automod_flags: str = None
 ) -> int:
     """Добавление предложения"""
     global _conn
     async with _conn.cursor() as cursor:
         await cursor.execute('''
-            INSERT INTO submissions (user_id, message_id, content_type, content, allow_forward)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, message_id, content_type, content, allow_forward))
+            INSERT INTO submissions (
+                user_id, message_id, content_type, content, allow_forward,
+                file_id, file_unique_id, media_meta, automod_flags, content_hash
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            user_id, message_id, content_type, encode_content(content), allow_forward,
+            file_id, file_unique_id, json.dumps(media_meta, ensure_ascii=False) if media_meta else None,
+            automod_flags, content_fingerprint(content, media_meta)
+        ))
+        submission_id = cursor.lastrowid
+        await _append_event(cursor, EVENT_SUBMITTED, submission_id, user_id, actor_id=user_id)
+        await _bump_daily_stats(cursor, user_id, 'submitted')
+        await _bump_user_counters(cursor, user_id, 'submitted')
         await _conn.commit()
-        return cursor.lastrowid
+        return submission_id
 
 
 async def get_submission(submission_id: int):
     """Получение предложения по ID"""
     global _conn
     async with _conn.cursor() as cursor:
-        await cursor.execute(
-            'SELECT * FROM submissions WHERE id = ?',
-            (submission_id,)
-        )
-        return await cursor.fetchone()
+        await cursor.execute('''
+            SELECT s.*, d.text AS admin_decision
+            FROM submissions s
+            LEFT JOIN decision_codes d ON d.code = s.decision
+            WHERE s.id = ?
+        ''', (submission_id,))
+        row = await cursor.fetchone()
+        return Submission(row) if row else None
 
 
+@_transaction
 async def update_submission_status(
     submission_id: int,
     status: str,
-    admin_decision: str = None
-):
-    """Обновление статуса предложения"""
+    admin_decision: str = None,
+    actor_id: int = None,
+    expected_status: Optional[str] = 'pending'
+) -> Optional[dict]:
+    """Обновление статуса предложения.
+
+    Для решений по ожидающему предложению возвращает обновлённые счётчики автора.
+    actor_id — модератор (None — решение бота). Статус меняется, только если
+    текущий равен expected_status (None — любой): решение, принятое другим
+    модератором, не перезаписывается, и тогда возвращается None.
+    """
     global _conn
+    decision = None
     async with _conn.cursor() as cursor:
-        await cursor.execute('''
+        await cursor.execute(f'''
+            SELECT s.user_id, s.status, u.username, u.first_name,
+                   {_NOW} - s.created_at AS age
+            FROM submissions s
+            LEFT JOIN users u ON s.user_id = u.user_id
+            WHERE s.id = ?
+        ''', (submission_id,))
+        previous = await cursor.fetchone()
+
+        if not previous or (expected_status is not None and previous['status'] != expected_status):
+            return None
+
+        code = await _decision_code(cursor, admin_decision)
+        await cursor.execute(f'''
             UPDATE submissions
-            SET status = ?, admin_decision = ?
+            SET status = ?, decision = ?, decided_at = {_NOW}
             WHERE id = ?
-        ''', (status, admin_decision, submission_id))
+        ''', (status, code, submission_id))
+        await cursor.execute('DELETE FROM assignments WHERE submission_id = ?', (submission_id,))
+        await cursor.execute('DELETE FROM cards WHERE submission_id = ?', (submission_id,))
+
+        # События и агрегаты пишутся в той же транзакции, что и статус
+        if previous['status'] == 'pending' and status in ('approved', 'rejected'):
+            user_id = previous['user_id']
+            await _append_event(cursor, _DECISION_EVENTS[status], submission_id, user_id, actor_id,
+                                {'decision': code})
+            await _bump_daily_stats(cursor, previous['user_id'], status)
+            await cursor.execute('''
+                INSERT INTO daily_decision_latency (day, bucket, count)
+                VALUES (date('now'), ?, 1)
+                ON CONFLICT (day, bucket) DO UPDATE SET count = count + 1
+            ''', (_latency_bucket(previous['age'] or 0),))
+
+            decision = {
+                'user_id': previous['user_id'],
+                'username': previous['username'],
+                'first_name': previous['first_name'],
+                'status': status,
+                'counters': await _bump_user_counters(cursor, previous['user_id'], status),
+                'streak': await _bump_user_streak(cursor, previous['user_id']) if status == 'approved' else None
+            }
         await _conn.commit()
+    return decision
+
+
+async def find_pending_submission(user_id: int, message_id: int):
+    """Ожидающее предложение по сообщению автора"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT * FROM submissions
+            WHERE user_id = ? AND message_id = ? AND status = 'pending'
+        ''', (user_id, message_id))
+        row = await cursor.fetchone()
+        return Submission(row) if row else None
+
+
+@_transaction
+async def update_submission_content(
+    submission_id: int,
+    content_type: str,
+    content: Optional[str],
+    file_id: Optional[str],
+    file_unique_id: Optional[str],
+    media_meta: Optional[dict],
+    automod_flags: Optional[str]
+) -> Optional[int]:
+    """Правка ожидающего предложения автором; возвращает новую ревизию
+    (None — предложение уже рассмотрено)"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute(f'''
+            UPDATE submissions
+            SET content_type = ?, content = ?, file_id = ?, file_unique_id = ?, media_meta = ?, automod_flags = ?,
+                content_hash = ?, revision = revision + 1, edited_at = {_NOW}
+            WHERE id = ? AND status = 'pending'
+            RETURNING user_id, revision
+        ''', (
+            content_type, encode_content(content), file_id, file_unique_id,
+            json.dumps(media_meta, ensure_ascii=False) if media_meta else None, automod_flags,
+            content_fingerprint(content, media_meta), submission_id
+        ))
+        row = await cursor.fetchone()
+        if row is not None:
+            await _append_event(cursor, EVENT_EDITED, submission_id, row['user_id'], row['user_id'],
+                                {'revision': row['revision']})
+        await _conn.commit()
+        return row['revision'] if row else None
+
+
+@_transaction
+async def save_card(
+    submission_id: int,
+    chat_id: int,
+    message_id: int,
+    layout: str,
+    detailed: bool,
+    revision: int,
+    file_unique_id: Optional[str] = None
+):
+    """Запись (или обновление) карточки предложения у модератора.
+
+    layout — что в сообщении: text (заголовок и текст), caption (медиа с подписью)
+    или header (только заголовок); detailed — карточка из списка ожидающих.
+    """
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            INSERT OR REPLACE INTO cards (
+                submission_id, chat_id, message_id, layout, detailed, revision, file_unique_id
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (submission_id, chat_id, message_id, layout, int(detailed), revision, file_unique_id))
+        await _conn.commit()
+
+
+async def get_cards(submission_id: int) -> list:
+    """Карточки предложения у модераторов"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT chat_id, message_id, layout, detailed, revision, file_unique_id
+            FROM cards
+            WHERE submission_id = ?
+        ''', (submission_id,))
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+async def get_card_revision(submission_id: int, chat_id: int, message_id: int) -> Optional[int]:
+    """Ревизия предложения, показанная в карточке (None — карточка не записана)"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute(
+            'SELECT revision FROM cards WHERE submission_id = ? AND chat_id = ? AND message_id = ?',
+            (submission_id, chat_id, message_id)
+        )
+        row = await cursor.fetchone()
+        return row['revision'] if row else None
+
+
+@_transaction
+async def delete_card(submission_id: int, chat_id: int, message_id: int):
+    """Сообщение больше не показывает предложение (например, карусель перешла к следующему)"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute(
+            'DELETE FROM cards WHERE submission_id = ? AND chat_id = ? AND message_id = ?',
+            (submission_id, chat_id, message_id)
+        )
+        await _conn.commit()
+
+
+async def find_card(chat_id: int, message_id: int) -> Optional[int]:
+    """Предложение, карточка которого показана в сообщении (None — это не карточка)"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute(
+            'SELECT submission_id FROM cards WHERE chat_id = ? AND message_id = ?',
+            (chat_id, message_id)
+        )
+        row = await cursor.fetchone()
+        return row['submission_id'] if row else None
+
+
+@_transaction
+async def save_relay(chat_id: int, message_id: int, submission_id: int, peer_chat_id: int, peer_message_id: int):
+    """Запись маршрута пересланного сообщения"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            INSERT OR REPLACE INTO relays (chat_id, message_id, submission_id, peer_chat_id, peer_message_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (chat_id, message_id, submission_id, peer_chat_id, peer_message_id))
+        await _conn.commit()
+
+
+async def get_relay(chat_id: int, message_id: int) -> Optional[dict]:
+    """Маршрут ответа на пересланное сообщение (None — бот его не пересылал)"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT submission_id, peer_chat_id, peer_message_id
+            FROM relays
+            WHERE chat_id = ? AND message_id = ?
+        ''', (chat_id, message_id))
+        row = await cursor.fetchone()
+        return dict(row) if row else None
 
 
 async def get_pending_submissions_count() -> int:
@@ -229,7 +1329,26 @@ async def get_pending_submissions() -> list:
             ORDER BY s.created_at ASC
         ''')
         rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+        return [Submission(row) for row in rows]
+
+
+async def get_pending_page(after: tuple, limit: int) -> list:
+    """Следующие ожидающие предложения после (created_at, id) в порядке очереди.
+
+    Постраничный проход по индексу idx_submissions_status без OFFSET:
+    каждая страница читает только свои строки.
+    """
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT *
+            FROM submissions
+            WHERE status = 'pending' AND (created_at, id) > (?, ?)
+            ORDER BY created_at, id
+            LIMIT ?
+        ''', (*after, limit))
+        rows = await cursor.fetchall()
+        return [Submission(row) for row in rows]
 
 
 async def get_user_pending_submissions(user_id: int) -> list:
@@ -243,15 +1362,356 @@ async def get_user_pending_submissions(user_id: int) -> list:
             ORDER BY created_at ASC
         ''', (user_id,))
         rows = await cursor.fetchall()
+        return [Submission(row) for row in rows]
+
+
+@_transaction
+async def backfill_daily_stats():
+    """Разовое заполнение дневных агрегатов по существующим предложениям"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('DELETE FROM daily_status_stats')
+        await cursor.execute('DELETE FROM daily_user_stats')
+        await cursor.execute('DELETE FROM daily_decision_latency')
+
+        await cursor.execute('''
+            INSERT INTO daily_status_stats (day, status, count)
+            SELECT date(created_at, 'unixepoch'), 'submitted', COUNT(*)
+            FROM submissions
+            GROUP BY date(created_at, 'unixepoch')
+        ''')
+        # Для старых решений без decided_at берём день создания
+        await cursor.execute('''
+            INSERT INTO daily_status_stats (day, status, count)
+            SELECT date(COALESCE(decided_at, created_at), 'unixepoch'), status, COUNT(*)
+            FROM submissions
+            WHERE status IN ('approved', 'rejected')
+            GROUP BY date(COALESCE(decided_at, created_at), 'unixepoch'), status
+        ''')
+        await cursor.execute('''
+            INSERT INTO daily_user_stats (day, user_id, submitted)
+            SELECT date(created_at, 'unixepoch'), user_id, COUNT(*)
+            FROM submissions
+            GROUP BY date(created_at, 'unixepoch'), user_id
+        ''')
+        for status in ('approved', 'rejected'):
+            await cursor.execute(f'''
+                INSERT INTO daily_user_stats (day, user_id, {status})
+                SELECT date(COALESCE(decided_at, created_at), 'unixepoch'), user_id, COUNT(*)
+                FROM submissions
+                WHERE status = ?
+                GROUP BY date(COALESCE(decided_at, created_at), 'unixepoch'), user_id
+                ON CONFLICT (day, user_id) DO UPDATE SET {status} = excluded.{status}
+            ''', (status,))
+
+        # Время до решения известно только для решений с decided_at
+        await cursor.execute('''
+            SELECT date(decided_at, 'unixepoch') AS day,
+                   decided_at - created_at AS age
+            FROM submissions
+            WHERE decided_at IS NOT NULL
+        ''')
+        latency = {}
+        async for row in cursor:
+            key = (row['day'], _latency_bucket(row['age'] or 0))
+            latency[key] = latency.get(key, 0) + 1
+        await cursor.executemany(
+            'INSERT INTO daily_decision_latency (day, bucket, count) VALUES (?, ?, ?)',
+            [(day, bucket, count) for (day, bucket), count in latency.items()]
+        )
+        await _conn.commit()
+
+
+def _extend_streak(streaks: dict, key: tuple, day: date):
+    """Одобрение в день day продлевает серию key; дни приходят по возрастанию"""
+    streak = streaks.get(key)
+    if streak is None:
+        streaks[key] = {'current': 1, 'best': 1, 'last_day': day}
+    elif streak['last_day'] != day:
+        streak['current'] = streak['current'] + 1 if (day - streak['last_day']).days == 1 else 1
+        streak['best'] = max(streak['best'], streak['current'])
+        streak['last_day'] = day
+
+
+@_transaction
+async def backfill_user_counters():
+    """Разовое заполнение счётчиков авторов и серий по существующим предложениям"""
+    global _conn
+    counters = {}
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT user_id, status, date(created_at, 'unixepoch') AS created_day,
+                   date(COALESCE(decided_at, created_at), 'unixepoch') AS decided_day
+            FROM submissions
+        ''')
+        async for row in cursor:
+            events = [('submitted', row['created_day'])]
+            if row['status'] in ('approved', 'rejected'):
+                events.append((row['status'], row['decided_day']))
+            for status, day in events:
+                for period in period_keys(date.fromisoformat(day)).values():
+                    key = (period, row['user_id'])
+                    values = counters.setdefault(key, {'submitted': 0, 'approved': 0, 'rejected': 0})
+                    values[status] += 1
+
+        await cursor.execute('DELETE FROM user_counters')
+        await cursor.executemany(
+            'INSERT INTO user_counters (period, user_id, submitted, approved, rejected) VALUES (?, ?, ?, ?, ?)',
+            [
+                (period, user_id, v['submitted'], v['approved'], v['rejected'])
+                for (period, user_id), v in counters.items()
+            ]
+        )
+
+        # Серии считаем по дням с одобрениями из дневных агрегатов
+        await cursor.execute('''
+            SELECT user_id, day
+            FROM daily_user_stats
+            WHERE approved > 0
+            ORDER BY day
+        ''')
+        streaks = {}
+        async for row in cursor:
+            day = date.fromisoformat(row['day'])
+            for period in period_keys(day).values():
+                _extend_streak(streaks, (period, row['user_id']), day)
+
+        await cursor.execute('DELETE FROM user_streaks')
+        await cursor.executemany(
+            'INSERT INTO user_streaks (period, user_id, current, best, last_day) VALUES (?, ?, ?, ?, ?)',
+            [
+                (period, user_id, v['current'], v['best'], v['last_day'].isoformat())
+                for (period, user_id), v in streaks.items()
+            ]
+        )
+        await _conn.commit()
+
+
+@_transaction
+async def log_event(
+    kind: int,
+    submission_id: int,
+    user_id: int,
+    actor_id: int = None,
+    data: dict = None
+):
+    """Событие без смены статуса (например, автор уведомлён о решении)"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await _append_event(cursor, kind, submission_id, user_id, actor_id, data)
+        await _conn.commit()
+
+
+async def get_submission_events(submission_id: int) -> list:
+    """События предложения в порядке записи"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT id, ts, kind, user_id, actor_id, data
+            FROM events
+            WHERE submission_id = ?
+            ORDER BY id
+        ''', (submission_id,))
+        rows = await cursor.fetchall()
         return [dict(row) for row in rows]
 
 
+async def _aggregate_events() -> dict:
+    """Агрегаты по журналу событий за один проход.
+
+    В памяти — только сами агрегаты и время подачи ещё не решённых предложений.
+    """
+    global _conn
+    status_stats = {}
+    user_stats = {}
+    latency = {}
+    counters = {}
+    streaks = {}
+    opened = {}
+    days = {}
+    periods = {}
+    events = 0
+    async with _conn.execute(f'''
+        SELECT ts, kind, submission_id, user_id, data
+        FROM events
+        WHERE kind IN ({EVENT_SUBMITTED}, {EVENT_APPROVED}, {EVENT_REJECTED})
+        ORDER BY id
+    ''') as cursor:
+        async for ts, kind, submission_id, user_id, data in cursor:
+            events += 1
+            day = days.get(ts // 86400)
+            if day is None:
+                day = days[ts // 86400] = datetime.fromtimestamp(ts, timezone.utc).date()
+                periods[day] = tuple(period_keys(day).values())
+            if kind == EVENT_SUBMITTED:
+                status = 'submitted'
+                opened[submission_id] = ts
+            else:
+                status = 'approved' if kind == EVENT_APPROVED else 'rejected'
+                created = opened.pop(submission_id, None)
+                # Время решения старых предложений неизвестно (approx) — в гистограмму не идут
+                if created is not None and not (data and '"approx"' in data):
+                    key = (day.isoformat(), _latency_bucket(ts - created))
+                    latency[key] = latency.get(key, 0) + 1
+
+            key = (day.isoformat(), status)
+            status_stats[key] = status_stats.get(key, 0) + 1
+            key = (day.isoformat(), user_id)
+            values = user_stats.setdefault(key, {'submitted': 0, 'approved': 0, 'rejected': 0})
+            values[status] += 1
+            for period in periods[day]:
+                values = counters.setdefault((period, user_id), {'submitted': 0, 'approved': 0, 'rejected': 0})
+                values[status] += 1
+
+            # Серия — как в _bump_user_streak, только по дню события
+            if status == 'approved':
+                for period in periods[day]:
+                    _extend_streak(streaks, (period, user_id), day)
+
+    for streak in streaks.values():
+        streak['last_day'] = streak['last_day'].isoformat()
+    return {
+        'events': events,
+        'daily_status_stats': status_stats,
+        'daily_user_stats': user_stats,
+        'daily_decision_latency': latency,
+        'user_counters': counters,
+        'user_streaks': streaks,
+    }
+
+
+async def rebuild_from_events(write: bool = True) -> dict:
+    """Пересчёт дневных агрегатов, счётчиков и серий авторов по журналу событий.
+
+    При write=False таблицы не меняются — результат можно сравнить с текущими.
+    Запись блокирует другие изменения на всё время пересчёта, чтобы новые
+    события не потерялись между чтением журнала и заменой таблиц.
+    """
+    if not write:
+        return await _aggregate_events()
+    return await _replace_aggregates()
+
+
+@_transaction
+async def _replace_aggregates() -> dict:
+    global _conn
+    # Блокировка записи и для других процессов (бот рядом с manage.py)
+    await _conn.execute('BEGIN IMMEDIATE')
+    result = await _aggregate_events()
+    async with _conn.cursor() as cursor:
+        for table in ('daily_status_stats', 'daily_user_stats', 'daily_decision_latency',
+                      'user_counters', 'user_streaks'):
+            await cursor.execute(f'DELETE FROM {table}')
+        await cursor.executemany(
+            'INSERT INTO daily_status_stats (day, status, count) VALUES (?, ?, ?)',
+            [(day, status, count) for (day, status), count in result['daily_status_stats'].items()]
+        )
+        await cursor.executemany(
+            'INSERT INTO daily_user_stats (day, user_id, submitted, approved, rejected) VALUES (?, ?, ?, ?, ?)',
+            [
+                (day, user_id, v['submitted'], v['approved'], v['rejected'])
+                for (day, user_id), v in result['daily_user_stats'].items()
+            ]
+        )
+        await cursor.executemany(
+            'INSERT INTO daily_decision_latency (day, bucket, count) VALUES (?, ?, ?)',
+            [(day, bucket, count) for (day, bucket), count in result['daily_decision_latency'].items()]
+        )
+        await cursor.executemany(
+            'INSERT INTO user_counters (period, user_id, submitted, approved, rejected) VALUES (?, ?, ?, ?, ?)',
+            [
+                (period, user_id, v['submitted'], v['approved'], v['rejected'])
+                for (period, user_id), v in result['user_counters'].items()
+            ]
+        )
+        await cursor.executemany(
+            'INSERT INTO user_streaks (period, user_id, current, best, last_day) VALUES (?, ?, ?, ?, ?)',
+            [
+                (period, user_id, v['current'], v['best'], v['last_day'])
+                for (period, user_id), v in result['user_streaks'].items()
+            ]
+        )
+        await _conn.commit()
+    return result
+
+
+async def get_top_counters(period: str, limit: int) -> list:
+    """Лучшие авторы периода по числу одобрений (по индексу, без агрегации)"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT c.user_id, c.submitted, c.approved, c.rejected,
+                   u.username, u.first_name,
+                   st.current, st.best, st.last_day
+            FROM user_counters c
+            LEFT JOIN users u ON c.user_id = u.user_id
+            LEFT JOIN user_streaks st ON st.period = c.period AND st.user_id = c.user_id
+            WHERE c.period = ? AND c.approved > 0
+            ORDER BY c.approved DESC
+            LIMIT ?
+        ''', (period, limit))
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
+async def get_period_stats(start_day: str, end_day: str) -> dict:
+    """Статистика за период (дни в формате YYYY-MM-DD, включительно) по дневным агрегатам"""
+    global _conn
+    async with _conn.cursor() as cursor:
+        await cursor.execute('''
+            SELECT status, SUM(count) AS count
+            FROM daily_status_stats
+            WHERE day BETWEEN ? AND ?
+            GROUP BY status
+        ''', (start_day, end_day))
+        counts = {row['status']: row['count'] for row in await cursor.fetchall()}
+
+        await cursor.execute('''
+            SELECT COUNT(DISTINCT user_id) AS authors
+            FROM daily_user_stats
+            WHERE day BETWEEN ? AND ? AND submitted > 0
+        ''', (start_day, end_day))
+        authors = (await cursor.fetchone())['authors']
+
+        await cursor.execute('''
+            SELECT bucket, SUM(count) AS count
+            FROM daily_decision_latency
+            WHERE day BETWEEN ? AND ?
+            GROUP BY bucket
+            ORDER BY bucket
+        ''', (start_day, end_day))
+        histogram = [(row['bucket'], row['count']) for row in await cursor.fetchall()]
+
+    return {
+        'submitted': counts.get('submitted', 0),
+        'approved': counts.get('approved', 0),
+        'rejected': counts.get('rejected', 0),
+        'authors': authors or 0,
+        'latency': {p: _histogram_percentile(histogram, p) for p in (50, 90, 99)}
+    }
+
+
+def _histogram_percentile(histogram: list, percentile: int) -> Optional[int]:
+    """Оценка перцентиля (верхняя граница корзины в секундах)"""
+    total = sum(count for _, count in histogram)
+    if not total:
+        return None
+    threshold = total * percentile / 100
+    seen = 0
+    for bucket, count in histogram:
+        seen += count
+        if seen >= threshold:
+            return 2 ** (bucket + 1)
+    return 2 ** (histogram[-1][0] + 1)
+
+
 async def get_conn():
     """Получение соединения с базой данных"""
     global _conn
     return _conn
 
 
+@trace_methods('db')
 class DatabaseManager:
     """Менеджер базы данных"""
 
@@ -260,6 +1720,19 @@ class DatabaseManager:
         """Получение соединения с базой данных"""
         return _conn
 
+    @property
+    def path(self) -> str:
+        """Путь к файлу базы данных"""
+        return _path
+
+    async def ping(self) -> float:
+        """Время запроса к базе"""
+        return await ping()
+
+    async def storage_info(self) -> dict:
+        """Журнал, размеры файлов и удержание блокировки записи"""
+        return await storage_info()
+
     async def connect(self, db_name: str = DB_NAME):
         """Подключение к базе данных"""
         await connect(db_name)
@@ -276,6 +1749,10 @@ class DatabaseManager:
         """Получение настройки"""
         return await get_setting(key)
 
+    async def set_setting(self, key: str, value: str):
+        """Установка настройки"""
+        await set_setting(key, value)
+
     async def get_admin_id(self) -> Optional[int]:
         """Получение ID администратора"""
         return await get_admin_id()
@@ -284,13 +1761,88 @@ class DatabaseManager:
         """Установка администратора"""
         await set_admin(user_id)
 
+    async def add_moderator(self, user_id: int, role: str = 'moderator'):
+        """Добавление модератора"""
+        await add_moderator(user_id, role)
+
+    async def remove_moderator(self, user_id: int):
+        """Деактивация модератора"""
+        await remove_moderator(user_id)
+
+    async def get_moderators(self) -> list:
+        """Активные модераторы"""
+        return await get_moderators()
+
+    async def assign_submission(self, submission_id: int, moderator_id: int, assigned_at: int):
+        """Назначение предложения модератору"""
+        await assign_submission(submission_id, moderator_id, assigned_at)
+
+    async def get_assignments(self) -> list:
+        """Назначения ожидающих предложений"""
+        return await get_assignments()
+
+    async def get_automod_rules(self) -> list:
+        """Правила автомодерации"""
+        return await get_automod_rules()
+
+    async def add_automod_rule(self, kind: str, pattern: str, action: str, created_by: int = None) -> int:
+        """Добавление правила автомодерации"""
+        return await add_automod_rule(kind, pattern, action, created_by)
+
+    async def remove_automod_rule(self, rule_id: int) -> bool:
+        """Удаление правила автомодерации"""
+        return await remove_automod_rule(rule_id)
+
     async def get_channel_id(self) -> Optional[int]:
         """Получение ID канала"""
         return await get_channel_id()
 
-    async def set_channel_id(self, channel_id: int):
+    async def set_channel_id(self, channel_id: int, title: str = None):
         """Установка ID канала"""
-        await set_channel_id(channel_id)
+        await set_channel_id(channel_id, title)
+
+    async def get_destinations(self) -> list:
+        """Направления публикации"""
+        return await get_destinations()
+
+    async def add_destination(self, chat_id: int, title: str, kind: str, is_default: bool = True) -> int:
+        """Добавление направления публикации"""
+        return await add_destination(chat_id, title, kind, is_default)
+
+    async def remove_destination(self, destination_id: int) -> bool:
+        """Удаление направления публикации"""
+        return await remove_destination(destination_id)
+
+    async def set_destination_default(self, destination_id: int, is_default: bool) -> bool:
+        """Направление по умолчанию"""
+        return await set_destination_default(destination_id, is_default)
+
+    async def set_submission_destinations(self, submission_id: int, destination_ids: list):
+        """Выбор направлений для предложения"""
+        await set_submission_destinations(submission_id, destination_ids)
+
+    async def get_publication_targets(self, submission_id: int) -> list:
+        """Направления, куда предложение ещё не опубликовано"""
+        return await get_publication_targets(submission_id)
+
+    async def record_publications(
+        self,
+        submission_id: int,
+        user_id: int,
+        actor_id: Optional[int],
+        results: list,
+        forward: bool = False
+    ) -> list:
+        """Итоги публикации по направлениям"""
+        return await record_publications(submission_id, user_id, actor_id, results, forward)
+
+    async def get_publications(self, submission_id: int) -> list:
+        """Публикации предложения"""
+        return await get_publications(submission_id)
+
+    async def get_failed_publications(self, max_attempts: int, limit: int = 100) -> list:
+        """Предложения с неудавшимися публикациями"""
+        return await get_failed_publications(max_attempts, limit)
 
     async def add_user(self, user_id: int, username: str = None, first_name: str = None):
         """Добавление пользователя"""
@@ -300,17 +1852,120 @@ class DatabaseManager:
         """Проверка, забанен ли пользователь"""
         return await is_user_banned(user_id)
 
-    async def add_submission(self, user_id: int, message_id: int, content_type: str, content: str, allow_forward: bool) -> int:
+    async def add_submission(
+        self,
+        user_id: int,
+        message_id: int,
+        content_type: str,
+        content: str,
+        allow_forward: bool,
+        file_id: str = None,
+        file_unique_id: str = None,
+        media_meta: dict = None,
+        automod_flags: str = None
+    ) -> int:
         """Добавление предложения"""
-        return await add_submission(user_id, message_id, content_type, content, allow_forward)
+        return await add_submission(
+            user_id, message_id, content_type, content, allow_forward,
+            file_id, file_unique_id, media_meta, automod_flags
+        )
 
     async def get_submission(self, submission_id: int):
         """Получение предложения по ID"""
         return await get_submission(submission_id)
 
-    async def update_submission_status(self, submission_id: int, status: str, admin_decision: str = None):
-        """Обновление статуса предложения"""
-        await update_submission_status(submission_id, status, admin_decision)
+    async def update_submission_status(
+        self,
+        submission_id: int,
+        status: str,
+        admin_decision: str = None,
+        actor_id: int = None,
+        expected_status: Optional[str] = 'pending'
+    ) -> Optional[dict]:
+        """Обновление статуса предложения (только из expected_status)"""
+        return await update_submission_status(submission_id, status, admin_decision, actor_id, expected_status)
+
+    async def find_pending_submission(self, user_id: int, message_id: int):
+        """Ожидающее предложение по сообщению автора"""
+        return await find_pending_submission(user_id, message_id)
+
+    async def update_submission_content(
+        self,
+        submission_id: int,
+        content_type: str,
+        content: Optional[str],
+        file_id: Optional[str],
+        file_unique_id: Optional[str],
+        media_meta: Optional[dict],
+        automod_flags: Optional[str]
+    ) -> Optional[int]:
+        """Правка предложения автором"""
+        return await update_submission_content(
+            submission_id, content_type, content, file_id, file_unique_id, media_meta, automod_flags
+        )
+
+    async def save_card(
+        self,
+        submission_id: int,
+        chat_id: int,
+        message_id: int,
+        layout: str,
+        detailed: bool,
+        revision: int,
+        file_unique_id: Optional[str] = None
+    ):
+        """Запись карточки предложения"""
+        await save_card(submission_id, chat_id, message_id, layout, detailed, revision, file_unique_id)
+
+    async def get_cards(self, submission_id: int) -> list:
+        """Карточки предложения"""
+        return await get_cards(submission_id)
+
+    async def get_card_revision(self, submission_id: int, chat_id: int, message_id: int) -> Optional[int]:
+        """Ревизия, показанная в карточке"""
+        return await get_card_revision(submission_id, chat_id, message_id)
+
+    async def log_event(
+        self,
+        kind: int,
+        submission_id: int,
+        user_id: int,
+        actor_id: int = None,
+        data: dict = None
+    ):
+        """Событие, не связанное с изменением состояния"""
+        await log_event(kind, submission_id, user_id, actor_id, data)
+
+    async def get_submission_events(self, submission_id: int) -> list:
+        """История предложения"""
+        return await get_submission_events(submission_id)
+
+    async def rebuild_from_events(self, write: bool = True) -> dict:
+        """Пересчёт агрегатов по журналу событий"""
+        return await rebuild_from_events(write)
+
+    async def delete_card(self, submission_id: int, chat_id: int, message_id: int):
+        """Удаление записи о карточке"""
+        await delete_card(submission_id, chat_id, message_id)
+
+    async def find_card(self, chat_id: int, message_id: int) -> Optional[int]:
+        """Предложение по сообщению с карточкой"""
+        return await find_card(chat_id, message_id)
+
+    async def save_relay(
+        self,
+        chat_id: int,
+        message_id: int,
+        submission_id: int,
+        peer_chat_id: int,
+        peer_message_id: int
+    ):
+        """Маршрут пересланного сообщения"""
+        await save_relay(chat_id, message_id, submission_id, peer_chat_id, peer_message_id)
+
+    async def get_relay(self, chat_id: int, message_id: int) -> Optional[dict]:
+        """Маршрут ответа на пересланное сообщение"""
+        return await get_relay(chat_id, message_id)
 
     async def get_pending_submissions_count(self) -> int:
         """Получение количества ожидающих предложений"""
@@ -324,10 +1979,30 @@ class DatabaseManager:
         """Получение всех ожидающих предложений"""
         return await get_pending_submissions()
 
+    async def get_pending_page(self, after: tuple, limit: int) -> list:
+        """Страница очереди ожидающих предложений"""
+        return await get_pending_page(after, limit)
+
     async def get_user_pending_submissions(self, user_id: int) -> list:
         """Получение ожидающих предложений конкретного пользователя"""
         return await get_user_pending_submissions(user_id)
 
+    async def backfill_daily_stats(self):
+        """Разовое заполнение дневных агрегатов"""
+        await backfill_daily_stats()
+
+    async def get_period_stats(self, start_day: str, end_day: str) -> dict:
+        """Статистика за период по дневным агрегатам"""
+        return await get_period_stats(start_day, end_day)
+
+    async def backfill_user_counters(self):
+        """Разовое заполнение счётчиков авторов"""
+        await backfill_user_counters()
+
+    async def get_top_counters(self, period: str, limit: int) -> list:
+        """Лучшие авторы периода"""
+        return await get_top_counters(period, limit)
+
 
 # Создание экземпляра менеджера базы данных
 db = DatabaseManager()
@@ -0,0 +1,96 @@
+import heapq
+import itertools
+import time
+from copy import copy
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from metrics import metrics
+
+
+class ExpiringMemoryStorage(MemoryStorage):
+    """MemoryStorage, в котором состояния живут ограниченное время.
+
+    Срок отсчитывается от входа в состояние и зависит от него (ttls, иначе
+    default_ttl; None — без ограничения). Сроки лежат в куче; при смене или
+    сбросе состояния старая запись в куче не удаляется, а пропускается при
+    извлечении, поэтому expire() обходит только истёкшие записи.
+
+    Пустые записи (без состояния и данных) удаляются сразу, а чтение состояния
+    не создаёт запись — в отличие от MemoryStorage, хранилище не растёт
+    с каждым пользователем, написавшим боту.
+    """
+
+    def __init__(self, ttls: Dict[str, Optional[float]], default_ttl: Optional[float] = None):
+        super().__init__()
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self._deadlines: Dict[StorageKey, float] = {}
+        self._heap: List[Tuple[float, int, StorageKey]] = []
+        self._order = itertools.count()
+        metrics.gauge('fsm_live', lambda: sum(1 for record in self.storage.values() if record.state))
+        metrics.gauge('fsm_timers', lambda: len(self._heap))
+
+    def ttl(self, state: Optional[str]) -> Optional[float]:
+        return self.ttls.get(state, self.default_ttl) if state else None
+
+    def _discard_empty(self, key: StorageKey):
+        record = self.storage.get(key)
+        if record is not None and record.state is None and not record.data:
+            del self.storage[key]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await super().set_state(key, state)
+        ttl = self.ttl(self.storage[key].state)
+        if ttl:
+            deadline = time.monotonic() + ttl
+            self._deadlines[key] = deadline
+            heapq.heappush(self._heap, (deadline, next(self._order), key))
+        else:
+            self._deadlines.pop(key, None)
+        self._discard_empty(key)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await super().set_data(key, data)
+        self._discard_empty(key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self.storage.get(key)
+        return record.state if record else None
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self.storage.get(key)
+        return record.data.copy() if record else {}
+
+    async def get_value(self, storage_key: StorageKey, dict_key: str, default: Optional[Any] = None) -> Optional[Any]:
+        record = self.storage.get(storage_key)
+        return copy(record.data.get(dict_key, default)) if record else default
+
+    def due_in(self, limit: float) -> float:
+        """Секунд до ближайшего срока, но не больше limit"""
+        if not self._heap:
+            return limit
+        return min(limit, max(0.0, self._heap[0][0] - time.monotonic()))
+
+    def expire(self, now: Optional[float] = None) -> List[Tuple[StorageKey, str]]:
+        """Сброс истёкших состояний вместе с данными; возвращает (ключ, состояние)"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) != deadline:
+                # Состояние с тех пор сменилось или сброшено
+                continue
+            del self._deadlines[key]
+            record = self.storage.pop(key, None)
+            if record is not None and record.state:
+                expired.append((key, record.state))
+                metrics.inc('fsm_expired')
+        return expired
+
+    async def close(self) -> None:
+        self.storage.clear()
+        self._deadlines.clear()
+        self._heap.clear()
@@ -0,0 +1,299 @@
+"""Самодиагностика: задержка цикла событий, база, Bot API, очереди и память.
+
+Отчёт доступен командой /diag и по локальному HTTP:
+  /live   — процесс жив и цикл событий отвечает (всегда 200);
+  /health — полный отчёт в JSON, 503 при проблемах (цикл блокируется, база
+            не отвечает, polling давно не получал ответа, Bot API недоступен).
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from aiohttp import web
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import GetUpdates, TelegramMethod
+
+from database import db
+from lifecycle import lifecycle
+from metrics import metrics
+
+try:
+    import resource
+except ImportError:  # не Unix
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Показатели, которые в отчёте считаются очередями
+QUEUE_GAUGES = (
+    'updates_pending', 'updates_active_workers', 'journal_queue', 'journal_unacked',
+    'api_rate_waiting', 'fsm_timers', 'review_prefetched',
+)
+
+
+class ApiMonitor(BaseRequestMiddleware):
+    """Задержка и ошибки запросов к Bot API за последние window секунд.
+
+    Регистрируется последним (внутри повторов и ожидания лимитов), поэтому
+    измеряет сам HTTP-запрос, а каждая попытка считается отдельно. Long polling
+    в задержку не входит: для него запоминается время последнего ответа.
+    """
+
+    def __init__(self, window: float = 300):
+        self.window = window
+        # (time.monotonic, задержка в секундах, успех)
+        self.samples: Deque[Tuple[float, float, bool]] = deque()
+        self.last_latency: Optional[float] = None
+        self.last_poll: Optional[float] = None
+
+    def _prune(self, now: float):
+        while self.samples and self.samples[0][0] < now - self.window:
+            self.samples.popleft()
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot,
+        method: TelegramMethod
+    ):
+        started = time.monotonic()
+        try:
+            response = await make_request(bot, method)
+        except (TelegramNetworkError, TelegramServerError, TelegramRetryAfter):
+            self._record(method, started, False)
+            raise
+        except TelegramAPIError:
+            # Ответ Bot API с ошибкой запроса — сам API работает
+            self._record(method, started, True)
+            raise
+        self._record(method, started, True)
+        return response
+
+    def _record(self, method: TelegramMethod, started: float, ok: bool):
+        now = time.monotonic()
+        if isinstance(method, GetUpdates):
+            if ok:
+                self.last_poll = now
+            return
+        self.last_latency = now - started
+        self.samples.append((now, self.last_latency, ok))
+        self._prune(now)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self._prune(now)
+        latencies = sorted(latency for _, latency, _ in self.samples)
+        errors = sum(1 for _, _, ok in self.samples if not ok)
+        return {
+            'last_latency_ms': round(self.last_latency * 1000) if self.last_latency is not None else None,
+            'p95_latency_ms': round(latencies[int(len(latencies) * 0.95)] * 1000) if latencies else None,
+            'requests': len(self.samples),
+            'errors': errors,
+            'error_rate': round(errors / len(self.samples), 3) if self.samples else 0.0,
+            'last_poll_ago': round(now - self.last_poll, 1) if self.last_poll is not None else None,
+        }
+
+
+class LoopWatchdog:
+    """Задержка цикла событий и стек кода, который его блокирует.
+
+    Корутина в цикле раз в interval отмечается (heartbeat) и измеряет, насколько
+    опоздало её пробуждение. Отдельный поток следит за heartbeat: если цикл не
+    отвечает дольше threshold, в лог пишется стек потока цикла — это стек
+    корутины (или синхронного вызова в ней), которая не отдаёт управление.
+    """
+
+    def __init__(self, threshold: float, window: int = 120):
+        self.threshold = threshold
+        self.interval = min(0.5, threshold / 2)
+        self.lags: Deque[float] = deque(maxlen=window)
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._stopped = threading.Event()
+        metrics.gauge('loop_lag_ms', lambda: round(self.lags[-1] * 1000) if self.lags else 0)
+
+    async def run(self):
+        """Heartbeat в цикле событий; поток-сторож работает, пока работает корутина"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        thread.start()
+        try:
+            while True:
+                expected = time.monotonic() + self.interval
+                if not await lifecycle.sleep(self.interval):
+                    break
+                now = time.monotonic()
+                lag = max(0.0, now - expected)
+                self.lags.append(lag)
+                self._beat = now
+                if lag > self.threshold:
+                    logger.warning("Цикл событий был заблокирован %.0f мс", lag * 1000,
+                                   extra={'latency_ms': round(lag * 1000)})
+        finally:
+            self._stopped.set()
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            stalled = time.monotonic() - beat
+            if stalled < self.threshold or beat == reported:
+                continue
+            # Одна запись на каждую блокировку
+            reported = beat
+            self.stalls += 1
+            metrics.inc('loop_stalls')
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame, limit=40)) if frame is not None else "(нет стека)"
+            try:
+                task = asyncio.current_task(self._loop)
+            except RuntimeError:
+                task = None
+            logger.warning(
+                "Цикл событий не отвечает %.1f с, задача %s:\n%s",
+                stalled, task.get_name() if task is not None else "—", stack,
+                extra={'latency_ms': round(stalled * 1000)}
+            )
+
+    def stats(self) -> dict:
+        return {
+            'lag_ms': round(self.lags[-1] * 1000, 1) if self.lags else None,
+            'max_lag_ms': round(max(self.lags) * 1000, 1) if self.lags else None,
+            'stalled_s': round(time.monotonic() - self._beat, 1) if self._loop is not None else None,
+            'stalls': self.stalls,
+            'tasks': len(asyncio.all_tasks()),
+        }
+
+
+def memory_usage() -> dict:
+    """Резидентная память процесса сейчас и пиковая, байт"""
+    rss = None
+    try:
+        with open('/proc/self/statm') as statm:
+            rss = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = None
+    if resource is not None:
+        # ru_maxrss: Linux — КБ, macOS — байты
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return {'rss': rss, 'peak_rss': peak}
+
+
+class HealthMonitor:
+    """Сбор отчёта о состоянии и локальный HTTP для супервизора"""
+
+    def __init__(self, api: ApiMonitor, watchdog: LoopWatchdog, poll_stale: float, db_timeout: float):
+        self.api = api
+        self.watchdog = watchdog
+        self.poll_stale = poll_stale
+        self.db_timeout = db_timeout
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _database(self) -> dict:
+        try:
+            ping = await asyncio.wait_for(db.ping(), self.db_timeout)
+            info = await asyncio.wait_for(db.storage_info(), self.db_timeout)
+        except asyncio.TimeoutError:
+            return {'error': f"нет ответа за {self.db_timeout:.0f} с"}
+        except Exception as e:
+            return {'error': str(e)}
+        return {
+            'ping_ms': round(ping * 1000, 1),
+            'journal_mode': info['journal_mode'],
+            'size': info['sizes']['db'],
+            'wal_size': info['sizes']['wal'],
+            'write_held_s': round(info['write_held'], 1) if info['write_held'] is not None else None,
+        }
+
+    def _problems(self, report: dict) -> List[str]:
+        problems = []
+        if lifecycle.stopping:
+            problems.append("остановка")
+        elif not lifecycle.ready:
+            problems.append("запуск не завершён")
+        loop = report['loop']
+        if (loop['max_lag_ms'] or 0) > self.watchdog.threshold * 1000:
+            problems.append(f"цикл событий блокировался на {loop['max_lag_ms']:.0f} мс")
+        database = report['db']
+        if 'error' in database:
+            problems.append(f"база: {database['error']}")
+        elif (database['write_held_s'] or 0) > self.db_timeout:
+            problems.append(f"запись в базу держит блокировку {database['write_held_s']} с")
+        api = report['api']
+        poll_ago = api['last_poll_ago'] if api['last_poll_ago'] is not None else report['uptime']
+        if lifecycle.ready and poll_ago > self.poll_stale:
+            problems.append(f"polling без ответа {poll_ago:.0f} с")
+        if api['breaker'] == 'open':
+            problems.append("Bot API недоступен (предохранитель разомкнут)")
+        return problems
+
+    async def report(self) -> dict:
+        """Полный отчёт о состоянии процесса"""
+        snapshot = metrics.snapshot()
+        queues = {name: snapshot[name] for name in QUEUE_GAUGES if name in snapshot}
+        queues['in_flight'] = lifecycle.in_flight
+        report = {
+            'uptime': round(lifecycle.elapsed_ms() / 1000, 1),
+            'ready': lifecycle.ready,
+            'loop': self.watchdog.stats(),
+            'db': await self._database(),
+            'api': {**self.api.stats(), 'breaker': snapshot.get('api_breaker_state')},
+            'updates': {
+                'last_update_id': lifecycle.last_update_id,
+                'last_update_ago': (
+                    round(time.time() - lifecycle.last_update_at, 1) if lifecycle.last_update_at else None
+                ),
+            },
+            'queues': queues,
+            'memory': memory_usage(),
+        }
+        report['problems'] = self._problems(report)
+        report['status'] = 'fail' if report['problems'] else 'ok'
+        return report
+
+    async def _live(self, request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok'})
+
+    async def _health(self, request: web.Request) -> web.Response:
+        report = await self.report()
+        return web.json_response(
+            report,
+            status=503 if report['problems'] else 200,
+            dumps=functools.partial(json.dumps, ensure_ascii=False)
+        )
+
+    async def start(self, host: str, port: int):
+        """Запуск HTTP; ошибка (например, порт занят) не мешает работе бота"""
+        app = web.Application()
+        app.router.add_get('/live', self._live)
+        app.router.add_get('/health', self._health)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host, port).start()
+        except OSError as e:
+            logger.error("Не удалось открыть HTTP диагностики на %s:%s: %s", host, port, e)
+            await runner.cleanup()
+            return
+        self._runner = runner
+        logger.info("HTTP диагностики: http://%s:%s/health", host, port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,209 @@
+import gzip
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз обновление пробуют обработать заново, прежде чем отказаться
+# (обновление, на котором процесс падает, не должно ронять его при каждом запуске)
+MAX_REPLAYS = 2
+
+
+def segment_paths(directory: Path) -> List[Path]:
+    """Сегменты журнала от старых к новым (сжатые и текущий)"""
+    if not directory.exists():
+        return []
+    paths = list(directory.glob('updates-*.jsonl')) + list(directory.glob('updates-*.jsonl.gz'))
+    return sorted(paths, key=lambda path: path.name)
+
+
+def read_records(paths: Iterable[Path]) -> Iterator[dict]:
+    """Записи журнала по порядку; недописанная при падении строка пропускается"""
+    for path in paths:
+        opener = gzip.open if path.suffix == '.gz' else open
+        try:
+            with opener(path, 'rt', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        logger.warning("Повреждённая запись в журнале %s пропущена", path.name)
+        except (OSError, EOFError) as e:
+            # Сжатый сегмент, оборванный при падении, читается до места обрыва
+            logger.warning("Журнал %s прочитан не полностью: %s", path.name, e)
+
+
+class UpdateJournal:
+    """Журнал входящих обновлений: только дозапись, ротация и сжатие сегментов.
+
+    Для каждого обновления пишется запись при получении и подтверждение (ack)
+    после обработки. Запись идёт в отдельном потоке пачками: всё, что накопилось
+    в очереди, записывается и сбрасывается в файл одним вызовом. Обновления без
+    подтверждения после падения обрабатываются заново при следующем запуске.
+    """
+
+    def __init__(self, directory: str, segment_size: int, keep: int):
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.keep = keep
+        self.unacked: Set[int] = set()
+        self._known: Set[int] = set()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        metrics.gauge('journal_unacked', lambda: len(self.unacked))
+        metrics.gauge('journal_queue', self._queue.qsize)
+
+    def open(self) -> List[dict]:
+        """Запуск записи; возвращает необработанные обновления прошлого запуска.
+
+        Обработка не длится дольше ротации, поэтому достаточно двух последних
+        сегментов: обновление и его подтверждение попадают либо в один, либо в соседние.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = segment_paths(self.directory)
+        updates: Dict[int, dict] = {}
+        replays: Dict[int, int] = {}
+        for record in read_records(segments[-2:]):
+            if 'update' in record:
+                update_id = record['update']['update_id']
+                updates[update_id] = record['update']
+                self._known.add(update_id)
+            elif 'ack' in record:
+                updates.pop(record['ack'], None)
+            elif 'replay' in record:
+                replays[record['replay']] = replays.get(record['replay'], 0) + 1
+
+        pending = []
+        for update_id, update in updates.items():
+            if replays.get(update_id, 0) >= MAX_REPLAYS:
+                logger.error("Обновление %s не обработано за %d попыток — пропускаем", update_id, MAX_REPLAYS,
+                             extra={'update_id': update_id})
+                continue
+            pending.append(update)
+
+        leftovers = [path for path in segments if path.suffix == '.jsonl']
+        self._writer = threading.Thread(target=self._write_loop, args=(leftovers,), name='journal-writer', daemon=True)
+        self._writer.start()
+        return pending
+
+    def is_duplicate(self, update_id: int) -> bool:
+        """Обновление уже записано прошлым запуском (Telegram прислал его повторно)"""
+        return update_id in self._known
+
+    def record(self, update: Update):
+        self.unacked.add(update.update_id)
+        # Сериализация — в потоке записи, а не в цикле событий
+        self._queue.put(('update', time.time(), update))
+
+    def replay(self, update_id: int):
+        self.unacked.add(update_id)
+        self._queue.put(('replay', time.time(), update_id))
+
+    def ack(self, update_id: int):
+        self.unacked.discard(update_id)
+        self._queue.put(('ack', time.time(), update_id))
+
+    def _new_segment(self) -> Path:
+        return self.directory / f"updates-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.jsonl"
+
+    def _compress(self, path: Path):
+        target = path.with_name(path.name + '.gz')
+        with open(path, 'rb') as source, gzip.open(target, 'wb') as compressed:
+            while chunk := source.read(1 << 20):
+                compressed.write(chunk)
+        path.unlink()
+
+    def _rotate(self):
+        """Удаление сжатых сегментов сверх keep"""
+        compressed = [path for path in segment_paths(self.directory) if path.suffix == '.gz']
+        for path in compressed[:-self.keep] if self.keep else compressed:
+            path.unlink(missing_ok=True)
+
+    def _serialize(self, kind: str, ts: float, value) -> str:
+        if kind == 'update':
+            value = value.model_dump(mode='json', by_alias=True, exclude_unset=True, exclude_none=True)
+        return json.dumps({'ts': round(ts, 3), kind: value}, ensure_ascii=False, separators=(',', ':'))
+
+    def _write_loop(self, leftovers: List[Path]):
+        for path in leftovers:
+            self._compress(path)
+        self._rotate()
+
+        path = self._new_segment()
+        file = open(path, 'a', encoding='utf-8')
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                while not self._queue.empty():
+                    batch.append(self._queue.get())
+                stop = None in batch
+                file.write("".join(self._serialize(*item) + "\n" for item in batch if item is not None))
+                # Сброс в ОС переживает падение процесса (но не сбой питания)
+                file.flush()
+                metrics.inc('journal_batches')
+                if stop:
+                    return
+                if file.tell() >= self.segment_size:
+                    file.close()
+                    self._compress(path)
+                    self._rotate()
+                    path = self._new_segment()
+                    file = open(path, 'a', encoding='utf-8')
+        except Exception:
+            logger.exception("Ошибка записи журнала обновлений")
+        finally:
+            file.close()
+
+    def close(self):
+        """Дописать очередь (при остановке). Текущий сегмент сожмётся при следующем запуске"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+
+class JournalMiddleware(BaseMiddleware):
+    """Запись обновления при получении и подтверждение после обработки
+    (outer-middleware обновлений, первым — до ожидания очереди чата)"""
+
+    def __init__(self, journal: UpdateJournal):
+        self.journal = journal
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_id = event.update_id
+        if data.get('journal_replay'):
+            self.journal.replay(update_id)
+            metrics.inc('journal_replayed')
+        elif self.journal.is_duplicate(update_id):
+            metrics.inc('journal_duplicates')
+            logger.info("Обновление %s уже получено до перезапуска — пропускаем", update_id,
+                        extra={'update_id': update_id})
+            return None
+        else:
+            self.journal.record(event)
+        # Ошибка обработчика — тоже результат: повтор её бы не исправил.
+        # Прерванное остановкой обновление не подтверждается и будет обработано заново
+        try:
+            result = await handler(event, data)
+        except Exception:
+            self.journal.ack(update_id)
+            raise
+        self.journal.ack(update_id)
+        return result
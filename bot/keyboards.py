@@ -1,6 +1,25 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
+# Статические клавиатуры строятся один раз при первом обращении и затем
+# переиспользуются: объекты aiogram неизменяемые (frozen), поэтому одну и ту же
+# разметку безопасно отправлять в любом количестве сообщений.
+
+# Шаблоны кнопок решения администратора: (текст, префикс callback_data)
+_DECISION_TEMPLATES = {
+    True: (
+        ("✅ Опубликовать с автором", "approve_with_author_"),
+        ("✅ Опубликовать анонимно", "approve_anonymous_"),
+        ("❌ Отклонить", "reject_"),
+    ),
+    False: (
+        ("✅ Опубликовать анонимно", "approve_anonymous_"),
+        ("❌ Отклонить", "reject_"),
+    ),
+}
+
 
 def get_main_menu_kb(is_admin: bool = False, pending_count: int = 0) -> InlineKeyboardMarkup:
     """Главное меню"""
@@ -31,6 +50,7 @@ def get_main_menu_kb(is_admin: bool = False, pending_count: int = 0) -> InlineKe
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def get_user_quick_commands_kb() -> ReplyKeyboardMarkup:
     """Быстрые команды для пользователя"""
     builder = ReplyKeyboardBuilder()
@@ -46,6 +66,7 @@ def get_user_quick_commands_kb() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@lru_cache(maxsize=None)
 def get_admin_quick_commands_kb() -> ReplyKeyboardMarkup:
     """Быстрые команды для администратора"""
     builder = ReplyKeyboardBuilder()
@@ -62,6 +83,7 @@ def get_admin_quick_commands_kb() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@lru_cache(maxsize=None)
 def get_forward_choice_kb() -> InlineKeyboardMarkup:
     """Выбор разрешения пересылки"""
     builder = InlineKeyboardBuilder()
@@ -85,34 +107,40 @@ def get_forward_choice_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=256)
 def get_admin_decision_kb(submission_id: int, allow_forward: bool) -> InlineKeyboardMarkup:
     """Кнопки решения администратора"""
-    builder = InlineKeyboardBuilder()
-    
-    if allow_forward:
-        builder.row(
-            InlineKeyboardButton(
-                text="✅ Опубликовать с автором",
-                callback_data=f"approve_with_author_{submission_id}"
-            )
-        )
-    
-    builder.row(
-        InlineKeyboardButton(
-            text="✅ Опубликовать анонимно",
-            callback_data=f"approve_anonymous_{submission_id}"
-        )
-    )
-    builder.row(
-        InlineKeyboardButton(
-            text="❌ Отклонить",
-            callback_data=f"reject_{submission_id}"
-        )
-    )
-    
-    return builder.as_markup()
-
-
+    # Собираем разметку напрямую из шаблона, минуя билдер
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=f"{prefix}{submission_id}")]
+        for text, prefix in _DECISION_TEMPLATES[bool(allow_forward)]
+    ])
+
+
+@lru_cache(maxsize=256)
+def get_review_kb(submission_id: int, allow_forward: bool) -> InlineKeyboardMarkup:
+    """Кнопки карусели модерации: решение, пропуск, следующее"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=f"review_{prefix}{submission_id}")]
+        for text, prefix in _DECISION_TEMPLATES[bool(allow_forward)]
+    ] + [
+        [
+            InlineKeyboardButton(text="⏭ Пропустить", callback_data=f"review_skip_{submission_id}"),
+            InlineKeyboardButton(text="➡️ Дальше", callback_data=f"review_next_{submission_id}"),
+        ],
+        [InlineKeyboardButton(text="✖️ Закончить", callback_data="review_close")],
+    ])
+
+
+@lru_cache(maxsize=None)
+def get_review_done_kb(has_skipped: bool) -> InlineKeyboardMarkup:
+    """Очередь в карусели пройдена"""
+    rows = [[InlineKeyboardButton(text="🔄 Пройти заново", callback_data="review_restart")]] if has_skipped else []
+    rows.append([InlineKeyboardButton(text="✖️ Закончить", callback_data="review_close")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@lru_cache(maxsize=None)
 def get_cancel_kb() -> InlineKeyboardMarkup:
     """Кнопка отмены"""
     builder = InlineKeyboardBuilder()
@@ -122,6 +150,7 @@ def get_cancel_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def get_empty_inline_kb() -> InlineKeyboardMarkup:
     """Пустая inline-клавиатура (убирает кнопки под сообщением)"""
     return InlineKeyboardMarkup(inline_keyboard=[])
@@ -130,6 +159,9 @@ def get_empty_inline_kb() -> InlineKeyboardMarkup:
 def get_pending_submissions_kb(submissions: list) -> InlineKeyboardMarkup:
     """Клавиатура со списком ожидающих предложений"""
     builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="🎠 Смотреть по очереди", callback_data="review_open")
+    )
 
     for submission in submissions:
         content = submission.get('content') or ""
@@ -148,3 +180,23 @@ def get_pending_submissions_kb(submissions: list) -> InlineKeyboardMarkup:
         )
 
     return builder.as_markup()
+
+
+@lru_cache(maxsize=None)
+def get_stats_period_kb() -> InlineKeyboardMarkup:
+    """Выбор периода статистики"""
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="Вчера и сегодня", callback_data="stats_period_24h"),
+        InlineKeyboardButton(text="7 дней", callback_data="stats_period_7d"),
+        InlineKeyboardButton(text="30 дней", callback_data="stats_period_30d"),
+    ]])
+
+
+@lru_cache(maxsize=None)
+def get_leaderboard_period_kb() -> InlineKeyboardMarkup:
+    """Выбор периода рейтинга авторов"""
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="Неделя", callback_data="top_period_week"),
+        InlineKeyboardButton(text="Месяц", callback_data="top_period_month"),
+        InlineKeyboardButton(text="Всё время", callback_data="top_period_all"),
+    ]])
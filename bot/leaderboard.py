@@ -0,0 +1,126 @@
+from datetime import date, datetime, timedelta, timezone
+from html import escape
+from typing import Dict, List, Optional
+
+from database import db, period_keys
+
+PERIOD_TITLES = {
+    'week': "за неделю",
+    'month': "за месяц",
+    'all': "за всё время",
+}
+
+
+class TopK:
+    """Топ-K авторов одного периода по числу одобрений.
+
+    Одобрения только растут, поэтому автор вне топа может попасть в него
+    лишь в момент своего одобрения — достаточно сравнить его с последним местом.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries: Dict[int, dict] = {}
+
+    def _last(self) -> Optional[int]:
+        return min(self.entries, key=lambda user_id: self.entries[user_id]['approved'], default=None)
+
+    def offer(self, user_id: int, entry: dict):
+        """Обновление записи автора или попытка войти в топ"""
+        if user_id in self.entries:
+            self.entries[user_id].update(entry)
+            return
+        if not entry.get('approved'):
+            return
+        if len(self.entries) < self.size:
+            self.entries[user_id] = entry
+            return
+        last = self._last()
+        if entry['approved'] > self.entries[last]['approved']:
+            del self.entries[last]
+            self.entries[user_id] = entry
+
+    def ranked(self) -> List[dict]:
+        """Записи по убыванию одобрений (O(K log K), K мало)"""
+        return sorted(
+            ({'user_id': user_id, **entry} for user_id, entry in self.entries.items()),
+            key=lambda entry: (-entry['approved'], entry['user_id'])
+        )
+
+
+class Leaderboard:
+    """Лучшие авторы по периодам, поддерживаемые инкрементально"""
+
+    def __init__(self, size: int = 10):
+        self.size = size
+        self._boards: Dict[str, TopK] = {}
+
+    async def _board(self, period: str) -> TopK:
+        """Топ периода; при первом обращении загружается из счётчиков"""
+        board = self._boards.get(period)
+        if board is None:
+            # Регистрируем топ до загрузки, чтобы не потерять решения,
+            # зафиксированные во время запроса; их данные свежее загруженных
+            board = self._boards[period] = TopK(self.size)
+            for row in await db.get_top_counters(period, self.size):
+                user_id = row.pop('user_id')
+                if user_id not in board.entries:
+                    board.offer(user_id, row)
+            # Старые недели и месяцы больше не обновляются
+            current = set(period_keys().values())
+            for key in [key for key in self._boards if key not in current]:
+                del self._boards[key]
+        return board
+
+    def record(self, decision: Optional[dict]):
+        """Учёт решения, уже зафиксированного в базе"""
+        if not decision:
+            return
+        for period, counters in decision['counters'].items():
+            board = self._boards.get(period)
+            if board is None:
+                # Ещё не загружен — загрузится из базы вместе с этим решением
+                continue
+            entry = {
+                **counters,
+                'username': decision['username'],
+                'first_name': decision['first_name'],
+            }
+            if decision['streak']:
+                entry.update(decision['streak'][period])
+            board.offer(decision['user_id'], entry)
+
+    async def top(self, period_name: str) -> List[dict]:
+        """Топ для периода 'week', 'month' или 'all'"""
+        return (await self._board(period_keys()[period_name])).ranked()
+
+
+def _current_streak(entry: dict) -> int:
+    """Серия актуальна, если последнее одобрение было сегодня или вчера"""
+    if not entry.get('last_day'):
+        return 0
+    today = datetime.now(timezone.utc).date()
+    if date.fromisoformat(entry['last_day']) < today - timedelta(days=1):
+        return 0
+    return entry.get('current') or 0
+
+
+def render_leaderboard(period_name: str, entries: List[dict], public: bool = False) -> str:
+    """Карточка рейтинга авторов"""
+    text = f"🏆 <b>Лучшие авторы {PERIOD_TITLES[period_name]}</b>\n\n"
+    if not entries:
+        return text + "Пока нет одобренных предложений."
+
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    for place, entry in enumerate(entries, start=1):
+        name = escape(entry.get('first_name') or f"ID {entry['user_id']}", quote=False)
+        if entry.get('username') and not public:
+            name += f" (@{escape(entry['username'], quote=False)})"
+        decided = entry['approved'] + entry['rejected']
+        rate = entry['approved'] / decided * 100 if decided else 0
+        line = f"{medals.get(place, f'{place}.')} {name} — ✅ {entry['approved']} ({rate:.0f}%)"
+        streak = _current_streak(entry)
+        if streak > 1:
+            line += f" 🔥 {streak} дн."
+        text += line + "\n"
+    return text
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Callable, Coroutine, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """Запуск и корректная остановка: фоновые задачи, обработчики в работе, готовность"""
+
+    def __init__(self):
+        self.boot_started = time.perf_counter()
+        self.ready = False
+        self.stopping = False
+        self.last_update_id: Optional[int] = None
+        # Unix-время последнего обновления, обработанного без ошибки
+        self.last_update_at: Optional[float] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._debounced: Dict[Hashable, Callable[[], Coroutine]] = {}
+        self._ready_file: Optional[Path] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+    def _stop(self) -> asyncio.Event:
+        if self._stop_event is None:
+            self._stop_event = asyncio.Event()
+        return self._stop_event
+
+    async def sleep(self, seconds: float) -> bool:
+        """Пауза для периодических задач; False — пора завершаться"""
+        if self.stopping:
+            return False
+        try:
+            await asyncio.wait_for(self._stop().wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            return True
+        return False
+
+    @property
+    def in_flight(self) -> int:
+        """Количество незавершённых задач"""
+        return len(self._tasks)
+
+    def _track(self, task: asyncio.Task):
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def spawn(self, coro: Coroutine, name: Optional[str] = None) -> asyncio.Task:
+        """Запуск фоновой задачи, которую дождутся при остановке"""
+        task = asyncio.create_task(coro, name=name)
+        self._track(task)
+        return task
+
+    def debounce(self, key: Hashable, delay: float, factory: Callable[[], Coroutine]):
+        """Отложенный запуск factory(): вызовы с тем же ключом за delay секунд
+        сливаются в один. Выполняется factory последнего вызова; при остановке — сразу"""
+        scheduled = key in self._debounced
+        self._debounced[key] = factory
+        if not scheduled:
+            self.spawn(self._run_debounced(key, delay), name=f"debounce-{key}")
+
+    async def _run_debounced(self, key: Hashable, delay: float):
+        await self.sleep(delay)
+        # Вызов во время выполнения запланирует следующий запуск
+        factory = self._debounced.pop(key)
+        try:
+            await factory()
+        except Exception:
+            logger.exception("Ошибка отложенной задачи %s", key)
+
+    def track_current(self, update_id: Optional[int] = None):
+        """Учёт текущей задачи обработки обновления"""
+        task = asyncio.current_task()
+        if task is not None:
+            self._track(task)
+        if update_id is not None and (self.last_update_id is None or update_id > self.last_update_id):
+            self.last_update_id = update_id
+
+    def elapsed_ms(self) -> float:
+        """Миллисекунды с начала загрузки процесса"""
+        return (time.perf_counter() - self.boot_started) * 1000
+
+    def mark_ready(self, ready_file: Optional[str] = None):
+        """Сигнал готовности: файл-маркер и/или systemd notify"""
+        self.ready = True
+        if ready_file:
+            self._ready_file = Path(ready_file)
+            self._ready_file.write_text(str(os.getpid()))
+        _sd_notify("READY=1")
+        elapsed = self.elapsed_ms()
+        logger.info("Бот готов к работе через %.0f мс после запуска", elapsed,
+                    extra={'latency_ms': round(elapsed)})
+
+    async def drain(self, timeout: float) -> bool:
+        """Ожидание обработчиков и фоновых задач не дольше timeout секунд.
+
+        Задачи, запущенные уже во время ожидания (публикация после решения,
+        отложенное обновление карточек), тоже дожидаются в пределах того же срока.
+        Возвращает False, если часть задач пришлось прервать.
+        """
+        self.stopping = True
+        self.ready = False
+        self._stop().set()
+        _sd_notify("STOPPING=1")
+        if self._ready_file:
+            self._ready_file.unlink(missing_ok=True)
+
+        current = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        pending = {task for task in self._tasks if task is not current}
+        if pending:
+            logger.info("Ожидание завершения %d задач (не более %.0f с)", len(pending), timeout)
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.warning("Прерываем %d незавершённых задач", len(pending))
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                return False
+            await asyncio.wait(pending, timeout=remaining)
+            pending = {task for task in self._tasks if task is not current}
+        return True
+
+
+def _sd_notify(state: str):
+    """Уведомление systemd (Type=notify), если бот запущен под ним"""
+    address = os.getenv('NOTIFY_SOCKET')
+    if not address:
+        return
+    if address.startswith('@'):
+        address = '\0' + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode())
+    except OSError as e:
+        logger.warning("Не удалось уведомить systemd: %s", e)
+
+
+# Единый экземпляр на процесс
+lifecycle = Lifecycle()
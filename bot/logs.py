@@ -0,0 +1,122 @@
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Поля обновления, которое сейчас обрабатывается (у каждой задачи свой контекст)
+log_context: contextvars.ContextVar[dict] = contextvars.ContextVar('log_context', default={})
+
+# Структурные поля, которые попадают в JSON из extra или контекста
+FIELDS = ('trace_id', 'update_id', 'handler', 'user_id', 'chat_id', 'submission_id', 'moderator_id', 'latency_ms')
+
+# Логгеры, каждое сообщение которых относится к отдельному обновлению
+SAMPLED_LOGGERS = ('aiogram.event',)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class ContextFilter(logging.Filter):
+    """Дополнение записи полями текущего обновления; выполняется в потоке, где вызван логгер"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Выборка массовых событий: extra={'sampled': True} или логгеры из SAMPLED_LOGGERS.
+
+    Предупреждения и ошибки проходят всегда. В оставленные записи добавляется
+    sample_rate, чтобы при подсчёте можно было восстановить исходное количество.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        if not getattr(record, 'sampled', False) and not record.name.startswith(SAMPLED_LOGGERS):
+            return True
+        if self.rate < 1 and random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key in FIELDS + ('sample_rate',):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в цикле событий.
+
+    Стандартный prepare() собирает сообщение сразу; здесь запись уходит в очередь
+    как есть (в пределах процесса её не нужно сериализовать), а сообщение,
+    подстановка аргументов и traceback формируются в потоке QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(
+    level: str = 'INFO',
+    fmt: str = 'json',
+    sample_rate: float = 1.0,
+    aiogram_level: str = 'INFO'
+) -> QueueListener:
+    """Логирование через очередь: вывод в stdout выполняет отдельный поток.
+
+    Возвращает запущенный QueueListener — его нужно остановить при выходе,
+    чтобы дописать оставшиеся записи.
+    """
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(SamplingFilter(sample_rate))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    logging.getLogger('aiogram').setLevel(aiogram_level)
+
+    listener = QueueListener(records, stream, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def bind(**fields) -> contextvars.Token:
+    """Поля, которые добавятся ко всем записям текущей задачи"""
+    return log_context.set({**log_context.get(), **fields})
+
+
+def unbind(token: Optional[contextvars.Token]):
+    if token is not None:
+        log_context.reset(token)
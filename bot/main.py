@@ -1,51 +1,223 @@
+from lifecycle import lifecycle  # первым: отсчёт времени запуска
+
 import asyncio
+import contextlib
+import functools
 import logging
-import sys
 import json
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Set
 from aiogram import Bot, Dispatcher, F, Router
 from aiogram.filters import Command, CommandStart
-from aiogram.types import Message, CallbackQuery, Chat
+from aiogram.types import Message, CallbackQuery, Chat, ReplyParameters, Update
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.exceptions import TelegramBadRequest
-
-from config import BOT_TOKEN
-from database import db
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+
+from config import (
+    BOT_TOKEN,
+    THROTTLE_SUBMISSIONS_PER_HOUR,
+    THROTTLE_COMMANDS_PER_SECOND,
+    THROTTLE_COMMANDS_BURST,
+    LEADERBOARD_SIZE,
+    LEADERBOARD_PUBLIC,
+    SHUTDOWN_TIMEOUT,
+    READY_FILE,
+    MODERATION_STRATEGY,
+    ASSIGNMENT_TIMEOUT,
+    PRESENCE_TIMEOUT,
+    UPDATE_WORKERS,
+    API_RETRY_ATTEMPTS,
+    API_RETRY_BASE_DELAY,
+    API_RETRY_MAX_DELAY,
+    API_MAX_RETRY_AFTER,
+    API_BREAKER_THRESHOLD,
+    API_BREAKER_RESET,
+    API_BREAKER_PROBE_TIMEOUT,
+    API_RATE_GLOBAL,
+    API_RATE_CHAT,
+    API_RATE_GROUP,
+    API_RATE_BURST,
+    HTTP_POOL_SIZE,
+    HTTP_KEEPALIVE,
+    HTTP_DNS_TTL,
+    HTTP_TIMEOUT,
+    JSON_BACKEND,
+    EVENT_LOOP,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_SAMPLE_RATE,
+    AIOGRAM_LOG_LEVEL,
+    TRACE_FILE,
+    TRACE_SAMPLE_RATE,
+    BACKUP_DIR,
+    BACKUP_INTERVAL,
+    BACKUP_KEEP,
+    BACKUP_PAGES_PER_STEP,
+    BACKUP_STEP_PAUSE,
+    JOURNAL_DIR,
+    JOURNAL_SEGMENT_SIZE,
+    JOURNAL_KEEP,
+    FSM_SUBMISSION_TTL,
+    FSM_STATE_TTL,
+    FSM_EXPIRY_NOTICE,
+    FSM_SWEEP_INTERVAL,
+    PUBLISH_RETRY_INTERVAL,
+    PUBLISH_MAX_ATTEMPTS,
+    CARD_EDIT_DEBOUNCE,
+    REVIEW_PREFETCH,
+    HEALTH_HOST,
+    HEALTH_PORT,
+    LOOP_LAG_THRESHOLD,
+    HEALTH_POLL_STALE,
+    HEALTH_DB_TIMEOUT,
+    RELAY_CACHE_SIZE,
+)
+from database import DESTINATION_KINDS, EVENT_NOTIFIED, content_fingerprint, db
+from backup import BackupError, BackupManager
+from journal import JournalMiddleware, UpdateJournal
+from fsm import ExpiringMemoryStorage
+from carousel import ReviewCarousel
+from health import ApiMonitor, HealthMonitor, LoopWatchdog
+from relay import RelayRouter
+from automod import FLAG, KINDS, ACTIONS, PASS, REJECT, RuleEngine, submission_urls, validate_rule
+from leaderboard import Leaderboard, PERIOD_TITLES, render_leaderboard
+from middlewares import (
+    ThrottlingMiddleware,
+    InFlightMiddleware,
+    PresenceMiddleware,
+    ChatOrderMiddleware,
+    LoggingMiddleware,
+)
+from metrics import metrics
+from resilience import CircuitBreaker, RateScheduler, ResilientRequestMiddleware
+import transport
+from logs import setup_logging
+from tracing import tracer, TracingMiddleware, TracingRequestMiddleware
+from publisher import CAPTION_TYPES, extract_media, input_media, publish, send_submission
+from moderation import ModeratorTeam, STRATEGIES, ROLE_OWNER, ROLE_MODERATOR
+from templates import (
+    format_author,
+    render_new_submission_header,
+    render_admin_submission_header,
+    render_user_submission_header,
+    render_text_body,
+    render_caption,
+    render_period_stats,
+    render_metrics,
+    render_diag,
+    format_size,
+    render_automod_flag,
+    render_edited_flag,
+    format_destination,
+    render_destinations,
+    render_publish_status,
+)
 from states import AdminSetup, ChannelSetup, SubmissionStates
 from keyboards import (
     get_user_quick_commands_kb,
     get_admin_quick_commands_kb,
     get_forward_choice_kb,
     get_admin_decision_kb,
+    get_review_kb,
+    get_review_done_kb,
     get_cancel_kb,
     get_pending_submissions_kb,
     get_empty_inline_kb,
+    get_stats_period_kb,
+    get_leaderboard_period_kb,
 )
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout
-)
+# Настройка логирования: вывод в отдельном потоке, записи aiogram о каждом
+# обновлении попадают в выборку
+log_listener = setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE, AIOGRAM_LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
-# Полностью отключаем логирование ошибок polling для aiogram
-logging.getLogger('aiogram.dispatcher').setLevel(logging.CRITICAL)
-logging.getLogger('aiogram.event').setLevel(logging.CRITICAL)
+logger.info("Модули загружены за %.0f мс", lifecycle.elapsed_ms(),
+            extra={'latency_ms': round(lifecycle.elapsed_ms())})
 
 # Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+bot = Bot(
+    token=BOT_TOKEN,
+    session=transport.create_session(
+        pool_size=HTTP_POOL_SIZE,
+        keepalive=HTTP_KEEPALIVE,
+        dns_ttl=HTTP_DNS_TTL,
+        timeout=HTTP_TIMEOUT,
+        json_name=JSON_BACKEND
+    )
+)
+# Повторы временных ошибок и быстрый отказ при недоступности Bot API
+api_breaker = CircuitBreaker(API_BREAKER_THRESHOLD, API_BREAKER_RESET)
+bot.session.middleware(ResilientRequestMiddleware(
+    breaker=api_breaker,
+    attempts=API_RETRY_ATTEMPTS,
+    base_delay=API_RETRY_BASE_DELAY,
+    max_delay=API_RETRY_MAX_DELAY,
+    max_retry_after=API_MAX_RETRY_AFTER,
+    probe_timeout=API_BREAKER_PROBE_TIMEOUT
+))
+# Span на каждую попытку запроса (внутри повторов)
+bot.session.middleware(TracingRequestMiddleware())
+# Отправка сообщений в темпе лимитов Telegram (ожидание входит в span запроса)
+bot.session.middleware(RateScheduler(API_RATE_GLOBAL, API_RATE_CHAT, API_RATE_GROUP, API_RATE_BURST))
+# Задержка и ошибки самих HTTP-запросов (для диагностики)
+api_monitor = ApiMonitor()
+bot.session.middleware(api_monitor)
+tracer.configure(TRACE_FILE, TRACE_SAMPLE_RATE)
+# Состояния сценариев в памяти; брошенные сбрасываются fsm_expiry_loop
+fsm_storage = ExpiringMemoryStorage(
+    ttls={
+        SubmissionStates.waiting_for_content.state: FSM_SUBMISSION_TTL * 60 or None,
+        SubmissionStates.waiting_for_forward_choice.state: FSM_SUBMISSION_TTL * 60 or None,
+    },
+    default_ttl=FSM_STATE_TTL * 60 or None
+)
+dp = Dispatcher(storage=fsm_storage)
 router = Router()
+# Ответы в переписке модератора с автором: подключается раньше router,
+# чтобы ответ автора не принимался за сообщение в сценарии
+relay_router = Router()
+
+# Антифлуд (корзины токенов в памяти)
+throttling = ThrottlingMiddleware(
+    submissions_per_hour=THROTTLE_SUBMISSIONS_PER_HOUR,
+    commands_per_second=THROTTLE_COMMANDS_PER_SECOND,
+    commands_burst=THROTTLE_COMMANDS_BURST
+)
+
+# Рейтинг авторов (топ-K в памяти)
+leaderboard = Leaderboard(LEADERBOARD_SIZE)
+
+# Команда модераторов (состав и очереди в памяти)
+team = ModeratorTeam(MODERATION_STRATEGY, PRESENCE_TIMEOUT * 60)
+
+# Правила автомодерации (компилируются при изменении)
+automod = RuleEngine()
+
+# Резервные копии базы
+backups = BackupManager(BACKUP_DIR, BACKUP_KEEP, BACKUP_PAGES_PER_STEP, BACKUP_STEP_PAUSE)
+
+# Самодиагностика: сторож цикла событий, /diag и локальный HTTP
+watchdog = LoopWatchdog(LOOP_LAG_THRESHOLD)
+health = HealthMonitor(api_monitor, watchdog, HEALTH_POLL_STALE, HEALTH_DB_TIMEOUT)
+
+# Маршруты переписки модератора с автором
+relays = RelayRouter(RELAY_CACHE_SIZE)
+
+# Журнал входящих обновлений для восстановления после падения
+journal = UpdateJournal(JOURNAL_DIR, JOURNAL_SEGMENT_SIZE * 1024 * 1024, JOURNAL_KEEP) if JOURNAL_DIR else None
 
 
 # ============= ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ =============
 
 async def is_admin(user_id: int) -> bool:
-    """Проверка, является ли пользователь администратором"""
-    admin_id = await db.get_admin_id()
-    return admin_id == user_id
+    """Проверка, является ли пользователь модератором (включая владельца)"""
+    return team.is_moderator(user_id)
+
+
+async def is_owner(user_id: int) -> bool:
+    """Проверка, является ли пользователь владельцем бота"""
+    return team.is_owner(user_id)
 
 
 async def get_user_info(user_id: int) -> dict:
@@ -58,11 +230,33 @@ async def get_user_info(user_id: int) -> dict:
             'first_name': chat.first_name,
             'full_name': chat.full_name
         }
-    except Exception as e:
-        logger.error(f"Ошибка получения информации о пользователе {user_id}: {e}")
+    except TelegramAPIError as e:
+        logger.error("Ошибка получения информации о пользователе %s: %s", user_id, e, extra={'user_id': user_id})
         return None
 
 
+async def get_author_name(user_id: int) -> str:
+    """Имя автора для подписи публикации"""
+    user_info = await get_user_info(user_id)
+    return user_info['full_name'] if user_info else f"ID {user_id}"
+
+
+# Периоды статистики: ключ -> (число дней, подпись).
+# Агрегаты дневные (UTC), поэтому последние сутки целиком покрываются только
+# вчерашним и сегодняшним днём — так и подписано
+STATS_PERIODS = {
+    '24h': (2, "за вчера и сегодня (UTC)"),
+    '7d': (7, "за 7 дней"),
+    '30d': (30, "за 30 дней"),
+}
+
+
+def get_period_range(days: int) -> tuple:
+    """Диапазон дней (UTC, включительно), заканчивающийся сегодняшним"""
+    today = datetime.now(timezone.utc).date()
+    return (today - timedelta(days=days - 1)).isoformat(), today.isoformat()
+
+
 # ============= ОБРАБОТЧИКИ КОМАНД =============
 
 @router.message(CommandStart())
@@ -333,26 +527,27 @@ async def quick_bot_stats(message: Message):
         return
     
     # Получаем статистику
-    async with db.conn.cursor() as cursor:
-        # Всего пользователей
-        await cursor.execute('SELECT COUNT(*) as count FROM users')
-        users_count = (await cursor.fetchone())['count']
+    with tracer.span('db.bot_stats'):
+        async with db.conn.cursor() as cursor:
+            # Всего пользователей
+            await cursor.execute('SELECT COUNT(*) as count FROM users')
+            users_count = (await cursor.fetchone())['count']
         
-        # Всего предложений
-        await cursor.execute('SELECT COUNT(*) as count FROM submissions')
-        total_submissions = (await cursor.fetchone())['count']
+            # Всего предложений
+            await cursor.execute('SELECT COUNT(*) as count FROM submissions')
+            total_submissions = (await cursor.fetchone())['count']
         
-        # Одобренных
-        await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "approved"')
-        approved = (await cursor.fetchone())['count']
+            # Одобренных
+            await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "approved"')
+            approved = (await cursor.fetchone())['count']
         
-        # Отклоненных
-        await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "rejected"')
-        rejected = (await cursor.fetchone())['count']
+            # Отклоненных
+            await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "rejected"')
+            rejected = (await cursor.fetchone())['count']
         
-        # Ожидающих
-        await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "pending"')
-        pending = (await cursor.fetchone())['count']
+            # Ожидающих
+            await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "pending"')
+            pending = (await cursor.fetchone())['count']
     
     text = (
         f"📊 <b>Статистика бота</b>\n\n"
@@ -366,6 +561,7 @@ async def quick_bot_stats(message: Message):
     if total_submissions > 0:
         approval_rate = (approved / total_submissions) * 100
         text += f"\n📈 Процент одобрения: {approval_rate:.1f}%"
+    text += "\n\nЗа период: /stats 24h | 7d | 30d | ГГГГ-ММ-ДД ГГГГ-ММ-ДД"
     
     await message.answer(
         text,
@@ -377,7 +573,7 @@ async def quick_bot_stats(message: Message):
 @router.message(F.text == "🔗 Сменить канал")
 async def quick_change_channel(message: Message, state: FSMContext):
     """Быстрая команда: Сменить канал"""
-    if not await is_admin(message.from_user.id):
+    if not await is_owner(message.from_user.id):
         return
     
     await message.answer(
@@ -391,6 +587,567 @@ async def quick_change_channel(message: Message, state: FSMContext):
     await state.set_state(ChannelSetup.waiting_for_invite)
 
 
+@router.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """Статистика за период по дневным агрегатам"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    args = (message.text or "").split()[1:] or ['7d']
+    if len(args) == 1 and args[0] in STATS_PERIODS:
+        days, title = STATS_PERIODS[args[0]]
+        start_day, end_day = get_period_range(days)
+    elif len(args) == 2:
+        try:
+            start_day = date.fromisoformat(args[0]).isoformat()
+            end_day = date.fromisoformat(args[1]).isoformat()
+        except ValueError:
+            await message.answer("❌ Даты указываются в формате ГГГГ-ММ-ДД.")
+            return
+        if start_day > end_day:
+            start_day, end_day = end_day, start_day
+        title = f"с {start_day} по {end_day}"
+    else:
+        await message.answer(
+            "❌ Использование: /stats 24h | 7d | 30d | ГГГГ-ММ-ДД ГГГГ-ММ-ДД"
+        )
+        return
+
+    stats = await db.get_period_stats(start_day, end_day)
+    await message.answer(
+        render_period_stats(title, stats),
+        parse_mode="HTML",
+        reply_markup=get_stats_period_kb()
+    )
+
+
+@router.message(Command("top"))
+async def cmd_top(message: Message):
+    """Рейтинг лучших авторов"""
+    if not LEADERBOARD_PUBLIC and not await is_admin(message.from_user.id):
+        return
+
+    args = (message.text or "").split()
+    period_name = args[1] if len(args) > 1 else 'week'
+    if period_name not in PERIOD_TITLES:
+        await message.answer("❌ Использование: /top week | month | all")
+        return
+
+    entries = await leaderboard.top(period_name)
+    await message.answer(
+        render_leaderboard(period_name, entries, public=not await is_admin(message.from_user.id)),
+        parse_mode="HTML",
+        reply_markup=get_leaderboard_period_kb()
+    )
+
+
+@router.message(Command("limits"))
+async def cmd_limits(message: Message):
+    """Просмотр текущих лимитов антифлуда"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    def remaining(store, user_id: int) -> str:
+        if store is None:
+            return "без лимита"
+        return f"{store.tokens(user_id):.1f} / {store.capacity:g}"
+
+    args = (message.text or "").split()
+    if len(args) > 1:
+        try:
+            user_id = int(args[1])
+        except ValueError:
+            await message.answer("❌ Использование: /limits [user_id]")
+            return
+        await message.answer(
+            f"🚦 <b>Лимиты пользователя {user_id}</b>\n\n"
+            f"• Команды: {remaining(throttling.commands, user_id)}\n"
+            f"• Предложения: {remaining(throttling.submissions, user_id)}",
+            parse_mode="HTML"
+        )
+        return
+
+    commands_limit = "без лимита"
+    if throttling.commands is not None:
+        commands_limit = f"{THROTTLE_COMMANDS_PER_SECOND:g} (запас {THROTTLE_COMMANDS_BURST})"
+    text = (
+        f"🚦 <b>Антифлуд</b>\n\n"
+        f"• Предложений в час: {THROTTLE_SUBMISSIONS_PER_HOUR or 'без лимита'}\n"
+        f"• Команд в секунду: {commands_limit}\n"
+        f"• Активных корзин: команды {len(throttling.commands or ())}, "
+        f"предложения {len(throttling.submissions or ())}\n"
+    )
+    for title, store in (("Команды", throttling.commands), ("Предложения", throttling.submissions)):
+        if store is None:
+            continue
+        lowest = store.snapshot()
+        if lowest:
+            text += f"\n<b>{title}</b> (меньше всего токенов):\n"
+            text += "\n".join(f"• {user_id}: {tokens:.1f}" for user_id, tokens in lowest)
+            text += "\n"
+
+    await message.answer(text, parse_mode="HTML")
+
+
+@router.message(Command("metrics"))
+async def cmd_metrics(message: Message):
+    """Метрики запросов к Bot API и предохранителя"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    await message.answer(render_metrics(metrics.snapshot()), parse_mode="HTML")
+
+
+@router.message(Command("diag"))
+async def cmd_diag(message: Message):
+    """Самодиагностика: цикл событий, база, Bot API, очереди, память"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    await message.answer(render_diag(await health.report()), parse_mode="HTML")
+
+
+@router.message(Command("backup"))
+async def cmd_backup(message: Message):
+    """Резервная копия базы по запросу"""
+    if not await is_owner(message.from_user.id):
+        return
+
+    if backups.running:
+        await message.answer("⏳ Резервное копирование уже выполняется.")
+        return
+
+    await message.answer("⏳ Создаю резервную копию...")
+    try:
+        result = await backups.create(db.path)
+    except BackupError as e:
+        await message.answer(f"❌ Не удалось создать резервную копию: {e}")
+        return
+
+    await message.answer(
+        f"💾 <b>Резервная копия создана</b>\n\n"
+        f"• Файл: <code>{result['path']}</code>\n"
+        f"• Размер: {format_size(result['size'])}\n"
+        f"• Время: {result['duration']:.2f} с\n"
+        f"• Проверка целостности: ok\n"
+        f"• Хранится копий: {len(backups.backups())} из {backups.keep}",
+        parse_mode="HTML"
+    )
+
+
+# ============= АВТОМОДЕРАЦИЯ =============
+
+RULES_USAGE = (
+    "Использование: /rule_add вид действие шаблон\n"
+    f"Виды: {', '.join(KINDS)}\n"
+    f"Действия: {', '.join(ACTIONS)}"
+)
+
+
+@router.message(Command("rules"))
+async def cmd_rules(message: Message):
+    """Список правил автомодерации"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    rules = list(automod.rules.values())
+    if not rules:
+        await message.answer(f"🛡 Правил автомодерации нет.\n\n{RULES_USAGE}")
+        return
+    lines = [f"{rule.describe()} → {rule.action}" for rule in rules[:100]]
+    if len(rules) > 100:
+        lines.append(f"... и ещё {len(rules) - 100}")
+    await message.answer(f"🛡 Правила автомодерации ({len(rules)}):\n\n" + "\n".join(lines))
+
+
+@router.message(Command("rule_add"))
+async def cmd_rule_add(message: Message):
+    """Добавление правила автомодерации"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    args = (message.text or "").split(maxsplit=3)
+    if len(args) < 4:
+        await message.answer(RULES_USAGE)
+        return
+    _, kind, action, pattern = args
+    error = validate_rule(kind, pattern, action)
+    if error:
+        await message.answer(f"❌ {error}\n\n{RULES_USAGE}")
+        return
+
+    rule_id = await db.add_automod_rule(kind, pattern, action, message.from_user.id)
+    automod.add(rule_id, kind, pattern, action)
+    await message.answer(f"✅ Правило #{rule_id} добавлено.")
+    logger.info("Добавлено правило автомодерации #%s: %s %s", rule_id, kind, action)
+
+
+@router.message(Command("rule_del"))
+async def cmd_rule_del(message: Message):
+    """Удаление правила автомодерации"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    args = (message.text or "").split()
+    if len(args) < 2 or not args[1].lstrip('#').isdigit():
+        await message.answer("❌ Использование: /rule_del номер")
+        return
+    rule_id = int(args[1].lstrip('#'))
+    if not await db.remove_automod_rule(rule_id):
+        await message.answer(f"❌ Правило #{rule_id} не найдено.")
+        return
+    automod.remove(rule_id)
+    await message.answer(f"✅ Правило #{rule_id} удалено.")
+
+
+@router.message(Command("rule_test"))
+async def cmd_rule_test(message: Message):
+    """Проверка текста правилами автомодерации"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    args = (message.text or "").split(maxsplit=1)
+    if len(args) < 2:
+        await message.answer("❌ Использование: /rule_test текст")
+        return
+    verdict = automod.check(args[1])
+    text = f"Вердикт: {verdict.action}"
+    if verdict.rules:
+        text += f"\nСработали: {verdict.describe()}"
+    await message.answer(text)
+
+
+# ============= НАПРАВЛЕНИЯ ПУБЛИКАЦИИ =============
+
+DESTINATIONS_USAGE = (
+    "Использование:\n"
+    "/dest_add чат вид — добавить направление: ID или @username, вид "
+    + " | ".join(DESTINATION_KINDS) + "\n"
+    "/dest_del номер — удалить\n"
+    "/dest_default номер on|off — публиковать ли туда по умолчанию\n"
+    "/targets ID номер... — направления для конкретного предложения (/targets ID default — по умолчанию)\n"
+    "/republish ID — повторить публикацию в направления, где она не удалась"
+)
+
+
+@router.message(Command("destinations"))
+async def cmd_destinations(message: Message):
+    """Список направлений публикации"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    destinations = await db.get_destinations()
+    await message.answer(f"{render_destinations(destinations)}\n\n{DESTINATIONS_USAGE}", parse_mode="HTML")
+
+
+@router.message(Command("dest_add"))
+async def cmd_dest_add(message: Message):
+    """Добавление направления публикации"""
+    if not await is_owner(message.from_user.id):
+        return
+
+    args = (message.text or "").split()
+    if len(args) < 3 or args[2] not in DESTINATION_KINDS:
+        await message.answer(DESTINATIONS_USAGE)
+        return
+    target = int(args[1]) if args[1].lstrip('-').isdigit() else args[1]
+    try:
+        chat = await bot.get_chat(target)
+        if chat.type not in ('channel', 'supergroup', 'group'):
+            await message.answer("❌ Поддерживаются каналы и группы.")
+            return
+        if chat.type == 'channel':
+            bot_member = await bot.get_chat_member(chat.id, bot.id)
+            if bot_member.status not in ('administrator', 'creator'):
+                await message.answer("❌ Бот не администратор канала — публиковать туда он не сможет.")
+                return
+    except TelegramAPIError as e:
+        await message.answer(f"❌ Нет доступа к чату: {e}")
+        return
+
+    destination_id = await db.add_destination(chat.id, chat.title, args[2])
+    await message.answer(f"✅ Направление #{destination_id} «{chat.title}» добавлено.")
+    logger.info("Добавлено направление публикации #%s: %s (%s)", destination_id, chat.id, args[2])
+
+
+@router.message(Command("dest_del"))
+async def cmd_dest_del(message: Message):
+    """Удаление направления публикации"""
+    if not await is_owner(message.from_user.id):
+        return
+
+    args = (message.text or "").split()
+    if len(args) < 2 or not args[1].lstrip('#').isdigit():
+        await message.answer("❌ Использование: /dest_del номер")
+        return
+    destination_id = int(args[1].lstrip('#'))
+    if not await db.remove_destination(destination_id):
+        await message.answer(f"❌ Направление #{destination_id} не найдено.")
+        return
+    await message.answer(f"✅ Направление #{destination_id} удалено.")
+
+
+@router.message(Command("dest_default"))
+async def cmd_dest_default(message: Message):
+    """Включение направления в публикацию по умолчанию"""
+    if not await is_owner(message.from_user.id):
+        return
+
+    args = (message.text or "").split()
+    if len(args) < 3 or not args[1].lstrip('#').isdigit() or args[2] not in ('on', 'off'):
+        await message.answer("❌ Использование: /dest_default номер on|off")
+        return
+    destination_id = int(args[1].lstrip('#'))
+    if not await db.set_destination_default(destination_id, args[2] == 'on'):
+        await message.answer(f"❌ Направление #{destination_id} не найдено.")
+        return
+    await message.answer(
+        f"✅ Направление #{destination_id} " + ("публикуется по умолчанию." if args[2] == 'on' else "только по выбору.")
+    )
+
+
+@router.message(Command("targets"))
+async def cmd_targets(message: Message):
+    """Выбор направлений для ожидающего предложения"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    args = (message.text or "").split()
+    if len(args) < 2 or not args[1].lstrip('#').isdigit():
+        await message.answer(DESTINATIONS_USAGE)
+        return
+    submission_id = int(args[1].lstrip('#'))
+    submission = await db.get_submission(submission_id)
+    if not submission:
+        await message.answer("❌ Предложение не найдено.")
+        return
+
+    if len(args) > 2:
+        if submission['status'] != 'pending':
+            await message.answer("❌ Предложение уже обработано.")
+            return
+        active = {str(destination['id']) for destination in await db.get_destinations()}
+        chosen = [arg.lstrip('#') for arg in args[2:]] if args[2:] != ['default'] else []
+        unknown = [arg for arg in chosen if arg not in active]
+        if unknown:
+            await message.answer(f"❌ Нет таких направлений: {', '.join(unknown)}\nСписок: /destinations")
+            return
+        await db.set_submission_destinations(submission_id, [int(arg) for arg in chosen])
+
+    targets = await db.get_publication_targets(submission_id)
+    lines = [format_destination(destination) for destination in targets]
+    await message.answer(
+        f"🎯 Предложение #{submission_id} будет опубликовано в:\n" + ("\n".join(lines) or "— никуда"),
+        parse_mode="HTML"
+    )
+
+
+async def retry_publications(submission_id: int, actor_id: int = None, max_attempts: int = None) -> tuple:
+    """Повтор публикации одобренного предложения только в неудавшиеся направления.
+
+    Возвращает (опубликовано, не удалось).
+    """
+    submission = await db.get_submission(submission_id)
+    if not submission or submission['status'] != 'approved':
+        return 0, 0
+    targets = [
+        destination for destination in await db.get_publication_targets(submission_id)
+        if max_attempts is None or destination['attempts'] < max_attempts
+    ]
+    sent = failed = 0
+    # Способ публикации — тот же, что выбран при одобрении
+    for forward in (False, True):
+        group = [destination for destination in targets if bool(destination['forward']) == forward]
+        if not group:
+            continue
+        results = await publish(
+            bot, submission, group, forward=forward, author=lambda: get_author_name(submission['user_id'])
+        )
+        errors = await db.record_publications(submission_id, submission['user_id'], actor_id, results, forward)
+        sent += len(results) - len(errors)
+        failed += len(errors)
+    return sent, failed
+
+
+@router.message(Command("republish"))
+async def cmd_republish(message: Message):
+    """Повтор неудавшихся публикаций"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    args = (message.text or "").split()
+    if len(args) < 2 or not args[1].lstrip('#').isdigit():
+        await message.answer("❌ Использование: /republish ID")
+        return
+    submission_id = int(args[1].lstrip('#'))
+    sent, failed = await retry_publications(submission_id, actor_id=message.from_user.id)
+    if not sent and not failed:
+        await message.answer(f"Предложение #{submission_id}: повторять нечего.")
+        return
+    await message.answer(f"🔁 Предложение #{submission_id}: опубликовано {sent}, не удалось {failed}.")
+
+
+async def publication_retry_loop():
+    """Периодический повтор неудавшихся публикаций (не больше PUBLISH_MAX_ATTEMPTS попыток)"""
+    while await lifecycle.sleep(PUBLISH_RETRY_INTERVAL * 60):
+        for submission_id in await db.get_failed_publications(PUBLISH_MAX_ATTEMPTS):
+            with tracer.trace('publication_retry', submission_id=submission_id):
+                try:
+                    sent, failed = await retry_publications(submission_id, max_attempts=PUBLISH_MAX_ATTEMPTS)
+                    metrics.inc('publications_retried', sent + failed)
+                    if sent:
+                        logger.info("Предложение #%s опубликовано повторно в %d направлений", submission_id, sent,
+                                    extra={'submission_id': submission_id})
+                except Exception as e:
+                    logger.error("Ошибка повторной публикации #%s: %s", submission_id, e,
+                                 extra={'submission_id': submission_id})
+
+
+# ============= КОМАНДА МОДЕРАТОРОВ =============
+
+@router.message(Command("mods"))
+async def cmd_mods(message: Message):
+    """Состав команды модераторов и их очереди"""
+    if not await is_admin(message.from_user.id):
+        return
+
+    moderators = await db.get_moderators()
+    text = (
+        f"👮 <b>Модераторы</b>\n"
+        f"Распределение: {team.strategy.title} (<code>{team.strategy.name}</code>)\n\n"
+    )
+    for moderator in moderators:
+        user_id = moderator['user_id']
+        name = format_author(moderator, user_id)
+        role = "владелец" if moderator['role'] == ROLE_OWNER else "модератор"
+        presence = "🟢" if team.is_online(user_id) else "⚪️"
+        text += f"{presence} {name} — {role}, <code>{user_id}</code>, в очереди: {team.outstanding(user_id)}\n"
+
+    await message.answer(text, parse_mode="HTML")
+
+
+@router.message(Command("mod_add"))
+async def cmd_mod_add(message: Message):
+    """Добавление модератора"""
+    if not await is_owner(message.from_user.id):
+        return
+
+    args = (message.text or "").split()
+    try:
+        user_id = int(args[1])
+    except (IndexError, ValueError):
+        await message.answer("❌ Использование: /mod_add user_id")
+        return
+
+    await team.add(user_id, ROLE_MODERATOR)
+    await message.answer(f"✅ Пользователь {user_id} добавлен в модераторы.")
+    logger.info("Добавлен модератор: %s", user_id, extra={'moderator_id': user_id})
+
+
+@router.message(Command("mod_remove"))
+async def cmd_mod_remove(message: Message):
+    """Удаление модератора с перераспределением его очереди"""
+    if not await is_owner(message.from_user.id):
+        return
+
+    args = (message.text or "").split()
+    try:
+        user_id = int(args[1])
+    except (IndexError, ValueError):
+        await message.answer("❌ Использование: /mod_remove user_id")
+        return
+    if team.is_owner(user_id):
+        await message.answer("❌ Нельзя удалить владельца.")
+        return
+
+    orphaned = await team.remove(user_id)
+    for submission_id in orphaned:
+        await reassign_submission(submission_id)
+    await message.answer(
+        f"✅ Пользователь {user_id} удалён из модераторов.\n"
+        f"Переназначено предложений: {len(orphaned)}"
+    )
+    logger.info("Удалён модератор: %s", user_id, extra={'moderator_id': user_id})
+
+
+@router.message(Command("strategy"))
+async def cmd_strategy(message: Message):
+    """Смена стратегии распределения предложений"""
+    if not await is_owner(message.from_user.id):
+        return
+
+    args = (message.text or "").split()
+    if len(args) < 2 or args[1] not in STRATEGIES:
+        options = "\n".join(
+            f"• <code>{name}</code> — {strategy.title}" for name, strategy in STRATEGIES.items()
+        )
+        await message.answer(
+            f"Текущая стратегия: <code>{team.strategy.name}</code>\n\n"
+            f"Использование: /strategy название\n{options}",
+            parse_mode="HTML"
+        )
+        return
+
+    team.set_strategy(args[1])
+    await db.set_setting('moderation_strategy', args[1])
+    await message.answer(f"✅ Предложения распределяются {team.strategy.title}.")
+
+
+async def reassign_submission(submission_id: int, exclude: int = None):
+    """Передача ожидающего предложения другому модератору"""
+    submission = await db.get_submission(submission_id)
+    if not submission or submission['status'] != 'pending':
+        team.release(submission_id)
+        return
+
+    moderator_id = await team.route(submission_id, submission['user_id'], exclude=exclude)
+    if moderator_id and moderator_id != exclude:
+        await send_submission_card(moderator_id, submission)
+        logger.info("Предложение #%s переназначено модератору %s", submission_id, moderator_id,
+                    extra={'submission_id': submission_id, 'moderator_id': moderator_id})
+
+
+async def reassign_expired_loop():
+    """Периодическое переназначение предложений, не рассмотренных вовремя"""
+    timeout = ASSIGNMENT_TIMEOUT * 60
+    while await lifecycle.sleep(min(60, timeout)):
+        for submission_id, moderator_id, _ in team.expired(timeout):
+            with tracer.trace('reassign_expired', submission_id=submission_id):
+                try:
+                    await reassign_submission(submission_id, exclude=moderator_id)
+                except Exception as e:
+                    logger.error("Ошибка переназначения предложения #%s: %s", submission_id, e,
+                                 extra={'submission_id': submission_id})
+
+
+# Уведомления о сброшенных по сроку сценариях (для остальных состояний — без уведомления)
+EXPIRY_NOTICES = {
+    SubmissionStates.waiting_for_content.state:
+        "⌛ Черновик предложения удалён: прошло больше {minutes:.0f} мин.\n\n"
+        "Чтобы предложить новость, нажмите «📝 Предложить новость».",
+    SubmissionStates.waiting_for_forward_choice.state:
+        "⌛ Предложение не отправлено: вариант публикации не выбран за {minutes:.0f} мин.\n\n"
+        "Чтобы предложить новость, нажмите «📝 Предложить новость».",
+}
+
+
+async def fsm_expiry_loop():
+    """Сброс брошенных сценариев: состояние и данные удаляются по истечении срока"""
+    while await lifecycle.sleep(fsm_storage.due_in(FSM_SWEEP_INTERVAL)):
+        for key, state_name in fsm_storage.expire():
+            logger.info("Сценарий %s пользователя %s сброшен по сроку", state_name, key.user_id,
+                        extra={'user_id': key.user_id, 'chat_id': key.chat_id})
+            notice = EXPIRY_NOTICES.get(state_name)
+            if not FSM_EXPIRY_NOTICE or notice is None:
+                continue
+            try:
+                await bot.send_message(key.chat_id, notice.format(minutes=fsm_storage.ttl(state_name) / 60))
+                metrics.inc('fsm_expiry_notices')
+            except TelegramAPIError as e:
+                logger.warning("Не удалось уведомить об истёкшем черновике: %s", e,
+                               extra={'user_id': key.user_id})
+
+
 # ============= ОБРАБОТКА НАСТРОЙКИ АДМИНИСТРАТОРА =============
 
 @router.message(AdminSetup.waiting_for_code)
@@ -401,13 +1158,14 @@ async def process_admin_code(message: Message, state: FSMContext):
     
     if code == correct_code:
         await db.set_admin(message.from_user.id)
+        await team.add(message.from_user.id, ROLE_OWNER)
         await message.answer(
             "✅ Вы успешно стали администратором!\n\n"
             "Теперь подключите канал, отправив инвайт-ссылку или добавив бота в канал администратором.\n\n"
             "Используйте /setup_channel для настройки канала.",
         )
         await state.clear()
-        logger.info(f"Новый администратор: {message.from_user.id} (@{message.from_user.username})")
+        logger.info("Новый администратор: %s (@%s)", message.from_user.id, message.from_user.username)
     else:
         await message.answer(
             "❌ Неверный код. Попробуйте ещё раз:",
@@ -420,7 +1178,7 @@ async def process_admin_code(message: Message, state: FSMContext):
 @router.message(Command("setup_channel"))
 async def cmd_setup_channel(message: Message, state: FSMContext):
     """Команда настройки канала"""
-    if not await is_admin(message.from_user.id):
+    if not await is_owner(message.from_user.id):
         await message.answer("❌ Только администратор может настраивать канал.")
         return
     
@@ -484,7 +1242,7 @@ async def process_channel_invite(message: Message, state: FSMContext):
                 return
             
             # Сохраняем канал/группу
-            await db.set_channel_id(chat.id)
+            await db.set_channel_id(chat.id, chat.title)
             
             dest_type = "группа" if chat.type == 'supergroup' else "канал"
             connected = "подключена" if chat.type == 'supergroup' else "подключен"
@@ -498,7 +1256,7 @@ async def process_channel_invite(message: Message, state: FSMContext):
                 parse_mode="HTML"
             )
             await state.clear()
-            logger.info(f"Канал подключен: {chat.title} (ID: {chat.id})")
+            logger.info("Канал подключен: %s (ID: %s)", chat.title, chat.id)
             
         except TelegramBadRequest as e:
             await message.answer(
@@ -517,7 +1275,7 @@ async def process_channel_invite(message: Message, state: FSMContext):
             reply_markup=get_cancel_kb()
         )
     except Exception as e:
-        logger.error(f"Ошибка подключения канала: {e}")
+        logger.error("Ошибка подключения канала: %s", e)
         await message.answer(
             f"❌ Произошла ошибка: {e}",
             reply_markup=get_cancel_kb()
@@ -572,14 +1330,15 @@ async def process_submission_content(message: Message, state: FSMContext):
     content_data = ""
     if message.content_type == "text":
         content_data = message.text
-    elif message.content_type in ["photo", "video", "document", "animation"]:
+    elif message.content_type in CAPTION_TYPES:
         content_data = message.caption or ""
 
     await state.update_data(
         message_id=message.message_id,
         content_type=message.content_type,
         content=content_data,
-        chat_id=message.chat.id
+        chat_id=message.chat.id,
+        **extract_media(message)
     )
     
     await message.answer(
@@ -590,254 +1349,769 @@ async def process_submission_content(message: Message, state: FSMContext):
     await state.set_state(SubmissionStates.waiting_for_forward_choice)
 
 
-@router.callback_query(SubmissionStates.waiting_for_forward_choice, F.data.startswith("allow_forward_"))
-async def process_forward_choice(callback: CallbackQuery, state: FSMContext):
-    """Обработка выбора пересылки"""
-    await callback.answer()
-    
-    choice = callback.data.split("_")[-1]
-    allow_forward = choice == "yes"
-    
-    # Получаем данные из состояния
-    data = await state.get_data()
-    message_id = data.get('message_id')
-    content_type = data.get('content_type')
-    content = data.get('content', '')
+def render_card(submission, user_info: Optional[dict], detailed: bool = False) -> tuple:
+    """Заголовок и полный текст карточки предложения для модератора.
 
-    # Сохраняем предложение в базу
-    submission_id = await db.add_submission(
-        user_id=callback.from_user.id,
-        message_id=message_id,
-        content_type=content_type,
-        content=content,
-        allow_forward=allow_forward
-    )
-    
-    # Отправляем уведомление пользователю
-    await callback.message.edit_text(
-        "✅ Ваше предложение отправлено на модерацию!\n\n"
-        "Вы получите уведомление, когда администратор примет решение.",
-        reply_markup=get_empty_inline_kb()
-    )
-    
-    # Отправляем администратору
-    admin_id = await db.get_admin_id()
-    if admin_id:
-        user_info = await get_user_info(callback.from_user.id)
-        user_name = f"{user_info['first_name']}"
-        if user_info.get('username'):
-            user_name += f" (@{user_info['username']})"
-        
-        forward_status = "✅ Разрешена публикация с автором" if allow_forward else "🔒 Только анонимно"
-        
-        # Формируем текст заголовка
-        header_text = (
-            f"┌─ 📬 <b>Новое предложение</b>\n"
-            f"│\n"
-            f"│ 👤 От: {user_name}\n"
-            f"│ 🔐 {forward_status}\n"
-            f"└─────────────────────\n\n"
+    detailed — карточка из списка ожидающих (с номером и временем отправки).
+    """
+    author = format_author(user_info, submission['user_id'])
+    if detailed:
+        header_text = render_admin_submission_header(
+            submission['id'], author, submission['allow_forward'], submission['created_at']
         )
-        
-        # Отправляем одно сообщение с предложением внутри
-        try:
-            # Получаем оригинальное сообщение
-            original_msg = await bot.forward_message(
-                chat_id=admin_id,
-                from_chat_id=callback.from_user.id,
-                message_id=message_id
-            )
-            
-            # Удаляем пересланное сообщение
-            await bot.delete_message(admin_id, original_msg.message_id)
-            
-            # Копируем с новым caption
-            if content_type in ['photo', 'video', 'document', 'animation']:
-                # Для медиа добавляем caption
-                original_caption = callback.message.caption or ""
-                new_caption = header_text + original_caption
-                
-                await bot.copy_message(
-                    chat_id=admin_id,
-                    from_chat_id=callback.from_user.id,
-                    message_id=message_id,
-                    caption=new_caption,
-                    parse_mode="HTML",
-                    reply_markup=get_admin_decision_kb(submission_id, allow_forward)
-                )
+    else:
+        header_text = render_new_submission_header(author, submission['allow_forward'])
+    if submission['automod_flags']:
+        header_text = render_automod_flag(submission['automod_flags']) + header_text
+    if submission['revision']:
+        header_text = render_edited_flag(submission['revision'], submission['edited_at']) + header_text
+
+    if submission['content_type'] == 'text':
+        card_text = header_text + render_text_body(submission['content'])
+    else:
+        card_text = render_caption(header_text, submission['content'])
+    return header_text, card_text
+
+
+async def send_card(chat_id: int, submission, header_text: str, card_text: str, reply_markup) -> tuple:
+    """Отправка карточки предложения; возвращает (сообщение с кнопками, layout).
+
+    Если карточка целиком не отправляется, медиа уходит без подписи, а заголовок
+    с кнопками — отдельным сообщением.
+    """
+    try:
+        sent = await send_submission(
+            bot,
+            chat_id,
+            submission,
+            caption=card_text,
+            parse_mode="HTML",
+            reply_markup=reply_markup
+        )
+        return sent, 'caption' if submission['content_type'] in CAPTION_TYPES else 'text'
+    except TelegramBadRequest as e:
+        logger.error("Ошибка отправки администратору: %s", e, extra={'submission_id': submission['id']})
+    # Запасной вариант - медиа без подписи автора и заголовок отдельно
+    await send_submission(bot, chat_id, submission)
+    sent = await bot.send_message(
+        chat_id=chat_id,
+        text=header_text,
+        parse_mode="HTML",
+        reply_markup=reply_markup
+    )
+    return sent, 'header'
+
+
+async def send_submission_card(chat_id: int, submission, detailed: bool = False) -> bool:
+    """Отправка карточки предложения с кнопками решения модератору.
+
+    Карточка запоминается, чтобы обновить её, если автор изменит сообщение.
+    """
+    user_info = await get_user_info(submission['user_id'])
+    header_text, card_text = render_card(submission, user_info, detailed)
+    decision_kb = get_admin_decision_kb(submission['id'], submission['allow_forward'])
+
+    try:
+        sent, layout = await send_card(chat_id, submission, header_text, card_text, decision_kb)
+    except TelegramAPIError as e:
+        # Bot API недоступен: карточку отправит переназначение по таймауту
+        logger.error("Ошибка отправки администратору: %s", e, extra={'submission_id': submission['id']})
+        return False
+
+    if submission.get('status', 'pending') == 'pending':
+        await db.save_card(
+            submission['id'], chat_id, sent.message_id, layout, detailed,
+            submission['revision'], submission['file_unique_id']
+        )
+    return True
+
+
+async def refresh_cards(submission_id: int):
+    """Обновление карточек ожидающего предложения после правки автора (на месте, без новых сообщений)"""
+    submission = await db.get_submission(submission_id)
+    if not submission or submission['status'] != 'pending':
+        return
+    cards = [card for card in await db.get_cards(submission_id) if card['revision'] < submission['revision']]
+    if not cards:
+        return
+    user_info = await get_user_info(submission['user_id'])
+    decision_kb = get_admin_decision_kb(submission_id, submission['allow_forward'])
+    review_kb = get_review_kb(submission_id, submission['allow_forward'])
+
+    for card in cards:
+        header_text, card_text = render_card(submission, user_info, card['detailed'])
+        markup = review_kb if carousel.showing(card['chat_id'], card['message_id']) else decision_kb
+        target = {'chat_id': card['chat_id'], 'message_id': card['message_id'], 'reply_markup': markup}
+        try:
+            media = input_media(submission, card_text, "HTML") if card['layout'] == 'caption' else None
+            if media is not None and card['file_unique_id'] != submission['file_unique_id']:
+                # Автор заменил файл — меняем и медиа, и подпись
+                await bot.edit_message_media(media=media, **target)
+            elif card['layout'] == 'caption':
+                await bot.edit_message_caption(caption=card_text, parse_mode="HTML", **target)
             else:
-                # Для текста отправляем заголовок + текст из базы данных
-                submission = await db.get_submission(submission_id)
-                content_text = submission['content'] if submission and submission['content'] else "Текст не найден"
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text=header_text + "📄 <b>Текст предложения:</b>\n\n" + content_text,
-                    parse_mode="HTML",
-                    reply_markup=get_admin_decision_kb(submission_id, allow_forward)
-                )
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки администратору: {e}")
-            # Запасной вариант - отправляем как раньше
-            try:
-                await bot.copy_message(
-                    chat_id=admin_id,
-                    from_chat_id=callback.from_user.id,
-                    message_id=message_id,
-                    caption=header_text if content_type != 'text' else None,
-                    parse_mode="HTML",
-                    reply_markup=get_admin_decision_kb(submission_id, allow_forward)
-                )
-                
-                if content_type == 'text':
-                    await bot.send_message(
-                        chat_id=admin_id,
-                        text=header_text,
-                        parse_mode="HTML",
-                        reply_markup=get_admin_decision_kb(submission_id, allow_forward)
-                    )
-            except Exception as e2:
-                logger.error(f"Ошибка запасного варианта: {e2}")
+                text = header_text if card['layout'] == 'header' else card_text
+                await bot.edit_message_text(text=text, parse_mode="HTML", **target)
+        except TelegramBadRequest as e:
+            if 'message is not modified' not in str(e):
+                logger.warning("Не удалось обновить карточку предложения #%s: %s", submission_id, e,
+                               extra={'submission_id': submission_id, 'chat_id': card['chat_id']})
+                continue
+        except TelegramAPIError as e:
+            logger.warning("Не удалось обновить карточку предложения #%s: %s", submission_id, e,
+                           extra={'submission_id': submission_id, 'chat_id': card['chat_id']})
+            continue
+        await db.save_card(
+            submission_id, card['chat_id'], card['message_id'], card['layout'], card['detailed'],
+            submission['revision'], submission['file_unique_id']
+        )
+        metrics.inc('cards_refreshed')
+
+
+@router.edited_message(F.chat.type == 'private')
+async def process_edited_message(message: Message, state: FSMContext):
+    """Правка автором отправленного сообщения: предложение и карточки модераторов обновляются"""
+    content = ""
+    if message.content_type == "text":
+        content = message.text
+    elif message.content_type in CAPTION_TYPES:
+        content = message.caption or ""
+    media = extract_media(message)
+
+    submission = await db.find_pending_submission(message.from_user.id, message.message_id)
+    if submission is None:
+        # Ещё не отправлено на модерацию — обновляем черновик
+        data = await state.get_data()
+        if data.get('message_id') == message.message_id:
+            await state.update_data(content_type=message.content_type, content=content, **media)
+        return
+
+    if (content_fingerprint(content, media['media_meta']) == submission['content_hash']
+            and media['file_unique_id'] == submission['file_unique_id']):
+        return
+
+    # Правила автомодерации — по новой версии; при правке предложение не отклоняется, а помечается
+    meta = media['media_meta'] or {}
+    verdict = automod.check(content, message.content_type, meta.get('file_size'), submission_urls(meta))
+    flags = verdict.describe() if verdict.action != PASS else None
+    revision = await db.update_submission_content(
+        submission['id'], message.content_type, content,
+        media['file_id'], media['file_unique_id'], media['media_meta'], flags
+    )
+    if revision is None:
+        return
+    metrics.inc('submissions_edited')
+    logger.info("Автор изменил предложение #%s (правка %d)", submission['id'], revision,
+                extra={'submission_id': submission['id'], 'user_id': message.from_user.id})
+    # Несколько правок подряд — одно обновление карточек
+    lifecycle.debounce(
+        ('cards', submission['id']), CARD_EDIT_DEBOUNCE, functools.partial(refresh_cards, submission['id'])
+    )
+
+
+@router.callback_query(SubmissionStates.waiting_for_forward_choice, F.data.startswith("allow_forward_"))
+async def process_forward_choice(callback: CallbackQuery, state: FSMContext):
+    """Обработка выбора пересылки"""
+    await callback.answer()
+    
+    choice = callback.data.split("_")[-1]
+    allow_forward = choice == "yes"
+    
+    # Получаем данные из состояния
+    data = await state.get_data()
+    message_id = data.get('message_id')
+    content_type = data.get('content_type')
+    content = data.get('content', '')
+    meta = data.get('media_meta') or {}
+
+    # Предварительная проверка правилами автомодерации
+    verdict = automod.check(content, content_type, meta.get('file_size'), submission_urls(meta))
+    flags = verdict.describe() if verdict.action == FLAG else None
+
+    # Сохраняем предложение в базу
+    submission_id = await db.add_submission(
+        user_id=callback.from_user.id,
+        message_id=message_id,
+        content_type=content_type,
+        content=content,
+        allow_forward=allow_forward,
+        file_id=data.get('file_id'),
+        file_unique_id=data.get('file_unique_id'),
+        media_meta=data.get('media_meta'),
+        automod_flags=flags
+    )
+
+    if verdict.action == REJECT:
+        decision = await db.update_submission_status(
+            submission_id, 'rejected', f"автомодерация: {verdict.describe()}"
+        )
+        leaderboard.record(decision)
+        metrics.inc('automod_rejected')
+        await callback.message.edit_text(
+            "❌ Предложение отклонено автоматически: оно нарушает правила канала.",
+            reply_markup=get_empty_inline_kb()
+        )
+        await db.log_event(EVENT_NOTIFIED, submission_id, callback.from_user.id)
+        logger.info("Предложение #%s отклонено автомодерацией: %s", submission_id, verdict.describe(),
+                    extra={'submission_id': submission_id, 'user_id': callback.from_user.id})
+        await state.clear()
+        return
+    if flags:
+        metrics.inc('automod_flagged')
+    
+    # Отправляем уведомление пользователю
+    await callback.message.edit_text(
+        "✅ Ваше предложение отправлено на модерацию!\n\n"
+        "Вы получите уведомление, когда администратор примет решение.",
+        reply_markup=get_empty_inline_kb()
+    )
+    
+    # Отправляем модератору, выбранному стратегией маршрутизации
+    moderator_id = await team.route(submission_id, callback.from_user.id)
+    if moderator_id:
+        await send_submission_card(moderator_id, {
+            'id': submission_id,
+            'user_id': callback.from_user.id,
+            'message_id': message_id,
+            'content_type': content_type,
+            'content': content,
+            'allow_forward': allow_forward,
+            'file_id': data.get('file_id'),
+            'file_unique_id': data.get('file_unique_id'),
+            'media_meta': data.get('media_meta'),
+            'automod_flags': flags,
+            'revision': 0,
+            'edited_at': None,
+        })
     
     await state.clear()
 
 
 # ============= ОБРАБОТКА РЕШЕНИЙ АДМИНИСТРАТОРА =============
 
+class SubmissionBusy(Exception):
+    """По предложению уже принимается (или принято) другое решение"""
+
+
+# Предложения, по которым сейчас идёт решение: публикация может ждать лимитов
+# Bot API долго, и всё это время статус в базе ещё pending
+deciding: Set[int] = set()
+
+
+@contextlib.asynccontextmanager
+async def claim_submission(submission_id: int):
+    """Единственное решение по предложению: второе одобрение или отклонение, пока
+    идёт первое (карточка, карусель другого модератора), получает SubmissionBusy.
+
+    Возвращает предложение, перечитанное из базы после захвата.
+    """
+    if submission_id in deciding:
+        raise SubmissionBusy("решение по предложению уже принимается")
+    deciding.add(submission_id)
+    try:
+        submission = await db.get_submission(submission_id)
+        if not submission or submission['status'] != 'pending':
+            raise SubmissionBusy("предложение уже обработано")
+        yield submission
+    finally:
+        deciding.discard(submission_id)
+
+
+async def approve(submission, targets: list, publish_type: str, actor_id: int) -> tuple:
+    """Публикация во все направления сразу и одобрение; возвращает (текст решения, неудавшиеся).
+
+    Если не удалось опубликовать никуда, ошибка пробрасывается, а предложение
+    остаётся ожидающим: повторное одобрение опубликует только в неудавшиеся.
+    Если решение по предложению уже принимается, — SubmissionBusy.
+    """
+    async with claim_submission(submission['id']) as current:
+        if current['revision'] != submission['revision']:
+            raise SubmissionBusy("автор изменил предложение — проверьте его ещё раз")
+        return await _approve(current, targets, publish_type, actor_id)
+
+
+async def _approve(submission, targets: list, publish_type: str, actor_id: int) -> tuple:
+    submission_id = submission['id']
+    user_chat_id = submission['user_id']
+    # Пересылка сохраняет ссылку на автора; если он удалил сообщение — подпись с именем
+    forward = publish_type == 'with' and bool(submission['allow_forward'])
+    decision_text = "публикацией с указанием авторства" if forward else "анонимной публикацией"
+    results = await publish(bot, submission, targets, forward=forward, author=lambda: get_author_name(user_chat_id))
+    failed = await db.record_publications(submission_id, user_chat_id, actor_id, results, forward)
+    if len(failed) == len(results):
+        raise failed[0][1]
+
+    # Обновляем статус
+    decision = await db.update_submission_status(submission_id, 'approved', decision_text, actor_id=actor_id)
+    leaderboard.record(decision)
+    team.release(submission_id)
+
+    # Уведомляем пользователя
+    try:
+        await bot.send_message(
+            chat_id=user_chat_id,
+            text=f"✅ Ваше предложение одобрено и опубликовано с {decision_text}!"
+        )
+        await db.log_event(EVENT_NOTIFIED, submission_id, user_chat_id)
+    except TelegramAPIError as e:
+        logger.error("Ошибка уведомления пользователя: %s", e,
+                     extra={'submission_id': submission_id, 'user_id': user_chat_id})
+
+    for destination, error in failed:
+        logger.warning("Предложение #%s не опубликовано в %s: %s", submission_id, destination['chat_id'], error,
+                       extra={'submission_id': submission_id, 'chat_id': destination['chat_id']})
+    logger.info("Предложение #%s одобрено администратором", submission_id,
+                extra={'submission_id': submission_id, 'user_id': user_chat_id})
+    return decision_text, failed
+
+
+async def reject(submission, actor_id: int):
+    """Отклонение предложения с уведомлением автора (SubmissionBusy — решение уже принимается)"""
+    submission_id = submission['id']
+    async with claim_submission(submission_id):
+        decision = await db.update_submission_status(
+            submission_id, 'rejected', 'Отклонено администратором', actor_id=actor_id
+        )
+    leaderboard.record(decision)
+    team.release(submission_id)
+
+    # Уведомляем пользователя
+    try:
+        await bot.send_message(
+            chat_id=submission['user_id'],
+            text="❌ Ваше предложение было отклонено."
+        )
+        await db.log_event(EVENT_NOTIFIED, submission_id, submission['user_id'])
+    except TelegramAPIError as e:
+        logger.error("Ошибка уведомления пользователя: %s", e,
+                     extra={'submission_id': submission_id, 'user_id': submission['user_id']})
+
+    logger.info("Предложение #%s отклонено администратором", submission_id,
+                extra={'submission_id': submission_id, 'user_id': submission['user_id']})
+
+
+async def is_card_stale(submission, message: Message) -> bool:
+    """Автор изменил предложение после показа карточки: карточка обновляется, решение — после проверки"""
+    shown = await db.get_card_revision(submission['id'], message.chat.id, message.message_id)
+    if submission['revision'] <= (shown or 0):
+        return False
+    if shown is None:
+        # Карточка отправлена до того, как их стали запоминать
+        layout = 'caption' if message.caption is not None else 'text'
+        await db.save_card(submission['id'], message.chat.id, message.message_id, layout, False, 0, None)
+    await refresh_cards(submission['id'])
+    return True
+
+
 @router.callback_query(F.data.startswith("approve_"))
 async def approve_submission(callback: CallbackQuery):
     """Одобрение предложения"""
-    await callback.answer()
-    
+    # На кнопку отвечаем один раз, когда известен исход: повторный ответ Telegram отклонит
     if not await is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав!", show_alert=True)
         return
-    
+
     # Парсим данные
     parts = callback.data.split("_")
     publish_type = parts[1]  # with или anonymous
     submission_id = int(parts[-1])
-    
+
     # Получаем предложение
     submission = await db.get_submission(submission_id)
     if not submission:
+        await callback.answer()
         await callback.message.edit_text("❌ Предложение не найдено.")
         return
-    
+
     if submission['status'] != 'pending':
         await callback.answer(f"❌ Предложение уже обработано!", show_alert=True)
         return
-    
-    # Получаем ID канала
-    channel_id = await db.get_channel_id()
-    if not channel_id:
-        await callback.answer("❌ Канал не подключен!", show_alert=True)
+
+    # Автор изменил сообщение после того, как карточка была показана — сначала показываем новую версию
+    if await is_card_stale(submission, callback.message):
+        await callback.answer("✏️ Автор изменил предложение — карточка обновлена, проверьте ещё раз.",
+                              show_alert=True)
         return
-    
-    # Публикуем в канал
+
+    targets = await db.get_publication_targets(submission_id)
+    if not targets:
+        await callback.answer("❌ Нет направлений публикации! Подключите канал: /setup_channel", show_alert=True)
+        return
+
     try:
-        user_chat_id = submission['user_id']
-        
-        if publish_type == 'with' and submission['allow_forward']:
-            # Публикация с автором (пересылка)
-            await bot.forward_message(
-                chat_id=channel_id,
-                from_chat_id=user_chat_id,
-                message_id=submission['message_id']
+        decision_text, failed = await approve(submission, targets, publish_type, callback.from_user.id)
+    except SubmissionBusy as e:
+        await callback.answer(f"❌ {e.args[0].capitalize()}!", show_alert=True)
+        return
+    except Exception as e:
+        logger.error("Ошибка публикации в канал: %s", e, extra={'submission_id': submission_id})
+        await callback.answer(f"❌ Ошибка публикации: {e}", show_alert=True)
+        return
+    await callback.answer()
+
+    # Обновляем сообщение администратора; карточку берём в HTML, чтобы текст автора
+    # остался экранированным, а заголовок — с разметкой
+    status = render_publish_status(decision_text, failed, submission_id)
+    try:
+        if callback.message.caption:
+            await callback.message.edit_caption(
+                caption=f"{callback.message.html_text}\n\n{status}",
+                parse_mode="HTML"
             )
-            decision_text = "публикацией с указанием авторства"
         else:
-            # Анонимная публикация (копирование)
-            await bot.copy_message(
-                chat_id=channel_id,
-                from_chat_id=user_chat_id,
-                message_id=submission['message_id']
-            )
-            decision_text = "анонимной публикацией"
-        
-        # Обновляем статус
-        await db.update_submission_status(submission_id, 'approved', decision_text)
-        
-        # Уведомляем пользователя
-        try:
-            await bot.send_message(
-                chat_id=submission['user_id'],
-                text=f"✅ Ваше предложение одобрено и опубликовано с {decision_text}!"
+            await callback.message.edit_text(
+                text=f"{callback.message.html_text}\n\n{status}",
+                parse_mode="HTML"
             )
-        except Exception as e:
-            logger.error(f"Ошибка уведомления пользователя: {e}")
-        
-        # Обновляем сообщение администратора
-        try:
-            if callback.message.caption:
-                await callback.message.edit_caption(
-                    caption=f"{callback.message.caption}\n\n✅ <b>ОДОБРЕНО</b> ({decision_text})",
-                    parse_mode="HTML"
-                )
-            else:
-                await callback.message.edit_text(
-                    text=f"{callback.message.text}\n\n✅ <b>ОДОБРЕНО</b> ({decision_text})",
-                    parse_mode="HTML"
-                )
-        except:
-            pass
-        
-        logger.info(f"Предложение #{submission_id} одобрено администратором")
-        
-    except Exception as e:
-        logger.error(f"Ошибка публикации в канал: {e}")
-        await callback.answer(f"❌ Ошибка публикации: {e}", show_alert=True)
+    except TelegramAPIError as e:
+        logger.warning("Не удалось обновить карточку предложения #%s: %s", submission_id, e,
+                       extra={'submission_id': submission_id})
 
 
 @router.callback_query(F.data.startswith("reject_"))
 async def reject_submission(callback: CallbackQuery):
     """Отклонение предложения"""
-    await callback.answer()
-    
+    # Как и при одобрении, отвечаем на кнопку один раз — когда известен исход
     if not await is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав!", show_alert=True)
         return
-    
+
     submission_id = int(callback.data.split("_")[1])
-    
+
     # Получаем предложение
     submission = await db.get_submission(submission_id)
     if not submission:
+        await callback.answer()
         await callback.message.edit_text("❌ Предложение не найдено.")
         return
-    
+
     if submission['status'] != 'pending':
         await callback.answer(f"❌ Предложение уже обработано!", show_alert=True)
         return
-    
-    # Обновляем статус
-    await db.update_submission_status(submission_id, 'rejected', 'Отклонено администратором')
-    
-    # Уведомляем пользователя
+
     try:
-        await bot.send_message(
-            chat_id=submission['user_id'],
-            text="❌ Ваше предложение было отклонено."
-        )
-    except Exception as e:
-        logger.error(f"Ошибка уведомления пользователя: {e}")
-    
-    # Обновляем сообщение администратора
+        await reject(submission, callback.from_user.id)
+    except SubmissionBusy as e:
+        await callback.answer(f"❌ {e.args[0].capitalize()}!", show_alert=True)
+        return
+    await callback.answer()
+
+    # Обновляем сообщение администратора (карточка в HTML, как при одобрении)
     try:
         if callback.message.caption:
             await callback.message.edit_caption(
-                caption=f"{callback.message.caption}\n\n❌ <b>ОТКЛОНЕНО</b>",
+                caption=f"{callback.message.html_text}\n\n❌ <b>ОТКЛОНЕНО</b>",
                 parse_mode="HTML"
             )
         else:
             await callback.message.edit_text(
-                text=f"{callback.message.text}\n\n❌ <b>ОТКЛОНЕНО</b>",
+                text=f"{callback.message.html_text}\n\n❌ <b>ОТКЛОНЕНО</b>",
                 parse_mode="HTML"
             )
-    except:
-        pass
-    
-    logger.info(f"Предложение #{submission_id} отклонено администратором")
+    except TelegramAPIError as e:
+        logger.warning("Не удалось обновить карточку предложения #%s: %s", submission_id, e,
+                       extra={'submission_id': submission_id})
+
+
+# ============= КАРУСЕЛЬ МОДЕРАЦИИ =============
+
+def render_review_item(submission, user_info: Optional[dict]) -> dict:
+    """Заготовка карусели: предложение, автор и готовая карточка"""
+    header_text, card_text = render_card(submission, user_info, detailed=True)
+    return {'submission': submission, 'user_info': user_info, 'header': header_text, 'text': card_text}
+
+
+async def prepare_review_items(submissions: list) -> list:
+    """Заготовки для страницы очереди: профиль каждого автора запрашивается один раз, все разом"""
+    authors = list(dict.fromkeys(submission['user_id'] for submission in submissions))
+    profiles = dict(zip(authors, await asyncio.gather(*(get_user_info(user_id) for user_id in authors))))
+    return [render_review_item(submission, profiles[submission['user_id']]) for submission in submissions]
+
+
+async def revalidate_review_item(item: dict) -> Optional[dict]:
+    """Сверка заготовки с базой перед показом (без запросов к Bot API)"""
+    submission = await db.get_submission(item['submission']['id'])
+    if not submission or submission['status'] != 'pending':
+        return None
+    if submission['revision'] != item['submission']['revision']:
+        return render_review_item(submission, item['user_info'])
+    return item
+
+
+carousel = ReviewCarousel(REVIEW_PREFETCH, prepare_review_items, revalidate_review_item)
+
+
+async def delete_message_quietly(chat_id: int, message_id: int):
+    try:
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+    except TelegramAPIError as e:
+        logger.debug("Не удалось удалить сообщение %s: %s", message_id, e, extra={'chat_id': chat_id})
+
+
+async def replace_review_message(session, sent):
+    """Карусель переехала в новое сообщение; старое удаляется в фоне"""
+    if session.message_id is not None:
+        lifecycle.spawn(delete_message_quietly(session.chat_id, session.message_id))
+    session.message_id = sent.message_id
+
+
+async def show_review_item(session, item: dict):
+    """Показ предложения в карусели.
+
+    Текст сменяется текстом, медиа — медиа с подписью: это одно редактирование.
+    Если тип сообщения не подходит, карусель отправляется новым сообщением.
+    """
+    submission = item['submission']
+    markup = get_review_kb(submission['id'], submission['allow_forward'])
+    layout = 'text' if submission['content_type'] == 'text' else 'caption'
+    media = input_media(submission, item['text'], "HTML") if layout == 'caption' else None
+    previous_id, previous_message = session.current_id, session.message_id
+    target = {'chat_id': session.chat_id, 'message_id': session.message_id, 'reply_markup': markup}
+
+    edited = False
+    if session.message_id is not None and layout == session.layout and (layout == 'text' or media is not None):
+        try:
+            if media is not None:
+                await bot.edit_message_media(media=media, **target)
+            else:
+                await bot.edit_message_text(text=item['text'], parse_mode="HTML", **target)
+            edited = True
+        except TelegramBadRequest as e:
+            edited = 'message is not modified' in str(e)
+            if not edited:
+                logger.warning("Не удалось показать предложение #%s в карусели: %s", submission['id'], e,
+                               extra={'submission_id': submission['id'], 'chat_id': session.chat_id})
+    if not edited:
+        sent, layout = await send_card(session.chat_id, submission, item['header'], item['text'], markup)
+        await replace_review_message(session, sent)
+        session.layout = layout
+        metrics.inc('review_resent')
+
+    session.current = item
+    if previous_id is not None and previous_id != submission['id']:
+        await db.delete_card(previous_id, session.chat_id, previous_message)
+    await db.save_card(
+        submission['id'], session.chat_id, session.message_id, session.layout, True,
+        submission['revision'], submission['file_unique_id']
+    )
+    carousel.prefetch(session)
+
+
+async def show_review_text(session, text: str, markup):
+    """Служебный текст в карусели (очередь пройдена, просмотр закончен)"""
+    if session.current_id is not None:
+        await db.delete_card(session.current_id, session.chat_id, session.message_id)
+        session.current = None
+    if session.message_id is not None and session.layout == 'text':
+        try:
+            await bot.edit_message_text(
+                chat_id=session.chat_id, message_id=session.message_id, text=text, reply_markup=markup
+            )
+            return
+        except TelegramBadRequest as e:
+            if 'message is not modified' in str(e):
+                return
+    sent = await bot.send_message(chat_id=session.chat_id, text=text, reply_markup=markup)
+    await replace_review_message(session, sent)
+    session.layout = 'text'
+
+
+async def review_step(session, keep_current: bool = False) -> bool:
+    """Переход карусели к следующему предложению; False — очередь пройдена.
+
+    keep_current — если дальше ничего нет, оставить показанное предложение.
+    """
+    item = await carousel.advance(session)
+    if item is None:
+        if keep_current and session.current is not None:
+            return False
+        text = "✅ Очередь просмотрена." + (f"\n\nПропущено: {len(session.skipped)}." if session.skipped else "")
+        await show_review_text(session, text, get_review_done_kb(bool(session.skipped)))
+        return False
+    with tracer.trace('review_show', submission_id=item['submission']['id']):
+        await show_review_item(session, item)
+    return True
+
+
+async def apply_review_decision(session, submission, action: str, actor_id: int):
+    """Решение из карусели — в фоне, пока модератор уже смотрит следующее предложение"""
+    submission_id = submission['id']
+    try:
+        if action == 'reject':
+            await reject(submission, actor_id)
+        else:
+            targets = await db.get_publication_targets(submission_id)
+            await approve(submission, targets, action.split('_')[1], actor_id)
+        metrics.inc('review_decisions')
+    except SubmissionBusy as e:
+        # Решение другого модератора: предложение из очереди уходит и так
+        try:
+            await bot.send_message(chat_id=session.chat_id, text=f"ℹ️ Предложение #{submission_id}: {e}.")
+        except TelegramAPIError:
+            pass
+    except Exception as e:
+        logger.error("Ошибка решения из карусели по #%s: %s", submission_id, e,
+                     extra={'submission_id': submission_id})
+        # Предложение осталось ожидающим и вернётся в карусель при следующем проходе
+        session.decided.discard(submission_id)
+        try:
+            await bot.send_message(
+                chat_id=session.chat_id,
+                text=f"❌ Предложение #{submission_id} не опубликовано: {e}\nОно осталось в очереди."
+            )
+        except TelegramAPIError:
+            pass
+
+
+async def open_review(moderator_id: int, chat_id: int, message_id: Optional[int], layout: str):
+    session = carousel.open(moderator_id, chat_id, message_id, layout)
+    logger.info("Модератор %s открыл карусель", moderator_id, extra={'user_id': moderator_id})
+    await review_step(session)
+
+
+@router.message(Command("review"))
+async def cmd_review(message: Message):
+    """Просмотр ожидающих по одному (карусель)"""
+    if not await is_admin(message.from_user.id):
+        return
+    await open_review(message.from_user.id, message.chat.id, None, 'text')
+
+
+@router.callback_query(F.data == "review_open")
+async def review_open(callback: CallbackQuery):
+    """Карусель из списка ожидающих — в том же сообщении"""
+    await callback.answer()
+    if not await is_admin(callback.from_user.id):
+        return
+    await open_review(callback.from_user.id, callback.message.chat.id, callback.message.message_id, 'text')
+
+
+@router.callback_query(F.data == "review_restart")
+async def review_restart(callback: CallbackQuery):
+    """Пройти очередь заново, включая пропущенные"""
+    await callback.answer()
+    session = carousel.get(callback.from_user.id, callback.message.chat.id, callback.message.message_id)
+    if session is None or not await is_admin(callback.from_user.id):
+        return
+    carousel.rewind(session)
+    await review_step(session)
+
+
+@router.callback_query(F.data == "review_close")
+async def review_close(callback: CallbackQuery):
+    """Закрытие карусели"""
+    await callback.answer()
+    session = carousel.get(callback.from_user.id, callback.message.chat.id, callback.message.message_id)
+    if session is None:
+        return
+    carousel.close(callback.from_user.id)
+    await show_review_text(session, "Просмотр очереди закончен.", get_empty_inline_kb())
+
+
+@router.callback_query(F.data.startswith("review_"))
+async def review_action(callback: CallbackQuery):
+    """Кнопки предложения в карусели: решение, пропуск, следующее"""
+    if not await is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав!", show_alert=True)
+        return
+
+    parts = callback.data.split("_")
+    action = "_".join(parts[1:-1])  # approve_with_author, approve_anonymous, reject, skip, next
+    submission_id = int(parts[-1])
+    chat_id, message_id = callback.message.chat.id, callback.message.message_id
+
+    session = carousel.get(callback.from_user.id, chat_id, message_id)
+    if session is None:
+        # Карусель из памяти пропала (перезапуск бота) — продолжаем в этом же сообщении
+        submission = await db.get_submission(submission_id)
+        layout = 'caption' if callback.message.caption is not None else 'text'
+        session = carousel.open(callback.from_user.id, chat_id, message_id, layout)
+        if submission is not None:
+            session.current = {'submission': submission}
+    if session.current_id != submission_id:
+        await callback.answer("Это предложение уже не в карусели.")
+        return
+
+    if action in ('skip', 'next'):
+        if action == 'skip':
+            session.skipped.add(submission_id)
+        shown = await review_step(session, keep_current=action == 'next')
+        await callback.answer(None if shown or action == 'skip' else "Это последнее предложение в очереди.")
+        return
+
+    submission = await db.get_submission(submission_id)
+    if not submission or submission['status'] != 'pending':
+        await review_step(session)
+        await callback.answer("Предложение уже обработано — показываю следующее.")
+        return
+    if await is_card_stale(submission, callback.message):
+        session.current = render_review_item(submission, session.current.get('user_info'))
+        await callback.answer("✏️ Автор изменил предложение — карточка обновлена, проверьте ещё раз.",
+                              show_alert=True)
+        return
+    if action != 'reject' and not await db.get_publication_targets(submission_id):
+        await callback.answer("❌ Нет направлений публикации! Подключите канал: /setup_channel", show_alert=True)
+        return
+
+    # Следующее предложение показывается сразу, публикация и уведомление автора — в фоне
+    session.decided.add(submission_id)
+    await review_step(session)
+    await callback.answer("✅ Одобрено" if action != 'reject' else "❌ Отклонено")
+    lifecycle.spawn(apply_review_decision(session, submission, action, callback.from_user.id),
+                    name=f"review-decision-{submission_id}")
+
+
+# ============= ПЕРЕПИСКА С АВТОРОМ =============
+
+async def relay_route(message: Message):
+    """Фильтр: ответ на сообщение, пересланное ботом, или ответ модератора на карточку.
+
+    Передаёт в обработчик route — куда переслать ответ.
+    """
+    target = message.reply_to_message
+    route = await relays.resolve(message.chat.id, target.message_id)
+    if route is None and await is_admin(message.from_user.id):
+        submission_id = await db.find_card(message.chat.id, target.message_id)
+        submission = await db.get_submission(submission_id) if submission_id is not None else None
+        if submission is not None:
+            # Вопрос по карточке уходит автору ответом на его исходное сообщение
+            route = {
+                'submission_id': submission_id,
+                'peer_chat_id': submission['user_id'],
+                'peer_message_id': submission['message_id'],
+            }
+    return {'route': route} if route is not None else False
+
+
+@relay_router.message(F.chat.type == 'private', F.reply_to_message, ~F.text.startswith("/"), relay_route)
+async def relay_reply(message: Message, route: dict):
+    """Пересылка реплики в переписке модератора с автором.
+
+    Модератор отвечает на карточку — сообщение копируется автору ответом на его
+    предложение; автор отвечает на него — копия уходит модератору ответом на
+    вопрос, в ту же ветку под карточкой. Дальше каждая сторона отвечает на
+    последнюю реплику другой. Модератор остаётся анонимным: бот копирует
+    сообщения, а не пересылает их.
+    """
+    submission_id = route['submission_id']
+    if await db.is_user_banned(message.from_user.id):
+        return
+    try:
+        copied = await bot.copy_message(
+            chat_id=route['peer_chat_id'],
+            from_chat_id=message.chat.id,
+            message_id=message.message_id,
+            reply_parameters=ReplyParameters(message_id=route['peer_message_id'], allow_sending_without_reply=True)
+        )
+    except TelegramAPIError as e:
+        logger.warning("Не удалось переслать реплику по предложению #%s: %s", submission_id, e,
+                       extra={'submission_id': submission_id, 'chat_id': route['peer_chat_id']})
+        await message.reply("❌ Не удалось доставить сообщение: собеседник мог заблокировать бота.")
+        return
+    await relays.remember(route['peer_chat_id'], copied.message_id, submission_id, message.chat.id, message.message_id)
+    metrics.inc('relay_messages')
+    logger.info("Реплика по предложению #%s переслана", submission_id,
+                extra={'submission_id': submission_id, 'chat_id': route['peer_chat_id']})
 
 
 # ============= НАВИГАЦИЯ ПО МЕНЮ =============
@@ -878,26 +2152,27 @@ async def show_bot_stats(callback: CallbackQuery):
         return
     
     # Получаем статистику
-    async with db.conn.cursor() as cursor:
-        # Всего пользователей
-        await cursor.execute('SELECT COUNT(*) as count FROM users')
-        users_count = (await cursor.fetchone())['count']
+    with tracer.span('db.bot_stats'):
+        async with db.conn.cursor() as cursor:
+            # Всего пользователей
+            await cursor.execute('SELECT COUNT(*) as count FROM users')
+            users_count = (await cursor.fetchone())['count']
         
-        # Всего предложений
-        await cursor.execute('SELECT COUNT(*) as count FROM submissions')
-        total_submissions = (await cursor.fetchone())['count']
+            # Всего предложений
+            await cursor.execute('SELECT COUNT(*) as count FROM submissions')
+            total_submissions = (await cursor.fetchone())['count']
         
-        # Одобренных
-        await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "approved"')
-        approved = (await cursor.fetchone())['count']
+            # Одобренных
+            await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "approved"')
+            approved = (await cursor.fetchone())['count']
         
-        # Отклоненных
-        await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "rejected"')
-        rejected = (await cursor.fetchone())['count']
+            # Отклоненных
+            await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "rejected"')
+            rejected = (await cursor.fetchone())['count']
         
-        # Ожидающих
-        await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "pending"')
-        pending = (await cursor.fetchone())['count']
+            # Ожидающих
+            await cursor.execute('SELECT COUNT(*) as count FROM submissions WHERE status = "pending"')
+            pending = (await cursor.fetchone())['count']
     
     text = (
         f"📊 <b>Статистика бота</b>\n\n"
@@ -919,6 +2194,54 @@ async def show_bot_stats(callback: CallbackQuery):
     )
 
 
+@router.callback_query(F.data.startswith("stats_period_"))
+async def show_period_stats(callback: CallbackQuery):
+    """Переключение периода статистики"""
+    await callback.answer()
+
+    if not await is_admin(callback.from_user.id):
+        return
+
+    period = STATS_PERIODS.get(callback.data.split("_")[-1])
+    if not period:
+        return
+    days, title = period
+    stats = await db.get_period_stats(*get_period_range(days))
+    try:
+        await callback.message.edit_text(
+            render_period_stats(title, stats),
+            parse_mode="HTML",
+            reply_markup=get_stats_period_kb()
+        )
+    except TelegramBadRequest:
+        # Текст не изменился
+        pass
+
+
+@router.callback_query(F.data.startswith("top_period_"))
+async def show_top_period(callback: CallbackQuery):
+    """Переключение периода рейтинга"""
+    await callback.answer()
+
+    admin = await is_admin(callback.from_user.id)
+    if not LEADERBOARD_PUBLIC and not admin:
+        return
+
+    period_name = callback.data.split("_")[-1]
+    if period_name not in PERIOD_TITLES:
+        return
+    entries = await leaderboard.top(period_name)
+    try:
+        await callback.message.edit_text(
+            render_leaderboard(period_name, entries, public=not admin),
+            parse_mode="HTML",
+            reply_markup=get_leaderboard_period_kb()
+        )
+    except TelegramBadRequest:
+        # Текст не изменился
+        pass
+
+
 @router.callback_query(F.data == "view_pending")
 async def view_pending(callback: CallbackQuery):
     """Просмотр списка ожидающих предложений"""
@@ -960,73 +2283,51 @@ async def view_submission(callback: CallbackQuery):
         )
         return
 
-    is_adm = await is_admin(callback.from_user.id)
-
-    if is_adm:
-        # Админ: показываем с кнопками одобрения/отклонения
-        user_info = await get_user_info(submission['user_id'])
-        user_name = f"{user_info['first_name']}"
-        if user_info.get('username'):
-            user_name += f" (@{user_info['username']})"
-        forward_status = "✅ Разрешена публикация с автором" if submission['allow_forward'] else "🔒 Только анонимно"
-        header_text = (
-            f"┌─ 📬 <b>Предложение #{submission_id}</b>\n"
-            f"│\n"
-            f"│ 👤 От: {user_name}\n"
-            f"│ 🔐 {forward_status}\n"
-            f"│ 📅 {submission['created_at'][:19]}\n"
-            f"└─────────────────────\n\n"
-        )
-        decision_kb = get_admin_decision_kb(submission_id, submission['allow_forward'])
+    if await is_admin(callback.from_user.id):
+        # Админ: карточка с кнопками одобрения/отклонения
+        if not await send_submission_card(callback.from_user.id, submission, detailed=True):
+            await callback.message.edit_text(
+                "❌ Ошибка загрузки предложения",
+                reply_markup=get_empty_inline_kb()
+            )
+        return
+
+    # Пользователь: только свои ожидающие, без кнопок решения
+    if submission['user_id'] != callback.from_user.id:
+        await callback.answer("❌ Нет доступа к этому предложению.", show_alert=True)
+        return
+    if submission['status'] != 'pending':
+        await callback.answer("Это предложение уже рассмотрено.", show_alert=True)
+        return
+    header_text = render_user_submission_header(submission['created_at'])
+    decision_kb = get_empty_inline_kb()
+
+    if submission['content_type'] == 'text':
+        card_text = header_text + render_text_body(submission['content'])
     else:
-        # Пользователь: только свои ожидающие, без кнопок решения
-        if submission['user_id'] != callback.from_user.id:
-            await callback.answer("❌ Нет доступа к этому предложению.", show_alert=True)
-            return
-        if submission['status'] != 'pending':
-            await callback.answer("Это предложение уже рассмотрено.", show_alert=True)
-            return
-        header_text = (
-            f"┌─ ⏳ <b>Предложение</b>\n"
-            f"│ Ожидает рассмотрения\n"
-            f"│ 📅 {submission['created_at'][:19]}\n"
-            f"└─────────────────────\n\n"
-        )
-        decision_kb = get_empty_inline_kb()
+        card_text = render_caption(header_text, submission['content'])
 
     try:
-        if submission['content_type'] in ['photo', 'video', 'document', 'animation']:
-            cap = (submission['content'] or "").strip()
-            new_caption = header_text + (cap if cap else "")
-            await bot.copy_message(
-                chat_id=callback.from_user.id,
-                from_chat_id=submission['user_id'],
-                message_id=submission['message_id'],
-                caption=new_caption,
-                parse_mode="HTML",
-                reply_markup=decision_kb
-            )
-        else:
-            content_text = submission['content'] if submission['content'] else "Текст не найден"
-            await bot.send_message(
-                chat_id=callback.from_user.id,
-                text=header_text + "📄 <b>Текст предложения:</b>\n\n" + content_text,
-                parse_mode="HTML",
-                reply_markup=decision_kb
-            )
+        await send_submission(
+            bot,
+            callback.from_user.id,
+            submission,
+            caption=card_text,
+            parse_mode="HTML",
+            reply_markup=decision_kb
+        )
     except Exception as e:
-        logger.error(f"Ошибка отправки предложения: {e}")
+        logger.error("Ошибка отправки предложения: %s", e, extra={'submission_id': submission_id})
         try:
-            await bot.copy_message(
+            await send_submission(bot, callback.from_user.id, submission)
+            await bot.send_message(
                 chat_id=callback.from_user.id,
-                from_chat_id=submission['user_id'],
-                message_id=submission['message_id'],
-                caption=header_text if submission['content_type'] != 'text' else None,
+                text=header_text,
                 parse_mode="HTML",
                 reply_markup=decision_kb
             )
         except Exception as e2:
-            logger.error(f"Ошибка запасного варианта: {e2}")
+            logger.error("Ошибка запасного варианта: %s", e2, extra={'submission_id': submission_id})
             await callback.message.edit_text(
                 f"❌ Ошибка загрузки предложения: {str(e)}",
                 reply_markup=get_empty_inline_kb()
@@ -1038,7 +2339,7 @@ async def change_channel(callback: CallbackQuery, state: FSMContext):
     """Смена канала/группы"""
     await callback.answer()
     
-    if not await is_admin(callback.from_user.id):
+    if not await is_owner(callback.from_user.id):
         await callback.answer("❌ У вас нет прав!", show_alert=True)
         return
     
@@ -1076,10 +2377,60 @@ async def cancel_action(callback: CallbackQuery, state: FSMContext):
 
 # ============= ЗАПУСК БОТА =============
 
+async def prepare(db_path: Optional[str] = None):
+    """Подключение базы и загрузка состояния, без которого обработчики не работают"""
+    if db_path:
+        await db.connect(db_path)
+    else:
+        await db.connect()
+    logger.info("База данных подключена")
+
+    # Разовое заполнение дневных агрегатов для существующих данных
+    if await db.get_setting('daily_stats_version') != '1':
+        await db.backfill_daily_stats()
+        await db.set_setting('daily_stats_version', '1')
+        logger.info("Дневная статистика пересчитана")
+    # Версия 2 — серии авторов по периодам
+    if await db.get_setting('user_counters_version') != '2':
+        await db.backfill_user_counters()
+        await db.set_setting('user_counters_version', '2')
+        logger.info("Счётчики авторов пересчитаны")
+
+    await team.load()
+    automod.load(await db.get_automod_rules())
+
+
+async def replay_update(update: Update):
+    """Повторная обработка обновления из журнала"""
+    try:
+        await dp.feed_update(bot, update, journal_replay=True)
+    except Exception:
+        logger.exception("Ошибка повторной обработки обновления %s", update.update_id,
+                         extra={'update_id': update.update_id})
+
+
 async def on_startup():
     """Действия при запуске бота"""
-    await db.connect()
-    logger.info("База данных подключена")
+    lifecycle.spawn(watchdog.run(), name="loop_watchdog")
+    await prepare()
+    if HEALTH_PORT:
+        await health.start(HEALTH_HOST, HEALTH_PORT)
+
+    if journal is not None:
+        pending = await asyncio.to_thread(journal.open)
+        if pending:
+            logger.warning("Обработка %d обновлений, прерванных прошлым запуском", len(pending))
+        # Задачи создаются до начала polling, поэтому встают в очередь своих чатов раньше новых обновлений
+        for data in pending:
+            update = Update.model_validate(data, context={'bot': bot})
+            lifecycle.spawn(replay_update(update), name=f"replay-{update.update_id}")
+
+    lifecycle.spawn(reassign_expired_loop(), name="reassign_expired")
+    lifecycle.spawn(fsm_expiry_loop(), name="fsm_expiry")
+    if PUBLISH_RETRY_INTERVAL > 0:
+        lifecycle.spawn(publication_retry_loop(), name="publication_retry")
+    if BACKUP_INTERVAL > 0:
+        lifecycle.spawn(backups.schedule(db.path, BACKUP_INTERVAL * 3600), name="backup")
     
     # Проверяем наличие администратора
     admin_id = await db.get_admin_id()
@@ -1091,31 +2442,73 @@ async def on_startup():
         print(f"КОД АДМИНИСТРАТОРА: {code}")
         print(f"{'='*50}\n")
     else:
-        logger.info(f"Администратор установлен: {admin_id}")
+        logger.info("Администратор установлен: %s", admin_id)
         channel_id = await db.get_channel_id()
         if channel_id:
-            logger.info(f"Канал подключен: {channel_id}")
+            logger.info("Канал подключен: %s", channel_id)
+
+    lifecycle.mark_ready(READY_FILE)
 
 
 async def on_shutdown():
     """Действия при остановке бота"""
+    # Новые обновления уже не принимаются: polling остановлен до вызова shutdown
+    drained = await lifecycle.drain(SHUTDOWN_TIMEOUT)
+
+    # Подтверждаем Telegram обработанные обновления, чтобы после перезапуска
+    # они не пришли повторно. Если часть обработчиков прервана — не подтверждаем,
+    # пусть придут снова.
+    if drained and lifecycle.last_update_id is not None:
+        try:
+            await bot.get_updates(offset=lifecycle.last_update_id + 1, limit=1, timeout=0)
+        except Exception as e:
+            logger.error("Ошибка подтверждения обновлений: %s", e)
+
+    await health.stop()
     await db.close()
     logger.info("База данных отключена")
+    tracer.close()
+    if journal is not None:
+        journal.close()
+
+
+def setup_dispatcher(update_journal: Optional[UpdateJournal] = None):
+    """Подключение роутера и middleware (порядок outer-middleware важен)"""
+    dp.include_router(relay_router)
+    dp.include_router(router)
+    relay_router.message.middleware(LoggingMiddleware())
+    relay_router.message.middleware(TracingMiddleware())
+    router.message.middleware(LoggingMiddleware())
+    router.callback_query.middleware(LoggingMiddleware())
+    router.message.middleware(TracingMiddleware())
+    router.callback_query.middleware(TracingMiddleware())
+    if update_journal is not None:
+        dp.update.outer_middleware(JournalMiddleware(update_journal))
+    dp.update.outer_middleware(TracingMiddleware())
+    dp.update.outer_middleware(InFlightMiddleware(lifecycle))
+    dp.update.outer_middleware(ChatOrderMiddleware(UPDATE_WORKERS))
+    dp.message.outer_middleware(throttling)
+    dp.callback_query.outer_middleware(throttling)
+    dp.message.outer_middleware(PresenceMiddleware(team))
+    dp.callback_query.outer_middleware(PresenceMiddleware(team))
 
 
 async def main():
     """Главная функция"""
-    dp.include_router(router)
-    
+    setup_dispatcher(journal)
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
     
     logger.info("Бот запущен")
-    await dp.start_polling(bot)
+    # Каждое обновление — отдельная задача; порядок в чате держит ChatOrderMiddleware
+    await dp.start_polling(bot, handle_as_tasks=True)
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        transport.run(main(), EVENT_LOOP)
     except KeyboardInterrupt:
         logger.info("Бот остановлен")
+    finally:
+        # Дописываем записи, оставшиеся в очереди
+        log_listener.stop()
@@ -0,0 +1,446 @@
+"""Обслуживание базы бота: статистика, проверка, индексы, VACUUM, архив, выгрузка, пересчёт, тестовые данные.
+
+Все команды читают и пишут порциями (--batch строк, каждая порция — своя
+короткая транзакция), поэтому память не растёт с размером базы, а в режиме
+WAL их можно запускать рядом с работающим ботом: его запись ждёт не дольше
+одной порции. Исключения — полный VACUUM (vacuum --full) и пересчёт (rebuild):
+они держат блокировку записи до конца.
+
+Запуск: python bot/manage.py [--db bot_database.db] [--batch N] КОМАНДА ...
+"""
+import argparse
+import asyncio
+import csv
+import json
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+import database
+from templates import format_size
+
+# Таблицы, строки которых переезжают в архив вместе с предложением
+ARCHIVED_TABLES = ('submissions', 'publications')
+# Записи о предложении, которые в архиве не нужны: карточки и назначения
+# (после решения их и так нет) и маршруты переписки с автором
+DROPPED_TABLES = ('cards', 'assignments', 'relays')
+
+EXPORT_COLUMNS = (
+    'id', 'user_id', 'status', 'decision', 'content_type', 'content', 'allow_forward',
+    'created_at', 'decided_at', 'file_id', 'revision',
+)
+
+WORDS = (
+    "новость канал город сегодня вчера власти жители сообщили произошло событие район улица "
+    "школа больница дорога ремонт погода праздник концерт выставка спорт матч команда победа "
+    "цены магазин транспорт автобус метро мост парк фестиваль конкурс конференция проект "
+    "решение администрация губернатор мэр депутаты заявление полиция пожар авария задержание "
+    "фото видео подробности источник очевидцы информация официально предварительно данные"
+).split()
+
+DECISIONS = {
+    'approved': ("публикацией с указанием авторства", "анонимной публикацией"),
+    'rejected': ("Отклонено администратором",),
+}
+
+
+def _iso(ts) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts is not None else ""
+
+
+async def _scalar(sql: str, params=()):
+    async with database._conn.execute(sql, params) as cursor:
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+
+async def _tables() -> list:
+    async with database._conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ) as cursor:
+        return [row[0] async for row in cursor]
+
+
+# ============= СОСТОЯНИЕ =============
+
+async def stats(args) -> int:
+    """Размеры файлов и таблиц, число строк, предложения по статусам"""
+    info = await database.storage_info()
+    page_size = await _scalar('PRAGMA page_size')
+    pages = await _scalar('PRAGMA page_count')
+    free = await _scalar('PRAGMA freelist_count')
+    print(f"Файл: {format_size(info['sizes']['db'])}, WAL: {format_size(info['sizes']['wal'])}, "
+          f"журнал: {info['journal_mode']}")
+    print(f"Страниц: {pages} по {page_size} Б, свободных {free} ({format_size(free * page_size)})")
+
+    sizes = {}
+    try:
+        async with database._conn.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name') as cursor:
+            sizes = {row[0]: row[1] async for row in cursor}
+    except Exception:
+        # SQLite собран без dbstat
+        pass
+    print(f"\n{'таблица':<28}{'строк':>14}{'размер':>14}")
+    for table in await _tables():
+        count = await _scalar(f'SELECT COUNT(*) FROM "{table}"')
+        size = format_size(sizes[table]) if table in sizes else "—"
+        print(f"{table:<28}{count:>14}{size:>14}")
+    if sizes:
+        indexes = sum(size for name, size in sizes.items() if name.startswith(('idx_', 'sqlite_autoindex')))
+        print(f"{'индексы':<28}{'':>14}{format_size(indexes):>14}")
+
+    print("\nПредложения:")
+    async with database._conn.execute('SELECT status, COUNT(*) FROM submissions GROUP BY status') as cursor:
+        async for status, count in cursor:
+            print(f"  {status}: {count}")
+    return 0
+
+
+async def check(args) -> int:
+    """PRAGMA quick_check (или integrity_check с --full) и проверка внешних ключей"""
+    pragma = 'integrity_check' if args.full else 'quick_check'
+    problems = 0
+    async with database._conn.execute(f'PRAGMA {pragma}') as cursor:
+        async for (message,) in cursor:
+            if message == 'ok':
+                continue
+            problems += 1
+            if problems <= args.limit:
+                print(f"  {message}")
+    print(f"{pragma}: " + ("ok" if not problems else f"проблем {problems}"))
+
+    orphans = 0
+    async with database._conn.execute('PRAGMA foreign_key_check') as cursor:
+        async for row in cursor:
+            orphans += 1
+            if orphans <= args.limit:
+                print(f"  {row[0]} rowid {row[1]}: нет строки в {row[2]}")
+    print("foreign_key_check: " + ("ok" if not orphans else f"строк без пары {orphans}"))
+    return 1 if problems else 0
+
+
+# ============= ОБСЛУЖИВАНИЕ =============
+
+async def reindex(args) -> int:
+    """Перестройка индексов (всех или одного)"""
+    started = time.perf_counter()
+    await database._conn.execute(f'REINDEX "{args.name}"' if args.name else 'REINDEX')
+    await database._conn.commit()
+    print(f"REINDEX {args.name or ''}: {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+async def analyze(args) -> int:
+    """Статистика для планировщика запросов"""
+    started = time.perf_counter()
+    await database._conn.execute('ANALYZE')
+    await database._conn.execute('PRAGMA optimize')
+    await database._conn.commit()
+    print(f"ANALYZE: {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+async def vacuum(args) -> int:
+    """Возврат свободных страниц.
+
+    По умолчанию — порциями через incremental_vacuum (если база в режиме
+    auto_vacuum = INCREMENTAL), --into — сжатая копия без блокировки записи,
+    --full — полный VACUUM (запись бота ждёт до конца).
+    """
+    before = (await database.storage_info())['sizes']
+    started = time.perf_counter()
+    if args.into:
+        await database._conn.execute('VACUUM INTO ?', (args.into,))
+        print(f"Сжатая копия: {args.into}")
+    elif args.full:
+        if args.incremental:
+            # Режим auto_vacuum меняется только вместе с полным VACUUM
+            await database._conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        await database._conn.execute('VACUUM')
+    else:
+        if await _scalar('PRAGMA auto_vacuum') != 2:
+            print("База не в режиме auto_vacuum = INCREMENTAL: освободить место порциями нельзя.\n"
+                  "Используйте --into ПУТЬ (копия без блокировки) или --full (при остановленном боте);\n"
+                  "--full --incremental заодно переведёт базу в режим порционного VACUUM.")
+            return 1
+        while free := await _scalar('PRAGMA freelist_count'):
+            await database._conn.execute(f'PRAGMA incremental_vacuum({min(free, args.batch)})')
+            await database._conn.commit()
+    await database._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    after = (await database.storage_info())['sizes']
+    print(f"VACUUM: {time.perf_counter() - started:.1f} с, файл {format_size(before['db'])} -> "
+          f"{format_size(after['db'])}, WAL {format_size(before['wal'])} -> {format_size(after['wal'])}")
+    return 0
+
+
+async def archive(args) -> int:
+    """Перенос решённых предложений старше --days дней в отдельную базу.
+
+    Журнал событий остаётся на месте: история и агрегаты не меняются, но личная
+    статистика авторов (/my_stats) считается только по оставшимся предложениям.
+    Порция сначала фиксируется в архиве и только потом удаляется из базы: после
+    сбоя повторный запуск перезапишет уже скопированные строки.
+    """
+    conn = database._conn
+    cutoff = int(time.time()) - args.days * 86400
+    await conn.execute('ATTACH DATABASE ? AS archive', (args.to,))
+    for table in ARCHIVED_TABLES:
+        sql = await _scalar("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        sql = re.sub(r'^CREATE TABLE\s+("?)\w+\1', f'CREATE TABLE IF NOT EXISTS archive.{table}', sql)
+        await conn.execute(sql)
+    await conn.commit()
+
+    moved = 0
+    last_id = 0
+    while True:
+        async with conn.execute('''
+            SELECT id FROM main.submissions
+            WHERE id > ? AND status IN ('approved', 'rejected') AND created_at < ?
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, cutoff, args.batch)) as cursor:
+            ids = [row[0] async for row in cursor]
+        if not ids:
+            break
+        last_id = ids[-1]
+        marks = ', '.join('?' * len(ids))
+        await conn.execute(
+            f'INSERT OR REPLACE INTO archive.submissions SELECT * FROM main.submissions WHERE id IN ({marks})', ids
+        )
+        await conn.execute(
+            f'INSERT OR REPLACE INTO archive.publications '
+            f'SELECT * FROM main.publications WHERE submission_id IN ({marks})', ids
+        )
+        await conn.commit()
+        for table in ('publications', *DROPPED_TABLES):
+            await conn.execute(f'DELETE FROM main.{table} WHERE submission_id IN ({marks})', ids)
+        await conn.execute(f'DELETE FROM main.submissions WHERE id IN ({marks})', ids)
+        await conn.commit()
+        moved += len(ids)
+        print(f"\rПеренесено: {moved}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+    await conn.execute('DETACH DATABASE archive')
+    print(f"В архив {args.to} перенесено предложений: {moved}. Место в базе освободит vacuum.")
+    return 0
+
+
+async def export(args) -> int:
+    """Выгрузка предложений в JSON Lines или CSV (текст уже распакован)"""
+    codes = {}
+    async with database._conn.execute('SELECT code, text FROM decision_codes') as cursor:
+        async for code, text in cursor:
+            codes[code] = text
+    conditions, params = ['id > ?'], []
+    if args.status:
+        conditions.append('status = ?')
+        params.append(args.status)
+    if args.since:
+        conditions.append('created_at >= ?')
+        params.append(int(datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc).timestamp()))
+
+    output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    writer = csv.writer(output) if args.format == 'csv' else None
+    if writer:
+        writer.writerow(EXPORT_COLUMNS)
+    exported = 0
+    last_id = 0
+    try:
+        while True:
+            async with database._conn.execute(f'''
+                SELECT id, user_id, status, decision, content_type, content, allow_forward,
+                       created_at, decided_at, file_id, revision
+                FROM submissions
+                WHERE {' AND '.join(conditions)}
+                ORDER BY id
+                LIMIT ?
+            ''', (last_id, *params, args.batch)) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            for row in rows:
+                record = dict(row)
+                record['decision'] = codes.get(record['decision'])
+                record['content'] = database.decode_content(record['content'])
+                record['created_at'] = _iso(record['created_at'])
+                record['decided_at'] = _iso(record['decided_at'])
+                if writer:
+                    writer.writerow(record[column] for column in EXPORT_COLUMNS)
+                else:
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            exported += len(rows)
+    finally:
+        if args.output:
+            output.close()
+    print(f"Выгружено предложений: {exported}", file=sys.stderr)
+    return 0
+
+
+async def rebuild(args) -> int:
+    """Пересчёт агрегатов и счётчиков по журналу событий"""
+    started = time.perf_counter()
+    result = await database.rebuild_from_events()
+    print(f"Событий учтено: {result['events']}, {time.perf_counter() - started:.1f} с")
+    for table, rows in result.items():
+        if table != 'events':
+            print(f"  {table}: строк {len(rows)}")
+    print("Рейтинг /top бот держит в памяти — перезапустите бота, чтобы он перечитал счётчики.")
+    return 0
+
+
+# ============= ТЕСТОВЫЕ ДАННЫЕ =============
+
+def make_text(rng: random.Random) -> str:
+    # Длина — от пары строк до длинного поста, чаще короткие
+    words = max(3, int(rng.lognormvariate(3.5, 0.9)))
+    return " ".join(rng.choice(WORDS) for _ in range(min(words, 600))).capitalize() + "."
+
+
+def synthetic_submissions(rng: random.Random, first_user: int, users: int, count: int, days: int, now: int):
+    """Предложения в порядке подачи: (автор, вид, текст, статус, текст решения, создано, решено, file_id).
+
+    Авторы распределены неравномерно: небольшая часть пишет большую долю
+    предложений. Ожидают решения только недавние; время до решения — от минут
+    до суток (логнормальное).
+    """
+    texts = [make_text(rng) for _ in range(5000)]
+    start = now - days * 86400
+    for i in range(count):
+        created = start + days * 86400 * i // count
+        author = first_user + int(users * rng.random() ** 3)
+        roll = rng.random()
+        content_type = 'text' if roll < 0.7 else 'photo' if roll < 0.9 else 'video'
+        text = None if content_type != 'text' and rng.random() < 0.4 else rng.choice(texts)
+        decided = created + int(rng.lognormvariate(8, 1.2))
+        if decided >= now or (now - created < 2 * 86400 and rng.random() < 0.5):
+            status, decision, decided = 'pending', None, None
+        else:
+            status = 'approved' if rng.random() < 0.6 else 'rejected'
+            decision = rng.choice(DECISIONS[status])
+        file_id = f"AgAC{rng.getrandbits(160):040x}" if content_type != 'text' else None
+        yield author, content_type, text, status, decision, created, decided, file_id
+
+
+async def seed(args) -> int:
+    """Синтетические авторы и предложения с журналом событий и агрегатами"""
+    conn = database._conn
+    rng = random.Random(args.seed)
+    now = int(time.time())
+    started = time.perf_counter()
+
+    for first in range(0, args.users, args.batch):
+        await conn.executemany(
+            'INSERT OR IGNORE INTO users (user_id, username, first_name) VALUES (?, ?, ?)',
+            [
+                (args.first_user + i, f"user{i}", f"Автор {i}")
+                for i in range(first, min(first + args.batch, args.users))
+            ]
+        )
+        await conn.commit()
+
+    async with conn.cursor() as cursor:
+        codes = {
+            text: await database._decision_code(cursor, text)
+            for texts in DECISIONS.values() for text in texts
+        }
+        await conn.commit()
+    after_id = await _scalar('SELECT COALESCE(MAX(id), 0) FROM submissions')
+
+    generator = synthetic_submissions(rng, args.first_user, args.users, args.submissions, args.days, now)
+    inserted = 0
+    while batch := [row for _, row in zip(range(args.batch), generator)]:
+        await conn.executemany('''
+            INSERT INTO submissions (
+                user_id, message_id, content_type, content, allow_forward, status, decision,
+                created_at, decided_at, file_id, file_unique_id, content_hash
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (
+                author, rng.randint(1, 10 ** 6), content_type, database.encode_content(text), rng.random() < 0.5,
+                status, codes.get(decision), created, decided, file_id,
+                f"AQAD{rng.getrandbits(64):016x}" if file_id else None,
+                database.content_fingerprint(text)
+            )
+            for author, content_type, text, status, decision, created, decided, file_id in batch
+        ])
+        await conn.commit()
+        inserted += len(batch)
+        print(f"\rПредложений: {inserted}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    # Журнал — одним запросом: сортировку по времени SQLite делает сам, на диске
+    async with conn.cursor() as cursor:
+        await database._seed_events(cursor, after_id)
+    await conn.commit()
+    print(f"Авторов: {args.users}, предложений: {inserted}, {time.perf_counter() - started:.1f} с")
+    if not args.skip_aggregates:
+        await rebuild(args)
+    return 0
+
+
+COMMANDS = {
+    'stats': stats,
+    'check': check,
+    'reindex': reindex,
+    'analyze': analyze,
+    'vacuum': vacuum,
+    'archive': archive,
+    'export': export,
+    'rebuild': rebuild,
+    'seed': seed,
+}
+
+
+async def run(args) -> int:
+    await database.connect(args.db)
+    try:
+        return await COMMANDS[args.command](args)
+    finally:
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=database.DB_NAME, help="файл базы")
+    parser.add_argument('--batch', type=int, default=10000, help="строк (страниц для vacuum) в одной порции")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('stats', help="размеры, число строк, предложения по статусам")
+    check_parser = commands.add_parser('check', help="проверка целостности (код выхода 1 при ошибках)")
+    check_parser.add_argument('--full', action='store_true', help="integrity_check вместо quick_check")
+    check_parser.add_argument('--limit', type=int, default=20, help="сколько проблем показать")
+    reindex_parser = commands.add_parser('reindex', help="перестроить индексы")
+    reindex_parser.add_argument('name', nargs='?', help="индекс или таблица (по умолчанию все)")
+    commands.add_parser('analyze', help="обновить статистику планировщика")
+    vacuum_parser = commands.add_parser('vacuum', help="вернуть свободное место")
+    vacuum_mode = vacuum_parser.add_mutually_exclusive_group()
+    vacuum_mode.add_argument('--into', metavar='ПУТЬ', help="сжатая копия базы, рабочая не блокируется")
+    vacuum_mode.add_argument('--full', action='store_true', help="полный VACUUM (при остановленном боте)")
+    vacuum_parser.add_argument('--incremental', action='store_true',
+                               help="с --full: перевести базу в режим порционного VACUUM")
+    archive_parser = commands.add_parser('archive', help="перенести старые решённые предложения в архив")
+    archive_parser.add_argument('--days', type=int, required=True, help="старше скольких дней")
+    archive_parser.add_argument('--to', required=True, metavar='ПУТЬ', help="файл архива")
+    export_parser = commands.add_parser('export', help="выгрузить предложения")
+    export_parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl')
+    export_parser.add_argument('--status', choices=('pending', 'approved', 'rejected'))
+    export_parser.add_argument('--since', metavar='ГГГГ-ММ-ДД', help="поданные с этого дня")
+    export_parser.add_argument('--output', '-o', metavar='ПУТЬ', help="файл (по умолчанию stdout)")
+    commands.add_parser('rebuild', help="пересчитать агрегаты и счётчики по журналу событий")
+    seed_parser = commands.add_parser('seed', help="добавить синтетических авторов и предложения")
+    seed_parser.add_argument('--users', type=int, required=True)
+    seed_parser.add_argument('--submissions', type=int, required=True)
+    seed_parser.add_argument('--days', type=int, default=365, help="за сколько дней распределить подачу")
+    seed_parser.add_argument('--first-user', type=int, default=9_000_000_000, help="ID первого автора")
+    seed_parser.add_argument('--seed', type=int, default=1)
+    seed_parser.add_argument('--skip-aggregates', action='store_true', help="не пересчитывать агрегаты")
+
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict
+
+
+class Metrics:
+    """Счётчики и показатели процесса в памяти (команда /metrics)"""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+
+    def inc(self, name: str, value: int = 1):
+        """Увеличение счётчика"""
+        self.counters[name] += value
+
+    def gauge(self, name: str, getter: Callable[[], Any]):
+        """Регистрация показателя, который вычисляется при чтении"""
+        self._gauges[name] = getter
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущие значения всех счётчиков и показателей"""
+        values = dict(self.counters)
+        for name, getter in self._gauges.items():
+            values[name] = getter()
+        return dict(sorted(values.items()))
+
+
+# Единый экземпляр на процесс
+metrics = Metrics()
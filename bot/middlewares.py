@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from logs import bind, unbind
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Корзина токенов одного пользователя"""
+    __slots__ = ('tokens', 'updated', 'warned')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.warned = False
+
+
+class BucketStore:
+    """Корзины токенов по пользователям с вытеснением неактивных"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # токенов в секунду
+        self.capacity = capacity
+        # За это время корзина гарантированно наполняется до краёв,
+        # поэтому её можно удалить без изменения поведения
+        self.idle_ttl = capacity / rate
+        self._buckets: 'OrderedDict[int, TokenBucket]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _refill(self, key: int, now: float) -> TokenBucket:
+        """Получение корзины с пополнением токенов на текущий момент"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.capacity, now)
+            self._buckets[key] = bucket
+        else:
+            bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _evict(self, now: float):
+        """Удаление корзин, не использовавшихся дольше idle_ttl (самые старые — в начале)"""
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket.updated < self.idle_ttl:
+                break
+            del self._buckets[key]
+
+    def consume(self, key: int, now: Optional[float] = None) -> Tuple[bool, TokenBucket]:
+        """Попытка списать один токен"""
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+        bucket = self._refill(key, now)
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.warned = False
+            return True, bucket
+        return False, bucket
+
+    def retry_after(self, bucket: TokenBucket) -> float:
+        """Через сколько секунд появится следующий токен"""
+        return max(0.0, (1 - bucket.tokens) / self.rate)
+
+    def tokens(self, key: int, now: Optional[float] = None) -> float:
+        """Текущее количество токенов пользователя (без списания)"""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self.capacity
+        return min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+
+    def snapshot(self, limit: int = 10) -> List[Tuple[int, float]]:
+        """Пользователи с наименьшим остатком токенов"""
+        now = time.monotonic()
+        self._evict(now)
+        items = [(key, self.tokens(key, now)) for key in self._buckets]
+        items.sort(key=lambda item: item[1])
+        return items[:limit]
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Антифлуд: отдельные лимиты на отправку предложений и на команды.
+
+    Нулевая скорость отключает лимит: его корзин нет (None).
+    """
+
+    SUBMISSION_TEXT = "📝 Предложить новость"
+    SUBMISSION_CALLBACK = "submit_news"
+
+    def __init__(
+        self,
+        submissions_per_hour: int,
+        commands_per_second: float,
+        commands_burst: int
+    ):
+        self.submissions: Optional[BucketStore] = None
+        self.commands: Optional[BucketStore] = None
+        if submissions_per_hour > 0:
+            self.submissions = BucketStore(submissions_per_hour / 3600, submissions_per_hour)
+        if commands_per_second > 0:
+            self.commands = BucketStore(commands_per_second, max(1, commands_burst))
+
+    def _is_submission(self, event: TelegramObject) -> bool:
+        if isinstance(event, Message):
+            return event.text == self.SUBMISSION_TEXT
+        if isinstance(event, CallbackQuery):
+            return event.data == self.SUBMISSION_CALLBACK
+        return False
+
+    async def _reject(self, event: TelegramObject, text: str):
+        """Вежливый ответ при превышении лимита"""
+        if isinstance(event, CallbackQuery):
+            await event.answer(text, show_alert=True)
+        elif isinstance(event, Message):
+            await event.answer(text)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is None:
+            return await handler(event, data)
+
+        if self.commands is not None:
+            allowed, bucket = self.commands.consume(user.id)
+            if not allowed:
+                # Предупреждаем один раз, остальные сообщения молча отбрасываем
+                if not bucket.warned:
+                    bucket.warned = True
+                    await self._reject(event, "⏳ Слишком много запросов. Подождите немного.")
+                return None
+
+        if self.submissions is not None and self._is_submission(event):
+            allowed, bucket = self.submissions.consume(user.id)
+            if not allowed:
+                minutes = int(self.submissions.retry_after(bucket) // 60) + 1
+                await self._reject(
+                    event,
+                    "⏳ Вы отправляете слишком много предложений.\n"
+                    f"Попробуйте снова через {minutes} мин."
+                )
+                return None
+
+        return await handler(event, data)
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Учёт обрабатываемых обновлений, чтобы дождаться их при остановке"""
+
+    def __init__(self, lifecycle):
+        self.lifecycle = lifecycle
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        self.lifecycle.track_current(getattr(event, 'update_id', None))
+        result = await handler(event, data)
+        self.lifecycle.last_update_at = time.time()
+        return result
+
+
+class PresenceMiddleware(BaseMiddleware):
+    """Отметка активности модераторов для маршрутизации предложений"""
+
+    def __init__(self, team):
+        self.team = team
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is not None:
+            self.team.touch(user.id)
+        return await handler(event, data)
+
+
+class ChatOrderMiddleware(BaseMiddleware):
+    """Параллельная обработка обновлений разных чатов при строгом порядке внутри чата.
+
+    Регистрируется как outer-middleware обновлений. aiogram запускает задачу на
+    каждое обновление в порядке получения, а до этого middleware задача доходит
+    без переключений, поэтому очередь блокировки чата (FIFO) повторяет порядок
+    обновлений. Число одновременно работающих обработчиков ограничено workers.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._workers = asyncio.Semaphore(workers)
+        # chat_id -> [блокировка, число задач, ожидающих или держащих её]
+        self._chats: Dict[int, list] = {}
+        metrics.gauge('updates_pending', lambda: sum(entry[1] for entry in self._chats.values()))
+        metrics.gauge('updates_active_workers', lambda: self.workers - self._workers._value)
+
+    @property
+    def active_chats(self) -> int:
+        """Чаты, у которых есть обновления в обработке или в очереди"""
+        return len(self._chats)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat = data.get('event_chat')
+        user = data.get('event_from_user')
+        key = chat.id if chat else (user.id if user else None)
+        if key is None:
+            async with self._workers:
+                return await handler(event, data)
+
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._workers:
+                    return await handler(event, data)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                # Чат простаивает — освобождаем его блокировку
+                del self._chats[key]
+
+
+class LoggingMiddleware(BaseMiddleware):
+    """Поля обновления для структурных логов и время работы обработчика.
+
+    Регистрируется как inner-middleware роутера: только там известен обработчик.
+    Запись о каждом обработанном обновлении попадает в выборку (sampled).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        name = handler_object.callback.__name__ if handler_object else None
+        user = data.get('event_from_user')
+        chat = data.get('event_chat')
+        update = data.get('event_update')
+        token = bind(
+            update_id=update.update_id if update else None,
+            handler=name,
+            user_id=user.id if user else None,
+            chat_id=chat.id if chat else None
+        )
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            logger.info("Обработчик %s: %.1f мс", name, latency_ms,
+                        extra={'latency_ms': latency_ms, 'sampled': True})
+            unbind(token)
@@ -0,0 +1,183 @@
+import itertools
+import time
+from typing import Dict, List, Optional, Set
+
+from database import db
+
+ROLE_OWNER = 'owner'
+ROLE_MODERATOR = 'moderator'
+
+
+class RoutingStrategy:
+    """Стратегия выбора модератора для нового предложения"""
+
+    name = ''
+    title = ''
+
+    def choose(self, team: 'ModeratorTeam', author_id: int, candidates: List[int]) -> int:
+        raise NotImplementedError
+
+
+class RoundRobinStrategy(RoutingStrategy):
+    """По очереди"""
+
+    name = 'round_robin'
+    title = "по очереди"
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, team, author_id, candidates):
+        return candidates[next(self._counter) % len(candidates)]
+
+
+class LeastOutstandingStrategy(RoutingStrategy):
+    """Тому, у кого меньше всего нерешённых назначений"""
+
+    name = 'least_outstanding'
+    title = "наименее загруженному"
+
+    def choose(self, team, author_id, candidates):
+        return min(candidates, key=lambda moderator_id: (team.outstanding(moderator_id), moderator_id))
+
+
+class StickyStrategy(RoutingStrategy):
+    """Один автор — один модератор (пока тот доступен)"""
+
+    name = 'sticky'
+    title = "закреплённому за автором"
+
+    def __init__(self):
+        self._fallback = LeastOutstandingStrategy()
+
+    def choose(self, team, author_id, candidates):
+        moderator_id = team.sticky.get(author_id)
+        if moderator_id not in candidates:
+            moderator_id = self._fallback.choose(team, author_id, candidates)
+        team.sticky[author_id] = moderator_id
+        return moderator_id
+
+
+STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (RoundRobinStrategy, LeastOutstandingStrategy, StickyStrategy)
+}
+
+
+class ModeratorTeam:
+    """Состав команды, присутствие и очереди модераторов в памяти.
+
+    Данные загружаются из базы при запуске и дальше поддерживаются
+    вместе с записью в базу, поэтому проверка прав и маршрутизация
+    не требуют запросов.
+    """
+
+    def __init__(self, strategy: str, presence_timeout: float):
+        self.presence_timeout = presence_timeout
+        self.roles: Dict[int, str] = {}
+        self.last_seen: Dict[int, float] = {}
+        self.queues: Dict[int, Set[int]] = {}
+        # submission_id -> (moderator_id, unix-время назначения, автор)
+        self.assignments: Dict[int, tuple] = {}
+        self.sticky: Dict[int, int] = {}
+        self.set_strategy(strategy)
+
+    def set_strategy(self, name: str):
+        """Смена стратегии маршрутизации"""
+        if name not in STRATEGIES:
+            raise ValueError(f"Неизвестная стратегия: {name}")
+        self.strategy = STRATEGIES[name]()
+
+    async def load(self):
+        """Загрузка команды и назначений из базы"""
+        saved_strategy = await db.get_setting('moderation_strategy')
+        if saved_strategy in STRATEGIES:
+            self.set_strategy(saved_strategy)
+
+        self.roles = {row['user_id']: row['role'] for row in await db.get_moderators()}
+        # Владелец, назначенный до появления команды
+        admin_id = await db.get_admin_id()
+        if admin_id and self.roles.get(admin_id) != ROLE_OWNER:
+            await db.add_moderator(admin_id, ROLE_OWNER)
+            self.roles[admin_id] = ROLE_OWNER
+
+        self.queues = {moderator_id: set() for moderator_id in self.roles}
+        self.assignments = {}
+        for row in await db.get_assignments():
+            if row['moderator_id'] in self.roles:
+                self._assign(row['submission_id'], row['moderator_id'], row['assigned_at'], row['user_id'])
+
+    def is_moderator(self, user_id: int) -> bool:
+        return user_id in self.roles
+
+    def is_owner(self, user_id: int) -> bool:
+        return self.roles.get(user_id) == ROLE_OWNER
+
+    def touch(self, user_id: int):
+        """Отметка присутствия модератора"""
+        if user_id in self.roles:
+            self.last_seen[user_id] = time.monotonic()
+
+    def is_online(self, user_id: int) -> bool:
+        seen = self.last_seen.get(user_id)
+        return seen is not None and time.monotonic() - seen < self.presence_timeout
+
+    def outstanding(self, moderator_id: int) -> int:
+        return len(self.queues.get(moderator_id, ()))
+
+    async def add(self, user_id: int, role: str = ROLE_MODERATOR):
+        await db.add_moderator(user_id, role)
+        self.roles[user_id] = role
+        self.queues.setdefault(user_id, set())
+
+    async def remove(self, user_id: int) -> List[int]:
+        """Удаление модератора; возвращает его незавершённые назначения"""
+        await db.remove_moderator(user_id)
+        self.roles.pop(user_id, None)
+        self.last_seen.pop(user_id, None)
+        orphaned = list(self.queues.pop(user_id, ()))
+        for submission_id in orphaned:
+            self.assignments.pop(submission_id, None)
+        return orphaned
+
+    def _candidates(self, exclude: Optional[int] = None) -> List[int]:
+        """Модераторы в сети, а если таких нет — все"""
+        everyone = sorted(user_id for user_id in self.roles if user_id != exclude)
+        online = [user_id for user_id in everyone if self.is_online(user_id)]
+        return online or everyone
+
+    def _assign(self, submission_id: int, moderator_id: int, assigned_at: int, author_id: int):
+        previous = self.assignments.get(submission_id)
+        if previous:
+            self.queues.get(previous[0], set()).discard(submission_id)
+        self.assignments[submission_id] = (moderator_id, assigned_at, author_id)
+        self.queues.setdefault(moderator_id, set()).add(submission_id)
+
+    async def route(self, submission_id: int, author_id: int, exclude: Optional[int] = None) -> Optional[int]:
+        """Выбор модератора для предложения и запись назначения"""
+        candidates = self._candidates(exclude)
+        if not candidates and exclude in self.roles:
+            # Передать некому — продлеваем назначение текущему модератору
+            candidates = [exclude]
+        if not candidates:
+            return None
+        moderator_id = self.strategy.choose(self, author_id, candidates)
+        assigned_at = int(time.time())
+        self._assign(submission_id, moderator_id, assigned_at, author_id)
+        await db.assign_submission(submission_id, moderator_id, assigned_at)
+        return moderator_id
+
+    def release(self, submission_id: int):
+        """Снятие назначения после решения (в базе снимается вместе со статусом)"""
+        assignment = self.assignments.pop(submission_id, None)
+        if assignment:
+            self.queues.get(assignment[0], set()).discard(submission_id)
+
+    def expired(self, timeout: float) -> List[tuple]:
+        """Назначения старше timeout секунд: (submission_id, moderator_id, автор)"""
+        deadline = time.time() - timeout
+        return [
+            (submission_id, moderator_id, author_id)
+            for submission_id, (moderator_id, assigned_at, author_id) in self.assignments.items()
+            if assigned_at < deadline
+        ]
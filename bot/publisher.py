@@ -0,0 +1,199 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, List, Mapping, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import (
+    InputMediaAnimation,
+    InputMediaAudio,
+    InputMediaDocument,
+    InputMediaPhoto,
+    InputMediaVideo,
+    Message,
+    MessageEntity,
+)
+
+# Типы медиа, которые можно переотправить по file_id
+MEDIA_TYPES = ('photo', 'video', 'document', 'animation', 'audio', 'voice', 'video_note', 'sticker')
+
+# Типы, у которых есть подпись
+CAPTION_TYPES = ('photo', 'video', 'document', 'animation', 'audio', 'voice')
+
+# Метаданные медиа, которые сохраняются вместе с file_id
+_META_FIELDS = ('width', 'height', 'duration', 'length', 'mime_type', 'file_name', 'file_size')
+
+_SEND_METHODS = {
+    'photo': 'send_photo',
+    'video': 'send_video',
+    'document': 'send_document',
+    'animation': 'send_animation',
+    'audio': 'send_audio',
+    'voice': 'send_voice',
+    'video_note': 'send_video_note',
+    'sticker': 'send_sticker',
+}
+
+
+# Медиа, которое можно заменить в уже отправленном сообщении (editMessageMedia)
+_INPUT_MEDIA = {
+    'photo': InputMediaPhoto,
+    'video': InputMediaVideo,
+    'document': InputMediaDocument,
+    'animation': InputMediaAnimation,
+    'audio': InputMediaAudio,
+}
+
+
+def extract_media(message: Message) -> dict:
+    """file_id, file_unique_id и метаданные медиа из сообщения автора"""
+    content_type = message.content_type
+    entities = message.entities if content_type == 'text' else message.caption_entities
+    meta = {}
+    if entities:
+        meta['entities'] = [entity.model_dump(exclude_none=True) for entity in entities]
+
+    media = getattr(message, content_type, None) if content_type in MEDIA_TYPES else None
+    if content_type == 'photo' and media:
+        media = media[-1]  # самый большой размер
+    if media is None:
+        return {'file_id': None, 'file_unique_id': None, 'media_meta': meta}
+
+    for field in _META_FIELDS:
+        value = getattr(media, field, None)
+        if value is not None:
+            meta[field] = value
+    return {'file_id': media.file_id, 'file_unique_id': media.file_unique_id, 'media_meta': meta}
+
+
+def load_meta(submission: Mapping[str, Any]) -> dict:
+    """Метаданные медиа предложения (в базе хранятся как JSON)"""
+    meta = submission['media_meta'] if 'media_meta' in submission.keys() else None
+    if not meta:
+        return {}
+    return json.loads(meta) if isinstance(meta, str) else meta
+
+
+def _entities(meta: dict) -> Optional[list]:
+    if not meta.get('entities'):
+        return None
+    return [MessageEntity(**entity) for entity in meta['entities']]
+
+
+async def send_submission(
+    bot: Bot,
+    chat_id: int,
+    submission: Mapping[str, Any],
+    caption: Optional[str] = None,
+    parse_mode: Optional[str] = None,
+    signature: Optional[str] = None,
+    reply_markup=None
+) -> Message:
+    """Отправка предложения по сохранённым file_id и тексту, без обращения к чату автора.
+
+    caption — готовый текст карточки (для предпросмотра модератору),
+    иначе отправляется исходный текст с разметкой автора и необязательной подписью.
+    Предложения, сохранённые до появления file_id, копируются из чата автора.
+    """
+    content_type = submission['content_type']
+    file_id = submission['file_id'] if 'file_id' in submission.keys() else None
+
+    if caption is None:
+        meta = load_meta(submission)
+        text = submission['content'] or ""
+        entities = _entities(meta)
+        if signature:
+            # Подпись добавляется в конец, смещения разметки не меняются
+            text = f"{text}\n\n{signature}" if text else signature
+    else:
+        text, entities = caption, None
+
+    if content_type == 'text':
+        return await bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            entities=entities,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+
+    if not file_id or content_type not in _SEND_METHODS:
+        return await bot.copy_message(
+            chat_id=chat_id,
+            from_chat_id=submission['user_id'],
+            message_id=submission['message_id'],
+            caption=text if content_type in CAPTION_TYPES else None,
+            caption_entities=entities,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+
+    send = getattr(bot, _SEND_METHODS[content_type])
+    if content_type in CAPTION_TYPES:
+        return await send(
+            chat_id,
+            file_id,
+            caption=text or None,
+            caption_entities=entities,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+
+    # Стикеры и кружки без подписи: текст карточки отдельным сообщением
+    sent = await send(chat_id, file_id, reply_markup=None if text else reply_markup)
+    if text:
+        sent = await bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            entities=entities,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+    return sent
+
+
+def input_media(submission: Mapping[str, Any], caption: str, parse_mode: Optional[str] = None):
+    """Медиа предложения для замены в сообщении (None — такое медиа не заменить)"""
+    media_class = _INPUT_MEDIA.get(submission['content_type'])
+    if media_class is None or not submission['file_id']:
+        return None
+    return media_class(media=submission['file_id'], caption=caption, parse_mode=parse_mode)
+
+
+async def publish(
+    bot: Bot,
+    submission: Mapping[str, Any],
+    destinations: List[dict],
+    forward: bool = False,
+    author: Optional[Callable[[], Awaitable[str]]] = None
+) -> list:
+    """Публикация во все направления одновременно; возвращает [(направление, сообщение или исключение)].
+
+    Темп отправки задаёт RateScheduler сессии, поэтому запросы запускаются разом.
+    forward — пересылка с автором; если автор удалил сообщение, пост отправляется
+    по file_id с подписью author() (имя запрашивается один раз, только в этом случае).
+    """
+    if forward:
+        results = await asyncio.gather(*(
+            bot.forward_message(
+                chat_id=destination['chat_id'],
+                from_chat_id=submission['user_id'],
+                message_id=submission['message_id']
+            )
+            for destination in destinations
+        ), return_exceptions=True)
+        fallback = [i for i, result in enumerate(results) if isinstance(result, TelegramBadRequest)]
+        if fallback:
+            signature = f"✍️ Автор: {await author()}" if author else None
+            retried = await asyncio.gather(*(
+                send_submission(bot, destinations[i]['chat_id'], submission, signature=signature)
+                for i in fallback
+            ), return_exceptions=True)
+            for i, result in zip(fallback, retried):
+                results[i] = result
+    else:
+        results = await asyncio.gather(*(
+            send_submission(bot, destination['chat_id'], submission)
+            for destination in destinations
+        ), return_exceptions=True)
+    return list(zip(destinations, results))
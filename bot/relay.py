@@ -0,0 +1,48 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from database import db
+from metrics import metrics
+
+
+class RelayRouter:
+    """Маршруты переписки модератора с автором: пересланное ботом сообщение -> куда отвечать.
+
+    Каждое сообщение, которое бот переслал в чат (ответ модератора автору или
+    автора модератору), записывается в таблицу relays с ключом (чат, сообщение).
+    Ответ на него уходит в парный чат ответом на исходное сообщение. Последние
+    capacity маршрутов держатся в LRU — ответ в идущем разговоре не читает базу;
+    промах ищется в базе по первичному ключу. Отсутствие маршрута тоже
+    кэшируется: такие ключи появляются только через remember.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._cache: "OrderedDict[Tuple[int, int], Optional[dict]]" = OrderedDict()
+        metrics.gauge('relay_cache_size', lambda: len(self._cache))
+
+    def _put(self, key: Tuple[int, int], route: Optional[dict]):
+        self._cache[key] = route
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    async def resolve(self, chat_id: int, message_id: int) -> Optional[dict]:
+        """Маршрут ответа на сообщение: submission_id, peer_chat_id, peer_message_id"""
+        key = (chat_id, message_id)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            metrics.inc('relay_cache_hits')
+            return self._cache[key]
+        metrics.inc('relay_cache_misses')
+        route = await db.get_relay(chat_id, message_id)
+        self._put(key, route)
+        return route
+
+    async def remember(self, chat_id: int, message_id: int, submission_id: int, peer_chat_id: int,
+                       peer_message_id: int):
+        """Бот переслал сообщение в chat_id; ответ на него уйдёт в peer_chat_id к peer_message_id"""
+        await db.save_relay(chat_id, message_id, submission_id, peer_chat_id, peer_message_id)
+        self._put((chat_id, message_id), {
+            'submission_id': submission_id, 'peer_chat_id': peer_chat_id, 'peer_message_id': peer_message_id
+        })
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Optional, Tuple, Union
+
+from aiohttp import ClientConnectorError
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramEntityTooLarge,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.methods import GetUpdates, TelegramMethod
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Методы, повтор которых после потерянного ответа может продублировать сообщение
+_NON_IDEMPOTENT_PREFIXES = ('send', 'copy', 'forward')
+
+
+def is_idempotent(method: TelegramMethod) -> bool:
+    """Можно ли безопасно повторить запрос, не зная, дошёл ли он"""
+    return not method.__api_method__.startswith(_NON_IDEMPOTENT_PREFIXES)
+
+
+class CircuitOpenError(TelegramNetworkError):
+    """Запрос не отправлялся: Bot API недоступен, предохранитель разомкнут"""
+
+
+class CircuitBreaker:
+    """Предохранитель: после серии сбоев запросы сразу отклоняются.
+
+    closed — запросы идут как обычно;
+    open — запросы отклоняются до истечения reset_timeout;
+    half_open — пропускается один пробный запрос, его исход решает, замкнуть ли цепь.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def retry_in(self) -> float:
+        """Через сколько секунд будет пробный запрос"""
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if self.retry_in() > 0:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self):
+        """Telegram ответил (даже ошибкой запроса) — API доступен"""
+        if self.state != self.CLOSED:
+            logger.info("Bot API снова доступен, предохранитель замкнут")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        """Сетевая ошибка или 5xx"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    "Bot API недоступен (%d сбоев подряд), запросы отклоняются %.0f с",
+                    self.failures, self.reset_timeout
+                )
+                metrics.inc('api_breaker_trips')
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class ResilientRequestMiddleware(BaseRequestMiddleware):
+    """Повторы запросов к Bot API с экспоненциальной задержкой и предохранителем.
+
+    - TelegramRetryAfter: запрос не выполнен, ждём retry_after и повторяем любой метод;
+    - сетевые ошибки и 5xx: повторяем только идемпотентные методы и запросы,
+      которые не дошли до сервера (не удалось соединиться);
+    - остальные ошибки Telegram окончательные и не повторяются.
+    getUpdates не повторяется: у polling своя пауза между попытками.
+    Пробный запрос ждём не дольше probe_timeout (плюс long polling getUpdates);
+    если он не завершился — отменён, завис или упал неожиданной ошибкой —
+    это сбой, иначе предохранитель так и остался бы в half_open.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        attempts: int,
+        base_delay: float,
+        max_delay: float,
+        max_retry_after: float,
+        probe_timeout: float = 10.0
+    ):
+        self.breaker = breaker
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.probe_timeout = probe_timeout
+        metrics.gauge('api_breaker_state', lambda: breaker.state)
+        metrics.gauge('api_consecutive_failures', lambda: breaker.failures)
+
+    def _retryable(self, method: TelegramMethod, error: TelegramAPIError) -> bool:
+        if isinstance(method, GetUpdates):
+            return False
+        return is_idempotent(method) or isinstance(error.__context__, ClientConnectorError)
+
+    def _backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с полным разбросом"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _probe(self, make_request: NextRequestMiddlewareType, bot, method: TelegramMethod):
+        """Пробный запрос в half_open с ограниченным ожиданием"""
+        timeout = self.probe_timeout
+        if isinstance(method, GetUpdates):
+            timeout += method.timeout or 0
+        try:
+            return await asyncio.wait_for(make_request(bot, method), timeout)
+        except asyncio.TimeoutError:
+            raise TelegramNetworkError(method=method, message=f"Пробный запрос без ответа {timeout:.0f} с")
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot,
+        method: TelegramMethod
+    ):
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                metrics.inc('api_rejected')
+                raise CircuitOpenError(
+                    method=method,
+                    message=f"Bot API недоступен, следующая попытка через {self.breaker.retry_in():.0f} с"
+                )
+
+            metrics.inc('api_requests')
+            probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+            try:
+                if probe:
+                    response = await self._probe(make_request, bot, method)
+                else:
+                    response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.breaker.record_success()
+                metrics.inc('api_flood_waits')
+                attempt += 1
+                if attempt >= self.attempts or e.retry_after > self.max_retry_after:
+                    metrics.inc('api_gave_up')
+                    raise
+                delay = e.retry_after + random.uniform(0, 1)
+            except TelegramEntityTooLarge:
+                self.breaker.record_success()
+                raise
+            except (TelegramNetworkError, TelegramServerError) as e:
+                self.breaker.record_failure()
+                metrics.inc('api_failures')
+                attempt += 1
+                if attempt >= self.attempts or not self._retryable(method, e):
+                    metrics.inc('api_gave_up')
+                    raise
+                delay = self._backoff(attempt)
+            except TelegramAPIError:
+                self.breaker.record_success()
+                raise
+            except BaseException:
+                if probe:
+                    self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                return response
+
+            metrics.inc('api_retries')
+            logger.warning(
+                "Повтор %s через %.1f с (попытка %d из %d)",
+                method.__api_method__, delay, attempt + 1, self.attempts
+            )
+            await asyncio.sleep(delay)
+
+
+class RateScheduler(BaseRequestMiddleware):
+    """Темп отправки сообщений в пределах лимитов Telegram.
+
+    Каждому запросу, создающему сообщения, назначается время отправки (GCRA):
+    не чаще global_rate сообщений в секунду всего и не чаще chat_rate в секунду
+    в личный чат и group_rate в минуту в группу или канал; до burst сообщений
+    подряд — без паузы. Запрос ждёт своего времени, а не получает 429 с паузой
+    на весь бот. Остальные методы (правки, ответы на кнопки) проходят сразу.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, group_rate: float, burst: int):
+        self.global_interval = 1 / global_rate if global_rate > 0 else 0.0
+        self.chat_interval = 1 / chat_rate if chat_rate > 0 else 0.0
+        self.group_interval = 60 / group_rate if group_rate > 0 else 0.0
+        self.burst = max(1, burst)
+        self.waiting = 0
+        self._global_tat = 0.0
+        self._chat_tat: Dict[Union[int, str], float] = {}
+        metrics.gauge('api_rate_waiting', lambda: self.waiting)
+
+    def _interval(self, chat_id: Union[int, str]) -> float:
+        # Группы и каналы — отрицательные ID или @username
+        return self.group_interval if isinstance(chat_id, str) or chat_id < 0 else self.chat_interval
+
+    @staticmethod
+    def _gcra(tat: float, now: float, interval: float, weight: int, burst: int) -> Tuple[float, float]:
+        """Время отправки и новое теоретическое время прихода (GCRA)"""
+        start = max(now, tat - interval * (burst - 1))
+        return start, max(tat, start) + interval * weight
+
+    def reserve(self, chat_id: Union[int, str], weight: int = 1, now: Optional[float] = None) -> float:
+        """Бронь места в очереди чата; возвращает, сколько секунд ждать"""
+        now = time.monotonic() if now is None else now
+        tat = self._chat_tat.get(chat_id, now)
+        start, self._chat_tat[chat_id] = self._gcra(tat, now, self._interval(chat_id), weight, self.burst)
+        if len(self._chat_tat) > 4096:
+            self._chat_tat = {key: tat for key, tat in self._chat_tat.items() if tat > now}
+        return start - now
+
+    def reserve_global(self, weight: int = 1, now: Optional[float] = None) -> float:
+        """Бронь в общем лимите — в момент отправки, чтобы дальние брони
+        одного чата не задерживали остальные"""
+        now = time.monotonic() if now is None else now
+        start, self._global_tat = self._gcra(self._global_tat, now, self.global_interval, weight, self.burst)
+        return start - now
+
+    async def _wait(self, delay: float):
+        if delay <= 0:
+            return
+        metrics.inc('api_rate_waits')
+        self.waiting += 1
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot,
+        method: TelegramMethod
+    ):
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None or is_idempotent(method) or method.__api_method__ == 'sendChatAction':
+            return await make_request(bot, method)
+
+        # Альбом — столько сообщений, сколько в нём файлов
+        weight = len(getattr(method, 'media', None) or ()) or 1
+        await self._wait(self.reserve(chat_id, weight))
+        await self._wait(self.reserve_global(weight))
+        return await make_request(bot, method)
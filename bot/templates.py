@@ -0,0 +1,232 @@
+import time
+from html import escape
+from typing import Optional
+
+# Шаблоны карточек компилируются один раз: в модуле хранятся связанные методы
+# str.format, а все пользовательские значения экранируются перед подстановкой.
+
+_NEW_SUBMISSION_HEADER = (
+    "┌─ 📬 <b>Новое предложение</b>\n"
+    "│\n"
+    "│ 👤 От: {author}\n"
+    "│ 🔐 {forward_status}\n"
+    "└─────────────────────\n\n"
+).format
+
+_ADMIN_SUBMISSION_HEADER = (
+    "┌─ 📬 <b>Предложение #{submission_id}</b>\n"
+    "│\n"
+    "│ 👤 От: {author}\n"
+    "│ 🔐 {forward_status}\n"
+    "│ 📅 {created_at}\n"
+    "└─────────────────────\n\n"
+).format
+
+_USER_SUBMISSION_HEADER = (
+    "┌─ ⏳ <b>Предложение</b>\n"
+    "│ Ожидает рассмотрения\n"
+    "│ 📅 {created_at}\n"
+    "└─────────────────────\n\n"
+).format
+
+_TEXT_BODY = "📄 <b>Текст предложения:</b>\n\n{content}".format
+
+_FORWARD_STATUS = {
+    True: "✅ Разрешена публикация с автором",
+    False: "🔒 Только анонимно",
+}
+
+
+def format_author(user_info: Optional[dict], user_id: Optional[int] = None) -> str:
+    """Имя автора для карточки (уже экранированное)"""
+    if not user_info:
+        return f"ID {user_id}" if user_id else "Неизвестный автор"
+    name = escape(user_info.get('first_name') or "", quote=False)
+    if user_info.get('username'):
+        name += f" (@{escape(user_info['username'], quote=False)})"
+    return name
+
+
+def render_new_submission_header(author: str, allow_forward: bool) -> str:
+    """Заголовок карточки нового предложения для администратора"""
+    return _NEW_SUBMISSION_HEADER(
+        author=author,
+        forward_status=_FORWARD_STATUS[bool(allow_forward)]
+    )
+
+
+def render_automod_flag(flags: str) -> str:
+    """Предупреждение автомодерации над карточкой"""
+    return f"⚠️ <b>Автомодерация:</b> {escape(flags, quote=False)}\n\n"
+
+
+def render_edited_flag(revision: int, edited_at: Optional[int]) -> str:
+    """Пометка над карточкой: автор изменил предложение после отправки"""
+    return f"✏️ <b>Изменено автором</b> ({revision}×, последний раз {format_timestamp(edited_at)} UTC) — проверьте ещё раз\n\n"
+
+
+def render_admin_submission_header(
+    submission_id: int,
+    author: str,
+    allow_forward: bool,
+    created_at: Optional[int]
+) -> str:
+    """Заголовок карточки предложения при просмотре администратором"""
+    return _ADMIN_SUBMISSION_HEADER(
+        submission_id=submission_id,
+        author=author,
+        forward_status=_FORWARD_STATUS[bool(allow_forward)],
+        created_at=format_timestamp(created_at)
+    )
+
+
+def render_user_submission_header(created_at: Optional[int]) -> str:
+    """Заголовок карточки ожидающего предложения для автора"""
+    return _USER_SUBMISSION_HEADER(created_at=format_timestamp(created_at))
+
+
+def render_text_body(content: Optional[str]) -> str:
+    """Текст предложения под заголовком"""
+    return _TEXT_BODY(content=escape(content, quote=False) if content else "Текст не найден")
+
+
+def render_caption(header: str, caption: Optional[str]) -> str:
+    """Подпись медиа: заголовок + исходная подпись автора"""
+    caption = (caption or "").strip()
+    return header + escape(caption, quote=False) if caption else header
+
+
+def format_duration(seconds: Optional[int]) -> str:
+    """Человекочитаемая длительность"""
+    if seconds is None:
+        return "—"
+    if seconds < 60:
+        return f"{seconds} с"
+    if seconds < 3600:
+        return f"{seconds // 60} мин"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f} ч"
+    return f"{seconds / 86400:.1f} дн"
+
+
+def format_timestamp(ts: Optional[int]) -> str:
+    """Время в секундах эпохи как ГГГГ-ММ-ДД ЧЧ:ММ:СС (UTC)"""
+    if ts is None:
+        return "—"
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))
+
+
+def format_size(size: int) -> str:
+    """Человекочитаемый размер файла"""
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def render_period_stats(title: str, stats: dict) -> str:
+    """Карточка статистики за период"""
+    decided = stats['approved'] + stats['rejected']
+    text = (
+        f"📊 <b>Статистика {escape(title, quote=False)}</b>\n\n"
+        f"👥 Авторов: {stats['authors']}\n"
+        f"📝 Предложений: {stats['submitted']}\n\n"
+        f"✅ Одобрено: {stats['approved']}\n"
+        f"❌ Отклонено: {stats['rejected']}\n"
+    )
+    if decided:
+        text += f"\n📈 Процент одобрения: {stats['approved'] / decided * 100:.1f}%\n"
+        latency = stats['latency']
+        text += (
+            f"\n⏱ <b>Время до решения</b> (не более)\n"
+            f"• p50: {format_duration(latency[50])}\n"
+            f"• p90: {format_duration(latency[90])}\n"
+            f"• p99: {format_duration(latency[99])}\n"
+        )
+    return text
+
+
+def render_metrics(values: dict) -> str:
+    """Список метрик процесса"""
+    lines = [f"• {escape(name, quote=False)}: <code>{escape(str(value), quote=False)}</code>"
+             for name, value in values.items()]
+    return "📈 <b>Метрики</b>\n\n" + ("\n".join(lines) or "Пока пусто")
+
+
+def _ms(value) -> str:
+    return "—" if value is None else f"{value:.0f} мс"
+
+
+def render_diag(report: dict) -> str:
+    """Отчёт самодиагностики (/diag)"""
+    loop, database, api, updates, memory = (
+        report['loop'], report['db'], report['api'], report['updates'], report['memory']
+    )
+    if 'error' in database:
+        db_line = f"❌ {escape(database['error'], quote=False)}"
+    else:
+        db_line = (
+            f"запрос {_ms(database['ping_ms'])}, журнал {database['journal_mode']}, "
+            f"файл {format_size(database['size'])}, WAL {format_size(database['wal_size'])}"
+        )
+        if database['write_held_s'] is not None:
+            db_line += f", запись идёт {database['write_held_s']} с"
+    poll = "—" if api['last_poll_ago'] is None else f"{api['last_poll_ago']:.0f} с назад"
+    last_update = "—" if updates['last_update_ago'] is None else f"{updates['last_update_ago']:.0f} с назад"
+    queues = ", ".join(f"{escape(name, quote=False)} {value}" for name, value in report['queues'].items())
+    lines = [
+        "🩺 <b>Диагностика</b>: " + ("✅ всё в порядке" if report['status'] == 'ok' else "⚠️ есть проблемы"),
+        *(f"• {escape(problem, quote=False)}" for problem in report['problems']),
+        "",
+        f"⏱ Работает {report['uptime'] / 3600:.1f} ч, задач asyncio: {loop['tasks']}",
+        f"🔁 Цикл событий: задержка {_ms(loop['lag_ms'])}, максимум за минуту {_ms(loop['max_lag_ms'])}, "
+        f"блокировок {loop['stalls']}",
+        f"🗄 База: {db_line}",
+        f"📡 Bot API: последний запрос {_ms(api['last_latency_ms'])}, p95 {_ms(api['p95_latency_ms'])}, "
+        f"ошибок {api['errors']} из {api['requests']} ({api['error_rate']:.0%}), "
+        f"предохранитель {api['breaker'] or '—'}, polling {poll}",
+        f"📥 Последнее обработанное обновление: {last_update} (#{updates['last_update_id'] or '—'})",
+        f"📦 Очереди: {queues}",
+        f"🧠 Память: {format_size(memory['rss']) if memory['rss'] else '—'}, "
+        f"пик {format_size(memory['peak_rss']) if memory['peak_rss'] else '—'}",
+    ]
+    return "\n".join(lines)
+
+
+# Подписи видов направлений публикации
+DESTINATION_KIND_TITLES = {
+    'channel': "канал",
+    'discussion': "группа обсуждения",
+    'backup': "резервный канал",
+}
+
+
+def format_destination(destination: dict) -> str:
+    """Направление публикации одной строкой (уже экранированное)"""
+    kind = DESTINATION_KIND_TITLES.get(destination['kind'], destination['kind'])
+    title = escape(destination['title'], quote=False) if destination.get('title') else f"<code>{destination['chat_id']}</code>"
+    return f"#{destination['id']} {title} — {kind}"
+
+
+def render_destinations(destinations: list) -> str:
+    """Список направлений публикации"""
+    lines = [
+        f"{'📌' if destination['is_default'] else '▫️'} {format_destination(destination)}"
+        for destination in destinations
+    ]
+    return (
+        "🎯 <b>Направления публикации</b>\n📌 — по умолчанию\n\n"
+        + ("\n".join(lines) or "Пока нет: подключите канал командой /setup_channel")
+    )
+
+
+def render_publish_status(decision_text: str, failed: list, submission_id: int) -> str:
+    """Отметка о решении в карточке; failed — [(направление, ошибка)]"""
+    text = f"✅ <b>ОДОБРЕНО</b> ({escape(decision_text, quote=False)})"
+    if failed:
+        text += (
+            "\n⚠️ Не опубликовано: " + ", ".join(format_destination(destination) for destination, _ in failed)
+            + f"\nПовтор — автоматически или /republish {submission_id}"
+        )
+    return text
@@ -0,0 +1,303 @@
+import argparse
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject
+
+from logs import bind, unbind
+
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('trace_span', default=None)
+
+
+class Trace:
+    """Одна трасса: span'ы копятся, пока открыт хотя бы один из них"""
+    __slots__ = ('trace_id', 'wall_ns', 'perf_ns', 'spans', 'open')
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(64):016x}"
+        self.wall_ns = time.time_ns()
+        self.perf_ns = time.perf_counter_ns()
+        self.spans: List['Span'] = []
+        self.open = 0
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attrs', 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, trace: Trace, span_id: int, parent_id: Optional[int], name: str, attrs: dict):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """Сбор span'ов и запись трасс в JSONL.
+
+    Решение о выборке принимается один раз на трассу; вне выбранной трассы
+    span() ничего не делает, поэтому при sample_rate=0 трассировка почти бесплатна.
+    """
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.sample_rate = 0.0
+        self._ids = itertools.count(1)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+    def configure(self, path: Optional[str], sample_rate: float):
+        self.path = path
+        self.sample_rate = sample_rate if path else 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current_span.get()
+
+    def _start(self, trace: Trace, name: str, attrs: dict) -> Span:
+        parent = _current_span.get()
+        span = Span(trace, next(self._ids), parent.span_id if parent else None, name, attrs)
+        trace.open += 1
+        return span
+
+    def _finish(self, span: Span):
+        span.end_ns = time.perf_counter_ns()
+        trace = span.trace
+        trace.spans.append(span)
+        trace.open -= 1
+        if not trace.open:
+            # Span'ы фоновых задач, завершившихся позже, уйдут отдельной записью с тем же trace_id
+            spans, trace.spans = trace.spans, []
+            self._emit(trace, spans)
+
+    @contextmanager
+    def _run(self, trace: Trace, name: str, attrs: dict):
+        span = self._start(trace, name, attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """Начало новой трассы (с учётом выборки)"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            yield None
+            return
+        trace = Trace()
+        token = bind(trace_id=trace.trace_id)
+        # Новая трасса не наследует span, активный в родительской задаче
+        outer = _current_span.set(None)
+        try:
+            with self._run(trace, name, attrs) as span:
+                yield span
+        finally:
+            _current_span.reset(outer)
+            unbind(token)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Дочерний span текущей трассы; вне трассы ничего не делает"""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        with self._run(parent.trace, name, attrs) as span:
+            yield span
+
+    def traced(self, name: str):
+        """Декоратор корутины: каждый вызов — отдельный span"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with self.span(name):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _emit(self, trace: Trace, spans: List[Span]):
+        self._queue.put({
+            'trace_id': trace.trace_id,
+            'spans': [
+                {
+                    'id': span.span_id,
+                    'parent': span.parent_id,
+                    'name': span.name,
+                    # Микросекунды эпохи: точка отсчёта трассы + монотонное смещение
+                    'ts': (trace.wall_ns + span.start_ns - trace.perf_ns) // 1000,
+                    'dur': (span.end_ns - span.start_ns) // 1000,
+                    **({'attrs': span.attrs} if span.attrs else {}),
+                    **({'error': span.error} if span.error else {}),
+                }
+                for span in spans
+            ],
+        })
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name='trace-writer', daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        with open(self.path, 'a', encoding='utf-8') as file:
+            while True:
+                record = self._queue.get()
+                batch = [record]
+                while not self._queue.empty():
+                    batch.append(self._queue.get())
+                stop = None in batch
+                for item in batch:
+                    if item is not None:
+                        file.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+                file.flush()
+                if stop:
+                    return
+
+    def close(self):
+        """Дописать трассы из очереди (при остановке)"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+
+def trace_methods(prefix: str):
+    """Декоратор класса: span на каждый вызов его публичных корутин"""
+    def decorator(cls):
+        for name, func in list(vars(cls).items()):
+            if not name.startswith('_') and inspect.iscoroutinefunction(func):
+                setattr(cls, name, tracer.traced(f"{prefix}.{name}")(func))
+        return cls
+    return decorator
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Трасса на обновление (outer-middleware обновлений) и span обработчика
+    (inner-middleware роутера, где известен обработчик)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        if handler_object is not None:
+            with tracer.span(f"handler.{handler_object.callback.__name__}"):
+                return await handler(event, data)
+
+        update = data.get('event_update') or event
+        user = data.get('event_from_user')
+        with tracer.trace(
+            f"update.{update.event_type}",
+            update_id=update.update_id,
+            user_id=user.id if user else None
+        ):
+            return await handler(event, data)
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Span на каждую попытку запроса к Bot API"""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method: TelegramMethod):
+        if _current_span.get() is None:
+            return await make_request(bot, method)
+        with tracer.span(f"api.{method.__api_method__}", chat_id=getattr(method, 'chat_id', None)):
+            return await make_request(bot, method)
+
+
+# Единый экземпляр на процесс
+tracer = Tracer()
+
+
+# ============= ПРЕОБРАЗОВАНИЕ ДЛЯ ПРОСМОТРЩИКОВ =============
+
+def load_traces(path: str) -> Dict[str, list]:
+    """Span'ы по trace_id (записи одной трассы могут идти несколькими строками)"""
+    traces = defaultdict(list)
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                traces[record['trace_id']].extend(record['spans'])
+    return traces
+
+
+def to_chrome(traces: Dict[str, list]) -> dict:
+    """Формат Trace Event (chrome://tracing, Perfetto): одна трасса — одна дорожка"""
+    events = []
+    for tid, (trace_id, spans) in enumerate(traces.items(), start=1):
+        events.append({'ph': 'M', 'name': 'thread_name', 'pid': 1, 'tid': tid, 'args': {'name': trace_id}})
+        for span in spans:
+            events.append({
+                'ph': 'X', 'name': span['name'], 'pid': 1, 'tid': tid,
+                'ts': span['ts'], 'dur': span['dur'],
+                'args': {**span.get('attrs', {}), **({'error': span['error']} if 'error' in span else {})},
+            })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def to_folded(traces: Dict[str, list]) -> List[str]:
+    """Свёрнутые стеки для flamegraph.pl: путь span'ов и собственное время в мкс"""
+    totals = defaultdict(int)
+    for spans in traces.values():
+        by_id = {span['id']: span for span in spans}
+        children = defaultdict(int)
+        for span in spans:
+            if span['parent'] in by_id:
+                children[span['parent']] += span['dur']
+        for span in spans:
+            path, node = [], span
+            while node is not None:
+                path.append(node['name'])
+                node = by_id.get(node['parent'])
+            totals[";".join(reversed(path))] += max(0, span['dur'] - children[span['id']])
+    return [f"{stack} {value}" for stack, value in sorted(totals.items())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Преобразование traces.jsonl для просмотрщиков")
+    parser.add_argument('source')
+    parser.add_argument('target')
+    parser.add_argument('--folded', action='store_true', help="свёрнутые стеки вместо Trace Event JSON")
+    args = parser.parse_args()
+
+    traces = load_traces(args.source)
+    with open(args.target, 'w', encoding='utf-8') as file:
+        if args.folded:
+            file.write("\n".join(to_folded(traces)) + "\n")
+        else:
+            json.dump(to_chrome(traces), file, ensure_ascii=False)
+    print(f"Трасс: {len(traces)} -> {args.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import logging
+from typing import Callable, Coroutine, Optional, Tuple
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+
+logger = logging.getLogger(__name__)
+
+
+def json_backend(name: str) -> Tuple[str, Callable, Callable]:
+    """Функции (де)сериализации JSON: 'json', 'orjson' или 'auto' (orjson, если установлен)"""
+    if name in ('orjson', 'auto'):
+        try:
+            import orjson
+        except ImportError:
+            if name == 'orjson':
+                logger.warning("orjson не установлен, используется стандартный json")
+        else:
+            # aiogram ожидает от json_dumps строку, orjson возвращает bytes
+            return 'orjson', orjson.loads, lambda value: orjson.dumps(value).decode()
+    return 'json', json.loads, json.dumps
+
+
+def loop_factory(name: str) -> Tuple[str, Optional[Callable[[], asyncio.AbstractEventLoop]]]:
+    """Фабрика цикла событий: 'asyncio', 'uvloop' или 'auto' (uvloop, если установлен)"""
+    if name in ('uvloop', 'auto'):
+        try:
+            import uvloop
+        except ImportError:
+            if name == 'uvloop':
+                logger.warning("uvloop не установлен, используется стандартный цикл asyncio")
+        else:
+            return 'uvloop', uvloop.new_event_loop
+    return 'asyncio', None
+
+
+def create_session(
+    pool_size: int,
+    keepalive: float,
+    dns_ttl: int,
+    timeout: float,
+    json_name: str = 'auto',
+    api: TelegramAPIServer = PRODUCTION
+) -> AiohttpSession:
+    """HTTP-сессия Bot API: весь трафик идёт на один хост, поэтому пул общий
+    и соединения держатся открытыми между запросами."""
+    backend, loads, dumps = json_backend(json_name)
+    session = AiohttpSession(limit=pool_size, api=api, json_loads=loads, json_dumps=dumps, timeout=timeout)
+    # Параметры коннектора aiogram наружу не выводит — дополняем его словарь настроек
+    session._connector_init.update(
+        limit_per_host=pool_size,
+        keepalive_timeout=keepalive,
+        ttl_dns_cache=dns_ttl,
+    )
+    logger.info(
+        "HTTP-сессия: пул %d, keep-alive %g с, DNS-кэш %d с, таймаут %g с, JSON: %s",
+        pool_size, keepalive, dns_ttl, timeout, backend
+    )
+    return session
+
+
+def run(main: Coroutine, loop_name: str = 'auto'):
+    """Запуск корутины в выбранном цикле событий"""
+    name, factory = loop_factory(loop_name)
+    logger.info("Цикл событий: %s", name)
+    with asyncio.Runner(loop_factory=factory) as runner:
+        return runner.run(main)